@@ -1,17 +1,25 @@
 import logging, sys, traceback
+from utils import startup_profile
+startup_profile.enable_from_env()
 
 try:
     # semua import utama
-    import os, datetime
+    import os, datetime, threading
     import azure.functions as func
     from zoneinfo import ZoneInfo
-    from concurrent.futures import ThreadPoolExecutor, as_completed
-    from utils.data_fetcher import fetch_data
-    from utils.blob_handler import connect_blob, save_raw_to_blob
+    from utils.data_fetcher import fetch_group, group_by_watermark
+    from utils.blob_handler import (
+        connect_blob, save_raw_to_blob, read_tail_cache, diff_against_tail, update_tail_cache
+    )
     from utils.db_handler import (
-        connect_sql, insert_incremental, log_ingestion, log_data_quality_issue,
-        get_last_success, update_last_success
+        pooled_connection, pool_metrics, insert_incremental, get_last_success_bulk, save_run_record,
+        TelemetrySink
     )
+    from utils.data_quality import validate_prices
+    from utils.etl_logger import log_summary
+    from utils.instrumentation import RunRecorder
+    from utils.scheduler import Scheduler
+    from utils.pipeline import Pipeline, Stage
     from dotenv import load_dotenv
 except Exception as e:
     logging.error("🔥 Import error in TimerCryptoIngest!", exc_info=True)
@@ -23,6 +31,16 @@ load_dotenv()
 # symbols crypto
 CRYPTOS = os.getenv("CRYPTO_SYMBOLS", "BTC-USD,ETH-USD").split(",")
 INTERVAL = "1h"
+# max symbol per request fetch di pipeline
+FETCH_BATCH_SIZE = int(os.getenv("PIPELINE_FETCH_BATCH", "20"))
+# fetch mulai beberapa jam sebelum watermark supaya bar yang tadinya masih terbentuk ikut direvisi;
+# bar yang tidak berubah dibuang lagi lewat tail cache
+TAIL_REFETCH = datetime.timedelta(hours=int(os.getenv("TAIL_REFETCH_HOURS", "2")))
+# bar yang di-quarantine menahan watermark (dicoba lagi run berikutnya), tapi tidak lebih lama dari
+# window ini: bar yang masih rusak setelahnya hanya tercatat di DataQualityIssues
+QUARANTINE_RETRY = datetime.timedelta(hours=int(os.getenv("QUARANTINE_RETRY_HOURS", "24")))
+# encoding profile Parquet untuk file raw per jam (lihat blob_handler.PARQUET_PROFILES)
+RAW_PARQUET_PROFILE = os.getenv("RAW_PARQUET_PROFILE", "hot")
 
 logging.basicConfig(level=logging.INFO)
 
@@ -32,64 +50,203 @@ def log_header(title: str):
     logging.info(title)
     logging.info("="*80)
 
-def log_summary(results, started_at, finished_at):
-    logging.info("📊 ETL SUMMARY")
-    for r in results:
-        logging.info(r)
-
-# proses tiap simbol
-def process_symbol(symbol, blob_client, wib_now):
-    conn = connect_sql()
-    cursor = conn.cursor()
-    logging.info(f"🚀 Start {symbol}")
-
+# --- Stage pipeline (dijalankan scheduler per dependency) ---
+def fetch_stage(start, symbols, watermarks, wib_now, recorder, downloader=None):
+    with recorder.span("fetch", ",".join(symbols)) as span:
+        # curated sebagai pyarrow.Table: Parquet dan parameter SQL langsung dari buffer Arrow
+        frames = fetch_group(start, symbols, watermarks, wib_now, INTERVAL, downloader=downloader, arrow=True)
+        span["rows"] = sum(len(df) for df in frames.values())
+    return frames
+
+
+def blob_stage(symbol, blob_client, df, recorder):
+    """Diff hasil fetch dengan tail cache, hanya bar baru/berubah yang ditulis ke Parquet. Return (delta, tail)"""
+    with recorder.span("tail_diff", symbol) as span:
+        tail = read_tail_cache(blob_client, symbol)
+        df, stats = diff_against_tail(df, tail)
+        span.update(stats)
+        span["rows"] = len(df)
+    logging.info(f"🧮 {symbol} delta vs tail cache: {stats}")
+
+    if len(df):
+        with recorder.span("blob_upload", symbol) as span:
+            save_raw_to_blob(blob_client, symbol, df, profile=RAW_PARQUET_PROFILE)
+            span["rows"] = len(df)
+    return df, tail
+
+
+def _bar_keys(df):
+    """Set (date, hourx) dari DataFrame atau pyarrow.Table"""
+    if hasattr(df, "column_names"):
+        keys = df.select(["date", "hourx"]).to_pylist()
+    else:
+        keys = df[["date", "hourx"]].to_dict("records")
+    return {(k["date"], int(k["hourx"])) for k in keys}
+
+
+def retry_watermark(symbol, fetched, clean, wib_now):
+    """
+    Watermark setelah insert: jam bar quarantine paling awal (fetch run berikutnya mulai dari situ)
+    atau wib_now kalau tidak ada. Bar yang lebih tua dari QUARANTINE_RETRY tidak menahan watermark.
+    """
+    bars = sorted(
+        datetime.datetime.combine(day, datetime.time(hour))
+        for day, hour in _bar_keys(fetched) - _bar_keys(clean)  # DUPLICATE_HOUR: key-nya tetap masuk
+    )
+    retry = [ts for ts in bars if ts >= wib_now - QUARANTINE_RETRY]
+    if len(retry) < len(bars):
+        logging.warning(f"⚠️ {symbol}: {len(bars) - len(retry)} quarantined bar(s) older than "
+                        f"{QUARANTINE_RETRY} not retried (see DataQualityIssues)")
+    return min(retry[0], wib_now) if retry else wib_now
+
+
+def sql_stage(symbol, df, last_ts, wib_now, recorder, telemetry, fetched=0, context=None):
+    """Validasi + insert delta 1 symbol. Return (result, frame yang benar-benar di-insert)"""
+    # IngestionLog / DataQualityIssues lewat telemetry sink: di-buffer, ditulis 1 transaksi per flush
+    if df is None or len(df) == 0:
+        if fetched:  # data ada tapi sama persis dengan tail cache -> watermark tetap boleh maju
+            telemetry.log_ingestion(symbol, "SUCCESS", "No changes", 0, last_ts, wib_now)
+            return {"symbol": symbol, "status": "SUCCESS", "rows": 0}, None
+        telemetry.log_ingestion(symbol, "WARNING", "No data", 0, last_ts, wib_now)
+        return {"symbol": symbol, "status": "SKIPPED", "rows": 0}, None
+
+    # bar bermasalah di-quarantine sebelum insert; context (tail cache = bar yang sudah commit)
+    # supaya GAP/STALE_CLOSE tetap terdeteksi walau delta cuma 1-3 bar
+    with recorder.span("validate", symbol) as span:
+        span["rows"] = len(df)
+        clean, issues = validate_prices(df, INTERVAL, context=context)
+        span["issues"] = len(issues)
+    watermark = retry_watermark(symbol, df, clean, wib_now) if len(clean) < len(df) else wib_now
+    df = clean
+
+    # error pyodbc keluar dari blok ini -> koneksi dibuang dari pool, bukan dipakai ulang
+    with pooled_connection() as conn, recorder.span("sql_insert", symbol) as span:
+        rows = insert_incremental(conn.cursor(), df, symbol)
+        span["rows"] = rows
+
+    # issue baru dicatat setelah insert commit: kalau insert gagal, run berikutnya validasi ulang delta yang sama
+    telemetry.log_data_quality_issues(issues)
+    telemetry.log_ingestion(symbol, "SUCCESS", "Ingest OK", rows, last_ts, wib_now)
+    return {"symbol": symbol, "status": "SUCCESS", "rows": rows, "watermark": watermark}, df
+
+
+def run_ingest(wib_now, blob_client, symbols=None, recorder=None, downloader=None, scheduler=None):
+    """
+    1 run ingest crypto sebagai pipeline: fetch → blob → SQL → watermark.
+    Stage disambung queue bounded (backpressure), jadi fetch grup berikutnya jalan
+    selagi symbol sebelumnya masih upload/insert. Kerja tiap stage dijalankan lewat
+    scheduler dengan limit per dependency (price_api, blob, sql).
+    """
+    symbols = symbols or CRYPTOS
+    recorder = recorder or RunRecorder("Crypto")
+
+    with pooled_connection() as conn:  # sekaligus test koneksi (koneksinya tetap di pool)
+        with recorder.span("watermark_load"):
+            watermarks = get_last_success_bulk(conn.cursor(), symbols)
+
+    results = []
+    pending = {}
+    for s, ts in watermarks.items():
+        logging.info(f"📍 {s} last success = {ts}")
+        if ts >= wib_now:
+            logging.info(f"⏩ {s} skipped (up-to-date)")
+            results.append({"symbol": s, "status": "SKIPPED", "rows": 0})
+        else:
+            pending[s] = ts
+
+    fetch_from = {s: ts - TAIL_REFETCH for s, ts in pending.items()}
+    lock = threading.Lock()
+    telemetry = TelemetrySink()
+
+    def add_result(result):
+        with lock:
+            results.append(result)
+
+    def fetch(item):
+        start, group = item
+        frames = fetch_stage(start, group, fetch_from, wib_now, recorder, downloader)
+        for s in group:
+            logging.info(f"🚀 Start {s}")
+        return [(s, frames.get(s)) for s in group]
+
+    def upload(item):
+        symbol, df = item
+        if df is None or len(df) == 0:
+            return [(symbol, df, 0, None)]
+        delta, tail = blob_stage(symbol, blob_client, df, recorder)
+        return [(symbol, delta, len(df), tail)]
+
+    def insert(item):
+        symbol, df, fetched, tail = item
+        result, inserted = sql_stage(symbol, df, pending[symbol], wib_now, recorder, telemetry, fetched, context=tail)
+        if result["status"] == "SUCCESS" and inserted is not None and len(inserted):
+            # tail cache hanya berisi bar yang sudah commit ke SQL (tanpa bar yang di-quarantine,
+            # supaya bar itu tetap terhitung "baru" saat di-fetch ulang, lihat retry_watermark)
+            update_tail_cache(blob_client, symbol, inserted, tail)
+        add_result(result)
+        return [result] if result["status"] == "SUCCESS" else []
+
+    # watermark hanya maju setelah insert symbol itu commit (maksimal sampai bar quarantine pertama);
+    # ditulis bersama log di flush sink
+    def advance(result):
+        telemetry.update_last_success(result["symbol"], result.get("watermark", wib_now))
+
+    def on_error(stage, item, error):
+        failed = item[1] if stage == "fetch" else [item[0]] if stage in ("blob", "sql") else []
+        for s in failed:
+            logging.error(f"❌ Error process {s} ({stage}): {error}", exc_info=error)
+            add_result({"symbol": s, "status": "FAILED", "rows": 0})
+
+    own_scheduler = scheduler is None
+    scheduler = scheduler or Scheduler()
+    limits = scheduler.limits
+    pipeline = Pipeline([
+        Stage("fetch", fetch, workers=limits["price_api"].maximum, resource="price_api"),
+        Stage("blob", upload, workers=limits["blob"].maximum, resource="blob"),
+        # sql tidak di-retry otomatis: MERGE bisa sudah commit sebelum error (log dobel, rows=0 palsu);
+        # symbol yang gagal tetap di watermark lama dan diulang run berikutnya
+        Stage("sql", insert, workers=limits["sql"].maximum, resource="sql", retries=1),
+        Stage("watermark", advance),
+    ], scheduler=scheduler, on_error=on_error)
+
+    # grup watermark dipecah jadi batch kecil supaya fetch mengalir dan memori tetap terbatas
+    groups = (
+        (start, group[i:i + FETCH_BATCH_SIZE])
+        for start, group in group_by_watermark(fetch_from)
+        for i in range(0, len(group), FETCH_BATCH_SIZE)
+    )
     try:
-        last_ts = get_last_success(cursor, symbol)
-        logging.info(f"📍 Last success = {last_ts}")
-
-        if last_ts >= wib_now:
-            logging.info(f"⏩ {symbol} skipped (up-to-date)")
-            return {"symbol": symbol, "status": "SKIPPED", "rows": 0}
-
-        df = fetch_data(symbol, last_ts, wib_now, INTERVAL)
-        if df.empty:
-            log_ingestion(cursor, symbol, "WARNING", "No data", 0, last_ts, wib_now)
-            return {"symbol": symbol, "status": "SKIPPED", "rows": 0}
+        stats = pipeline.run(groups)
+    finally:
+        with recorder.span("telemetry_flush") as span:
+            span["rows"] = telemetry.close()
+        if own_scheduler:
+            scheduler.close()
+    logging.info(f"🧵 Pipeline: {stats}")
+    logging.info(f"📝 Telemetry: {telemetry.metrics()}")
+    logging.info(f"🚦 Scheduler limits: {scheduler.metrics()}")
 
-        save_raw_to_blob(blob_client, symbol, df)
-        rows = insert_incremental(cursor, df, symbol)
-        log_ingestion(cursor, symbol, "SUCCESS", "Ingest OK", rows, last_ts, wib_now)
-        update_last_success(cursor, symbol, wib_now)
+    save_run_record(recorder.finish())
 
-        return {"symbol": symbol, "status": "SUCCESS", "rows": rows}
+    return results
 
-    except Exception as e:
-        logging.error(f"❌ Error process {symbol}: {e}", exc_info=True)
-        return {"symbol": symbol, "status": "FAILED", "rows": 0}
-
-    finally:
-        cursor.close(); conn.close()
+startup_profile.report("TimerCryptoIngest")
 
 # MAIN function Azure
 def main(timer: func.TimerRequest) -> None:
     try:
-        started_at = datetime.datetime.utcnow()
+        recorder = RunRecorder("Crypto")
         utc_now = datetime.datetime.now(datetime.timezone.utc).replace(minute=0, second=0, microsecond=0)
         wib_now = utc_now.astimezone(ZoneInfo("Asia/Jakarta")).replace(tzinfo=None)
 
         log_header(f"TimerCryptoIngest started at {wib_now}")
 
         blob_client = connect_blob()
-        connect_sql().close()  # test koneksi
-
-        results = []
-        with ThreadPoolExecutor(max_workers=2) as executor:
-            future_to_symbol = {executor.submit(process_symbol, s, blob_client, wib_now): s for s in CRYPTOS}
-            for future in as_completed(future_to_symbol):
-                results.append(future.result())
+        results = run_ingest(wib_now, blob_client, recorder=recorder)
 
-        finished_at = datetime.datetime.utcnow()
-        log_summary(results, started_at, finished_at)
+        log_summary(results, recorder.started_at, recorder.finished_at, entity="Crypto")
+        recorder.log_record()
+        logging.info(f"🔌 SQL pool: {pool_metrics()}")
 
     except Exception as fatal:
         logging.error(f"🔥 Fatal error in TimerCryptoIngest: {fatal}", exc_info=True)
@@ -1,11 +1,35 @@
-import os, datetime, logging
+from utils import startup_profile
+startup_profile.enable_from_env()
+
+import os, datetime, logging, threading
+from concurrent.futures import ThreadPoolExecutor
 import azure.functions as func
-import requests, pandas as pd
-from utils.db_handler import connect_sql, insert_news
+import requests
+from requests.adapters import HTTPAdapter
+from utils.db_handler import (
+    pooled_connection, insert_news, save_run_record, get_last_success, update_last_success_bulk,
+    get_markers, clear_markers
+)
+from utils.instrumentation import RunRecorder
 from dotenv import load_dotenv
 
 load_dotenv()
 API_KEY = os.getenv("NEWSAPI_KEY")
+NEWS_API_URL = os.getenv("NEWS_API_URL", "https://newsapi.org/v2/everything")
+# source watermark di IngestionMetadata: publishedAt terbaru yang sudah masuk (UTC naive)
+NEWS_SOURCE = "NewsAPI"
+NEWS_PAGE_SIZE = int(os.getenv("NEWS_PAGE_SIZE", "100"))  # maksimum NewsAPI
+NEWS_MAX_PAGES = int(os.getenv("NEWS_MAX_PAGES", "5"))
+NEWS_FETCH_WORKERS = int(os.getenv("NEWS_FETCH_WORKERS", "4"))
+NEWS_HTTP_TIMEOUT = float(os.getenv("NEWS_HTTP_TIMEOUT", "10"))
+# run pertama / watermark yang sudah terlalu lama: mundur maksimal sejauh ini
+NEWS_MAX_LOOKBACK = datetime.timedelta(days=int(os.getenv("NEWS_MAX_LOOKBACK_DAYS", "1")))
+# artikel bisa ter-index NewsAPI terlambat: query mulai watermark - lag, duplikat dibuang dedup URL
+NEWS_LAG = datetime.timedelta(hours=float(os.getenv("NEWS_LAG_HOURS", "2")))
+# run terpotong (burst > NEWS_MAX_PAGES page / page error): publishedAt tertua & terbaru yang sudah
+# diambil. Run berikutnya mengisi gap watermark..until dulu, watermark loncat ke newest setelah gap penuh
+NEWS_UNTIL_SOURCE = f"{NEWS_SOURCE}:until"
+NEWS_NEWEST_SOURCE = f"{NEWS_SOURCE}:newest"
 logging.basicConfig(level=logging.INFO)
 
 def log_header(title: str):
@@ -13,44 +37,165 @@ def log_header(title: str):
     logging.info(title)
     logging.info("="*80)
 
-def fetch_crypto_news(query="crypto OR bitcoin", from_days=1, page_size=10):
-    url = "https://newsapi.org/v2/everything"
-    from_date = (datetime.datetime.utcnow() - datetime.timedelta(days=from_days)).strftime("%Y-%m-%d")
+# --- HTTP session (bertahan selama worker Functions masih warm) ---
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+
+def get_session():
+    """requests.Session module-level: koneksi keep-alive dipakai ulang antar page dan antar invocation"""
+    global _SESSION
+    if _SESSION is None:
+        with _SESSION_LOCK:
+            if _SESSION is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=NEWS_FETCH_WORKERS)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _SESSION = session
+    return _SESSION
 
-    params = {"q": query, "from": from_date, "language": "en", "pageSize": page_size, "apiKey": API_KEY}
-    r = requests.get(url, params=params)
+def _published(article):
+    """publishedAt NewsAPI ("...Z") -> datetime UTC naive"""
+    return datetime.datetime.fromisoformat(article["publishedAt"].replace("Z", "+00:00")).replace(tzinfo=None)
+
+def _get_page(http, params, page):
+    r = http.get(NEWS_API_URL, params={**params, "page": page}, timeout=NEWS_HTTP_TIMEOUT)
     data = r.json()
     if r.status_code != 200 or "articles" not in data:
         raise Exception(f"NewsAPI error: {data}")
+    return data
+
+def _fetch_news(query="crypto OR bitcoin", since=None, until=None, page_size=NEWS_PAGE_SIZE,
+                max_pages=NEWS_MAX_PAGES, http=None, workers=NEWS_FETCH_WORKERS):
+    """
+    Ambil artikel dengan since <= publishedAt <= until (until None = sampai sekarang), terbaru dulu.
+    Return (articles, complete); complete False kalau paging berhenti sebelum sampai `since`
+    (batas max_pages atau page error), artinya artikel lebih lama dari yang terambil belum diambil.
+
+    Page 1 diambil dulu (sekaligus totalResults), page berikutnya paralel per gelombang `workers`
+    page lewat session yang sama. Paging berhenti begitu ketemu artikel yang sudah dikenal
+    (publishedAt < since) atau page terakhir, jadi run rutin biasanya cukup 1 request.
+    Error di page > 1 tidak membuang page yang sudah terambil, paging saja yang berhenti.
+    """
+    http = http or get_session()
+    params = {
+        "q": query, "from": since.strftime("%Y-%m-%dT%H:%M:%S"), "language": "en",
+        "sortBy": "publishedAt", "pageSize": page_size, "apiKey": API_KEY,
+    }
+    if until is not None:
+        params["to"] = until.strftime("%Y-%m-%dT%H:%M:%S")
+
+    first = _get_page(http, params, 1)  # page 1 gagal = tidak ada yang bisa dipakai, lempar
+    pages = [first["articles"]]
+    total = first.get("totalResults", 0)  # jumlah artikel di window (filter from/to di server)
+    total_pages = -(-total // page_size)
+
+    def reached_known(articles):
+        return len(articles) < page_size or any(_published(a) < since for a in articles)
+
+    complete = total_pages <= 1 or reached_known(pages[-1])
+    page, last_page = 2, min(max_pages, total_pages)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        while not complete and page <= last_page:
+            wave = range(page, min(page + workers, last_page + 1))
+            futures = [executor.submit(_get_page, http, params, p) for p in wave]
+            for p, future in zip(wave, futures):
+                try:
+                    articles = future.result()["articles"]
+                except Exception as e:
+                    # page setelahnya tidak dipakai: artikel di page gagal ini jadi bolong
+                    logging.warning(f"⚠️ NewsAPI page {p} gagal, paging berhenti di {len(pages)} page: {e}")
+                    last_page = 0
+                    break
+                pages.append(articles)
+                if reached_known(articles) or p == total_pages:
+                    complete = True
+                    break  # page setelahnya (kalau ikut terambil di gelombang ini) dibuang
+            page = wave[-1] + 1
 
-    return pd.DataFrame([{
+    if not complete:
+        logging.warning(f"⚠️ NewsAPI: {total} artikel sejak {since}, baru {len(pages)} page terbaru yang diambil")
+
+    articles = [{
         "title": a["title"],
         "description": a.get("description"),
         "content": a.get("content"),
         "publishedAt": a["publishedAt"],
         "source": a["source"]["name"],
         "url": a["url"]
-    } for a in data["articles"]])
+    } for articles in pages for a in articles
+        if _published(a) >= since and (until is None or _published(a) <= until)]
+    return articles, complete
+
+def fetch_crypto_news(query="crypto OR bitcoin", since=None, from_days=1, **kwargs):
+    """Ambil artikel yang publishedAt >= since (datetime UTC, default sekarang - from_days), terbaru dulu"""
+    since = since or datetime.datetime.utcnow() - datetime.timedelta(days=from_days)
+    return _fetch_news(query, since, **kwargs)[0]
 
-def process_news():
+def process_news(recorder, http=None, now=None):
+    """
+    1 run ingest news. Window query: watermark - NEWS_LAG sampai sekarang, atau sampai marker until
+    kalau run sebelumnya terpotong (gap diisi dulu, artikel yang lebih baru sudah masuk).
+    """
     try:
-        df_news = fetch_crypto_news(from_days=1, page_size=5)
-        if df_news.empty:
-            return {"source": "NewsAPI", "status": "SKIPPED", "rows": 0}
-        rows = insert_news(df_news)
-        return {"source": "NewsAPI", "status": "SUCCESS", "rows": rows}
+        now = now or datetime.datetime.utcnow()
+        with pooled_connection() as conn, recorder.span("watermark_load", NEWS_SOURCE):
+            cursor = conn.cursor()
+            watermark = get_last_success(cursor, NEWS_SOURCE)
+            markers = get_markers(cursor, [NEWS_UNTIL_SOURCE, NEWS_NEWEST_SOURCE])
+        # artikel di sekitar watermark ikut diambil lagi (telat ter-index), dedup URL di insert_news
+        since = max(watermark - NEWS_LAG, now - NEWS_MAX_LOOKBACK)
+        until = markers.get(NEWS_UNTIL_SOURCE)
+        if until is not None and until <= since:  # gap sudah di luar lookback, tidak dikejar lagi
+            until = None
+        with recorder.span("fetch", NEWS_SOURCE) as span:
+            articles, complete = _fetch_news(since=since, until=until, http=http)
+            span["rows"] = len(articles)
+
+        published = [_published(a) for a in articles]
+        # terpotong di dalam window lag saja (semua yang lebih baru dari watermark sudah terambil) = lengkap
+        complete = complete or (bool(published) and min(published) <= max(watermark, since))
+
+        rows = 0
+        if articles:
+            with recorder.span("sql_insert", NEWS_SOURCE) as span:
+                rows = insert_news(articles)
+                span["rows"] = rows
+
+        # watermark / marker maju hanya setelah insert sukses
+        newest = max(published + [markers.get(NEWS_NEWEST_SOURCE, watermark)])
+        with pooled_connection() as conn, recorder.span("watermark_update", NEWS_SOURCE):
+            cursor = conn.cursor()
+            if complete:
+                if newest > watermark:
+                    update_last_success_bulk(cursor, {NEWS_SOURCE: newest})
+                clear_markers(cursor, [NEWS_UNTIL_SOURCE, NEWS_NEWEST_SOURCE])
+            elif published:
+                # yang lebih lama dari artikel tertua yang terambil belum masuk: watermark tetap,
+                # run berikutnya mengambil since..until
+                update_last_success_bulk(cursor, {NEWS_UNTIL_SOURCE: min(published), NEWS_NEWEST_SOURCE: newest})
+
+        if not articles:
+            return {"source": NEWS_SOURCE, "status": "SKIPPED", "rows": 0}
+        return {"source": NEWS_SOURCE, "status": "SUCCESS", "rows": rows}
     except Exception as e:
         logging.error(f"❌ Error fetch news: {e}", exc_info=True)
-        return {"source": "NewsAPI", "status": "FAILED", "rows": 0}
+        return {"source": NEWS_SOURCE, "status": "FAILED", "rows": 0}
+
+startup_profile.report("TimerNewsIngest")
 
 def main(timer: func.TimerRequest) -> None:
     try:
-        started_at = datetime.datetime.utcnow()
+        recorder = RunRecorder("News")
         log_header("TimerNewsIngest started")
 
-        connect_sql().close()  # test koneksi
-        result = process_news()
+        with pooled_connection():  # test koneksi (koneksinya tetap di pool)
+            pass
+        result = process_news(recorder)
         logging.info(f"📊 Result: {result}")
 
+        save_run_record(recorder.finish())
+        recorder.log_record()
+
     except Exception as fatal:
         logging.error(f"🔥 Fatal error in TimerNewsIngest: {fatal}", exc_info=True)
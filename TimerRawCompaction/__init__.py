@@ -0,0 +1,35 @@
+from utils import startup_profile
+startup_profile.enable_from_env()
+
+import os, datetime, logging
+import azure.functions as func
+from utils.blob_handler import connect_blob, compact_raw_zone
+from dotenv import load_dotenv
+
+load_dotenv()
+# berapa hari ke belakang yang di-compact (file telat bisa masuk ke partisi kemarin)
+LOOKBACK_DAYS = int(os.getenv("COMPACTION_LOOKBACK_DAYS", "2"))
+# encoding profile Parquet untuk file hasil compaction (lihat blob_handler.PARQUET_PROFILES)
+COMPACTION_PARQUET_PROFILE = os.getenv("COMPACTION_PARQUET_PROFILE", "archive")
+logging.basicConfig(level=logging.INFO)
+
+def log_header(title: str):
+    logging.info("="*80)
+    logging.info(title)
+    logging.info("="*80)
+
+startup_profile.report("TimerRawCompaction")
+
+def main(timer: func.TimerRequest) -> None:
+    try:
+        today = datetime.datetime.utcnow().date()
+        log_header(f"TimerRawCompaction started for {LOOKBACK_DAYS} day(s) before {today}")
+
+        blob_client = connect_blob()
+        for offset in range(1, LOOKBACK_DAYS + 1):
+            day = today - datetime.timedelta(days=offset)
+            compacted = compact_raw_zone(blob_client, day, profile=COMPACTION_PARQUET_PROFILE)
+            logging.info(f"📦 {day}: {len(compacted)} partition(s) compacted")
+
+    except Exception as fatal:
+        logging.error(f"🔥 Fatal error in TimerRawCompaction: {fatal}", exc_info=True)
@@ -0,0 +1,89 @@
+"""
+Micro-benchmark: curated batch pandas vs Arrow-native (curate -> Parquet -> parameter SQL).
+
+Tiap jalur dijalankan di proses sendiri supaya peak memory (heap Python + memory pool Arrow)
+tidak saling tercampur. Jalankan dari root repo:
+
+    python -m benchmarks.bench_arrow --symbols 20 --hours 8760
+"""
+import argparse, json, os, subprocess, sys, tempfile, time, tracemalloc
+import pandas as pd
+
+PATHS = ("pandas", "arrow")
+
+
+def run_path(path, n_symbols, hours):
+    import pyarrow as pa
+    from benchmarks import fakes
+    from utils.blob_handler import stream_parquet_to_blob
+    from utils.data_fetcher import _curate, curate_arrow
+    from utils.db_handler import encode_rows, CRYPTO_PRICE_SCHEMA
+
+    end = pd.Timestamp("2025-06-01")
+    raws = {
+        f"SYN{i}-USD": fakes.synthetic_bars(f"SYN{i}-USD", end - pd.Timedelta(hours=hours), end)
+        for i in range(n_symbols)
+    }
+    curate = curate_arrow if path == "arrow" else _curate
+    container = fakes.local_blob_service(tempfile.mkdtemp(prefix="bench_arrow_")).get_container_client("bench")
+
+    timings = {"curate": 0.0, "parquet": 0.0, "encode": 0.0}
+    batch_bytes, rows = 0, 0
+    tracemalloc.start()
+    for symbol, raw in raws.items():
+        t0 = time.perf_counter()
+        curated = curate(raw, symbol)
+        t1 = time.perf_counter()
+        stream_parquet_to_blob(container, f"{symbol}.parquet", curated)
+        t2 = time.perf_counter()
+        params = encode_rows(curated, CRYPTO_PRICE_SCHEMA)
+        t3 = time.perf_counter()
+
+        timings["curate"] += t1 - t0
+        timings["parquet"] += t2 - t1
+        timings["encode"] += t3 - t2
+        rows += len(params)
+        batch_bytes = max(
+            batch_bytes, curated.nbytes if path == "arrow" else int(curated.memory_usage(deep=True).sum())
+        )
+        del curated, params
+    _, heap_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "path": path, "rows": rows, **{k: round(v, 3) for k, v in timings.items()},
+        "batch_mb": round(batch_bytes / 1024 / 1024, 2),
+        "heap_peak_mb": round(heap_peak / 1024 / 1024, 1),
+        "arrow_peak_mb": round(pa.default_memory_pool().max_memory() / 1024 / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Curated batch pandas vs Arrow-native.")
+    parser.add_argument("--symbols", type=int, default=20)
+    parser.add_argument("--hours", type=int, default=24 * 365)
+    parser.add_argument("--path", choices=PATHS, help=argparse.SUPPRESS)  # dipakai proses anak
+    args = parser.parse_args()
+
+    if args.path:
+        print(json.dumps(run_path(args.path, args.symbols, args.hours)))
+        return
+
+    results = []
+    for path in PATHS:
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_arrow", "--path", path,
+             "--symbols", str(args.symbols), "--hours", str(args.hours)],
+            capture_output=True, text=True, check=True, env={**os.environ, "LOG_LEVEL": "WARNING"},
+        )
+        results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    print(f"{args.symbols} symbol x {args.hours} jam")
+    print(f"{'path':<7} | {'curate s':>8} | {'parquet s':>9} | {'encode s':>8} | {'batch MB':>8} | {'heap MB':>7} | {'arrow MB':>8}")
+    for r in results:
+        print(f"{r['path']:<7} | {r['curate']:>8.3f} | {r['parquet']:>9.3f} | {r['encode']:>8.3f} | "
+              f"{r['batch_mb']:>8.2f} | {r['heap_peak_mb']:>7.1f} | {r['arrow_peak_mb']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Benchmark coin tagger atas korpus berita sintetis.
+
+Bandingkan loop regex lama (re.search per pattern, first match saja) dengan
+detect_coin() per artikel dan tag_series() yang vectorized. Jalankan dari root repo:
+
+    python -m benchmarks.bench_coin_tagger --articles 100000
+"""
+import argparse, random, re, time
+import pandas as pd
+from utils.news_coin_mapper import detect_coin, tag_series
+
+LEGACY_COIN_MAP = {
+    r"\b(bitcoin|btc)\b": "BTC-USD",
+    r"\b(ethereum|eth)\b": "ETH-USD",
+    r"\b(solana|sol)\b": "SOL-USD",
+    r"\bxrp\b": "XRP-USD",
+    r"\bdoge|dogecoin\b": "DOGE-USD"
+}
+
+FILLER = (
+    "markets traders rally price analysts said on tuesday regulators exchange "
+    "inflation token volume fund etf outflow support resistance macro week"
+).split()
+MENTIONS = ["Bitcoin", "BTC", "Ethereum", "ETH", "Solana", "XRP", "Dogecoin", "DOGE"]
+
+
+def legacy_detect_coin(text):
+    text = str(text).lower()
+    for pattern, coin in LEGACY_COIN_MAP.items():
+        if re.search(pattern, text):
+            return coin
+    return "ALL"
+
+
+def synthetic_corpus(n_articles, seed=7):
+    """Title + content ala NewsAPI (~60 kata, 0-3 sebutan coin per artikel)"""
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(n_articles):
+        words = rng.choices(FILLER, k=60)
+        for _ in range(rng.randint(0, 3)):
+            words.insert(rng.randrange(len(words)), rng.choice(MENTIONS))
+        texts.append(" ".join(words))
+    return pd.Series(texts)
+
+
+def timed(label, func, n):
+    t0 = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - t0
+    print(f"{label:<18} | {elapsed:>7.3f}s | {n / elapsed:>10,.0f} articles/s")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--articles", type=int, default=100_000)
+    args = parser.parse_args()
+
+    corpus = synthetic_corpus(args.articles)
+    print(f"Tagging {args.articles:,} synthetic articles")
+    print("-" * 52)
+    legacy = timed("legacy re.search", lambda: corpus.map(legacy_detect_coin), args.articles)
+    timed("detect_coin", lambda: corpus.map(detect_coin), args.articles)
+    vectorized = timed("tag_series", lambda: tag_series(corpus), args.articles)
+    print("-" * 52)
+    print(f"Speedup tag_series vs legacy: {legacy / vectorized:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
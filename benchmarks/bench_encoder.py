@@ -0,0 +1,89 @@
+"""
+Micro-benchmark: DataFrame -> parameter rows untuk executemany.
+
+Bandingkan jalur lama (df.iterrows + pd.notna/float()/int() per sel) dengan
+encode_rows() yang vectorized per kolom. Jalankan dari root repo:
+
+    python -m benchmarks.bench_encoder --rows 200000
+"""
+import argparse, time
+import numpy as np
+import pandas as pd
+from utils.db_handler import encode_rows, CRYPTO_PRICE_SCHEMA
+
+
+def synthetic_prices(n_rows, symbol="BTC-USD", seed=42):
+    """Frame curated (date/hourx/crypto/OHLCV) dengan ~1% NaN"""
+    rng = np.random.default_rng(seed)
+    ts = pd.date_range("2020-01-01", periods=n_rows, freq="h")
+    close = 30000 + rng.standard_normal(n_rows).cumsum() * 50
+    df = pd.DataFrame({
+        "date": ts.date,
+        "hourx": ts.hour,
+        "crypto": symbol,
+        "Open": close + rng.normal(0, 5, n_rows),
+        "High": close + 20,
+        "Low": close - 20,
+        "Close": close,
+        "Volume": rng.integers(1_000, 1_000_000, n_rows).astype("float64"),
+    })
+    df.loc[rng.random(n_rows) < 0.01, ["Open", "Volume"]] = np.nan
+    return df
+
+
+def legacy_rows(df):
+    """Salinan jalur lama insert_incremental (per baris)"""
+    return [
+        (
+            row['date'],
+            int(row['hourx']) if pd.notna(row['hourx']) else None,
+            str(row['crypto']),
+            float(row['Open']) if pd.notna(row['Open']) else None,
+            float(row['High']) if pd.notna(row['High']) else None,
+            float(row['Low']) if pd.notna(row['Low']) else None,
+            float(row['Close']) if pd.notna(row['Close']) else None,
+            int(row['Volume']) if pd.notna(row['Volume']) else None,
+        )
+        for _, row in df.iterrows()
+    ]
+
+
+def timed(label, func, n_rows, repeat):
+    best = min(_run_once(func) for _ in range(repeat))
+    print(f"{label:<14} | {best:>8.3f}s | {n_rows / best:>12,.0f} rows/s")
+    return best
+
+
+def _run_once(func):
+    t0 = time.perf_counter()
+    func()
+    return time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    df = synthetic_prices(args.rows)
+    assert legacy_rows(df.head(1000)) == encode_rows(df.head(1000), CRYPTO_PRICE_SCHEMA)
+
+    print(f"Encoding {args.rows:,} rows (best of {args.repeat})")
+    print("-" * 48)
+    legacy = timed("iterrows", lambda: legacy_rows(df), args.rows, args.repeat)
+    vectorized = timed("encode_rows", lambda: encode_rows(df, CRYPTO_PRICE_SCHEMA), args.rows, args.repeat)
+
+    try:
+        import pyarrow as pa
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        timed("encode_rows/pa", lambda: encode_rows(table, CRYPTO_PRICE_SCHEMA), args.rows, args.repeat)
+    except ImportError:
+        pass
+
+    print("-" * 48)
+    print(f"Speedup: {legacy / vectorized:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+load_history cold (cache kosong, semua tanggal di-fetch) vs warm (semua tanggal dari cache memory-mapped).
+
+Data sintetis ditulis ke blob lokal (zona incremental/) dan sqlite, lalu range yang sama dibaca
+berulang dari tiap source:
+
+    python -m benchmarks.bench_history --symbols 10 --days 90 --repeat 5
+"""
+import argparse, datetime, os, shutil, statistics, tempfile, time
+from benchmarks import fakes
+from utils import config, db_handler, history
+from utils.blob_handler import save_raw_to_blob
+from utils.data_fetcher import curate_arrow
+
+
+def main():
+    parser = argparse.ArgumentParser(description="load_history cold vs warm cache.")
+    parser.add_argument("--symbols", type=int, default=10)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="bench_history_")
+    config.SQL_CONN_STRING = fakes.create_sqlite_db(os.path.join(root, "history.db"))
+    db_handler.reset_pool()
+    blob = fakes.local_blob_service(os.path.join(root, "blob"))
+    container = blob.get_container_client(config.BLOB_CONTAINER)
+
+    symbols = [f"SYN{i}-USD" for i in range(args.symbols)]
+    start = datetime.datetime(2025, 1, 1)
+    end = start + datetime.timedelta(days=args.days)
+    with db_handler.pooled_connection() as conn:
+        for symbol in symbols:
+            curated = curate_arrow(fakes.synthetic_bars(symbol, start, end), symbol)
+            save_raw_to_blob(blob, symbol, curated)
+            db_handler.insert_incremental(conn.cursor(), curated, symbol)
+        conn.commit()
+
+    print(f"{args.symbols} symbol x {args.days} hari, {args.repeat} run")
+    print(f"{'source':<6} | {'cold p50 s':>10} | {'warm p50 s':>10} | {'rows':>8}")
+    cache_dir = os.path.join(root, "cache")
+    for source in ("blob", "sql"):
+        cold, warm = [], []
+        for _ in range(args.repeat):
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            for timings in (cold, warm):
+                t0 = time.perf_counter()
+                df = history.load_history(symbols, start, end, source=source, cache_dir=cache_dir,
+                                          container_client=container)
+                timings.append(time.perf_counter() - t0)
+        print(f"{source:<6} | {statistics.median(cold):>10.3f} | {statistics.median(warm):>10.3f} | {len(df):>8}")
+    print(f"stats: {history.history_stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Encoding profile Parquet (blob_handler.PARQUET_PROFILES) + CSV bulk_loader sebagai pembanding.
+
+OHLCV sintetis multi-symbol (urutan per symbol, seperti hasil backfill) ditulis 1 file per
+profile ke blob lokal, lalu dibaca ulang: scan penuh dan scan 1 symbol x 7 hari (filter, jadi
+row group di-skip lewat statistik kalau file di-sort):
+
+    python -m benchmarks.bench_parquet --symbols 20 --hours 8760 --repeat 3
+"""
+import argparse, datetime, io, os, statistics, tempfile, time
+from benchmarks import fakes
+from utils.blob_handler import PARQUET_PROFILES, stream_csv_to_blob, stream_parquet_to_blob
+from utils.data_fetcher import curate_arrow
+
+
+def _timed(fn, repeat):
+    """(median detik, hasil run terakhir)"""
+    timings, result = [], None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - t0)
+    return statistics.median(timings), result
+
+
+def main():
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    import pyarrow.parquet as pq
+
+    parser = argparse.ArgumentParser(description="Ukuran/kecepatan encoding profile Parquet.")
+    parser.add_argument("--symbols", type=int, default=20)
+    parser.add_argument("--hours", type=int, default=24 * 365)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    end = datetime.datetime(2025, 6, 1)
+    start = end - datetime.timedelta(hours=args.hours)
+    symbols = [f"SYN{i}-USD" for i in range(args.symbols)]
+    table = pa.concat_tables([
+        curate_arrow(fakes.synthetic_bars(s, start, end), s) for s in symbols
+    ]).unify_dictionaries().combine_chunks()
+    # scan selektif: 1 symbol di tengah, 7 hari di tengah range
+    pick = symbols[len(symbols) // 2]
+    lo = (start + (end - start) / 2).date()
+    filters = [("crypto", "=", pick), ("date", ">=", lo), ("date", "<", lo + datetime.timedelta(days=7))]
+
+    root = tempfile.mkdtemp(prefix="bench_parquet_")
+    container = fakes.local_blob_service(root).get_container_client("bench")
+    read = lambda name: container.download_blob(name).readall()
+
+    print(f"{args.symbols} symbol x {args.hours} jam = {table.num_rows:,} rows "
+          f"({table.nbytes / 1024 / 1024:.1f} MB Arrow), median {args.repeat} run")
+    print(f"{'profile':<8} | {'encode s':>8} | {'MB':>7} | {'ratio':>5} | {'full scan s':>11} | {'filter scan s':>13} | {'row groups':>10}")
+
+    for name in [*PARQUET_PROFILES, "csv"]:
+        blob_name = f"{name}.{'csv' if name == 'csv' else 'parquet'}"
+        if name == "csv":
+            encode_s, _ = _timed(lambda: stream_csv_to_blob(container, blob_name, table), args.repeat)
+            data = read(blob_name)
+            full_s, _ = _timed(lambda: pacsv.read_csv(io.BytesIO(data)), args.repeat)
+            filter_s, groups = float("nan"), "-"
+        else:
+            encode_s, _ = _timed(lambda: stream_parquet_to_blob(container, blob_name, table, name), args.repeat)
+            data = read(blob_name)
+            full_s, _ = _timed(lambda: pq.read_table(io.BytesIO(data)), args.repeat)
+            filter_s, picked = _timed(lambda: pq.read_table(io.BytesIO(data), filters=filters), args.repeat)
+            assert picked.num_rows == 7 * 24, picked.num_rows
+            groups = pq.ParquetFile(io.BytesIO(data)).num_row_groups
+        print(f"{name:<8} | {encode_s:>8.3f} | {len(data) / 1024 / 1024:>7.2f} | "
+              f"{table.nbytes / len(data):>5.1f} | {full_s:>11.3f} | {filter_s:>13.3f} | {groups:>10}")
+
+
+if __name__ == "__main__":
+    main()
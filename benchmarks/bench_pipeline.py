@@ -0,0 +1,263 @@
+"""
+Benchmark end-to-end pipeline secara offline (tanpa yfinance/NewsAPI/Azure).
+
+Skenario:
+  crypto  - TimerCryptoIngest.run_ingest: watermark -> fetch batch -> blob -> validate -> MERGE
+  news    - fetch_crypto_news + insert_news terhadap responder NewsAPI kaleng
+  news_incremental - process_news dengan watermark publishedAt terhadap server NewsAPI lokal
+  backfill- bulk_loader.run_backfill (CSV/Parquet stream ke blob lokal, BULK INSERT diganti load SQLite)
+
+Hasil (rows/s, peak memory, waktu per stage) dibandingkan dengan benchmarks/baseline.json
+(key = skenario + parameter, tiap entry menyimpan mesin tempat diukur):
+
+    python -m benchmarks.bench_pipeline --symbols 10 --hours 720
+    python -m benchmarks.bench_pipeline --repeat 5 --update-baseline
+"""
+import argparse, datetime, io, json, os, platform, sqlite3, sys, tempfile, time, tracemalloc
+from benchmarks import fakes
+from utils import config, db_handler
+from utils.instrumentation import RunRecorder
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), "baseline.json")
+DEFAULT_SYMBOLS = ["BTC-USD", "ETH-USD", "SOL-USD", "XRP-USD", "DOGE-USD", "ADA-USD", "BNB-USD"]
+
+
+def symbol_list(n):
+    return (DEFAULT_SYMBOLS + [f"SYN{i}-USD" for i in range(n)])[:n]
+
+
+def _workspace():
+    root = tempfile.mkdtemp(prefix="bench_pipeline_")
+    config.SQL_CONN_STRING = fakes.create_sqlite_db(os.path.join(root, "bench.db"))
+    db_handler.reset_pool()
+    return root, fakes.local_blob_service(os.path.join(root, "blob"))
+
+
+def _measure(func):
+    """Jalankan func dengan tracemalloc, return (hasil, detik, peak MB)"""
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    try:
+        result = func()
+    finally:
+        elapsed = time.perf_counter() - t0
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return result, elapsed, peak / 1024 / 1024
+
+
+def bench_crypto(n_symbols, hours):
+    import TimerCryptoIngest as crypto
+
+    _, blob_service = _workspace()
+    symbols = symbol_list(n_symbols)
+    end = datetime.datetime(2025, 6, 1)
+    with db_handler.pooled_connection() as conn:
+        db_handler.update_last_success_bulk(conn.cursor(), {s: end - datetime.timedelta(hours=hours) for s in symbols})
+
+    recorder = RunRecorder("Crypto", emit_spans=False)
+    results, elapsed, peak = _measure(lambda: crypto.run_ingest(
+        end, blob_service, symbols=symbols, recorder=recorder, downloader=fakes.synthetic_downloader()
+    ))
+    rows = sum(r["rows"] for r in results)
+    return {"rows": rows, "seconds": elapsed, "peak_mb": peak, "stages": recorder.summary()}
+
+
+def bench_news(n_articles):
+    import TimerNewsIngest as news
+
+    _workspace()
+    db_handler._SEEN_URLS = db_handler._SeenUrlCache(db_handler.NEWS_SEEN_CACHE_SIZE)
+    api = fakes.FakeNewsAPI(n_articles)
+    recorder = RunRecorder("News", emit_spans=False)
+
+    def run():
+        with recorder.span("fetch", "NewsAPI") as span:
+            df = news.fetch_crypto_news(from_days=3650, page_size=n_articles, http=api)
+            span["rows"] = len(df)
+        with recorder.span("sql_insert", "NewsAPI") as span:
+            span["rows"] = db_handler.insert_news(df)
+        with recorder.span("sql_insert_warm", "NewsAPI") as span:
+            span["rows"] = db_handler.insert_news(df)  # run berikutnya: semua URL sudah di cache
+        return len(df)
+
+    rows, elapsed, peak = _measure(run)
+    return {"rows": rows, "seconds": elapsed, "peak_mb": peak, "stages": recorder.summary()}
+
+
+def bench_news_incremental(n_articles, burst=250, latency=0.02):
+    """
+    process_news dengan watermark publishedAt terhadap server NewsAPI lokal (HTTP keep-alive):
+    run 1 mengejar burst `burst` artikel (page paralel), run 2 hanya beberapa artikel baru.
+    """
+    import TimerNewsIngest as news
+
+    _workspace()
+    db_handler._SEEN_URLS = db_handler._SeenUrlCache(db_handler.NEWS_SEEN_CACHE_SIZE)
+    api = fakes.FakeNewsAPI(n_articles, latency=latency)
+    news.NEWS_API_URL, server = api.serve()
+    newest = datetime.datetime.fromisoformat(api.articles[0]["publishedAt"].rstrip("Z"))
+    with db_handler.pooled_connection() as conn:
+        db_handler.update_last_success(conn.cursor(), news.NEWS_SOURCE, newest)
+    now = newest + datetime.timedelta(hours=1)
+    recorder = RunRecorder("News", emit_spans=False)
+
+    def run():
+        rows = 0
+        for label, new in (("burst", burst), ("steady", 3)):
+            api.publish(new)
+            calls = api.calls
+            result = news.process_news(recorder, now=now)
+            rows += result["rows"]
+            print(f"  {label}: {result['rows']} new article(s), {api.calls - calls} request(s)")
+        return rows
+
+    try:
+        rows, elapsed, peak = _measure(run)
+    finally:
+        server.shutdown()
+    print(f"  {api.connections} HTTP connection(s) for {api.calls} request(s)")
+    return {"rows": rows, "seconds": elapsed, "peak_mb": peak, "stages": recorder.summary()}
+
+
+def _sqlite_bulk_insert(blob_service, db_path):
+    """Pengganti bulk_insert_sql: baca CSV/Parquet dari blob lokal lalu dedup insert ke CryptoPrice"""
+
+    def bulk_insert_sql(blob_name, staging="CryptoPrice_staging", fallback=None, source=None):
+        import bulk_loader
+        container = blob_service.get_container_client(bulk_loader.CONTAINER_NAME)
+        if blob_name.endswith(".parquet"):
+            import pyarrow.parquet as pq
+            df = pq.read_table(io.BytesIO(container.download_blob(blob_name).readall())).to_pandas()
+        else:
+            df = fakes.read_blob_csv(container, blob_name)
+        conn = sqlite3.connect(db_path, timeout=30)
+        try:
+            db_handler.upsert_prices(conn.cursor(), df)
+            conn.commit()
+        finally:
+            conn.close()
+
+    return bulk_insert_sql
+
+
+def bench_backfill(n_symbols, hours):
+    import bulk_loader
+
+    _, blob_service = _workspace()
+    db_path = config.SQL_CONN_STRING[len("sqlite:///"):]
+    symbols = symbol_list(n_symbols)
+    end = datetime.date(2025, 6, 1)
+    start = end - datetime.timedelta(days=max(1, hours // 24))
+
+    bulk_loader.yf.download = fakes.synthetic_downloader()
+    bulk_loader.connect_blob = lambda: blob_service
+    bulk_loader.connect_sql = lambda autocommit=False: sqlite3.connect(
+        db_path, timeout=30, isolation_level=None if autocommit else "DEFERRED"
+    )
+    bulk_loader.bulk_insert_sql = _sqlite_bulk_insert(blob_service, db_path)
+
+    recorder = RunRecorder("Backfill", emit_spans=False)
+    failed, elapsed, peak = _measure(lambda: bulk_loader.run_backfill(
+        symbols, start.isoformat(), end.isoformat(), recorder=recorder,
+    ))
+    rows = sum(m["rows"] for stage, m in recorder.summary().items() if stage == "bulk_insert")
+    return {"rows": rows, "seconds": elapsed, "peak_mb": peak, "failed": len(failed), "stages": recorder.summary()}
+
+
+def print_result(name, result):
+    rows_per_s = result["rows"] / result["seconds"] if result["seconds"] else 0
+    print(f"\n{name}: {result['rows']:,} rows in {result['seconds']:.2f}s "
+          f"({rows_per_s:,.0f} rows/s), peak {result['peak_mb']:.1f} MB")
+    print(f"  {'stage':<16} {'count':>5} {'total s':>8} {'p50 s':>7} {'p95 s':>7}")
+    for stage, m in result["stages"].items():
+        print(f"  {stage:<16} {m['count']:>5} {m['total_s']:>8.3f} {m['p50_s']:>7.3f} {m['p95_s']:>7.3f}")
+
+
+def machine_info():
+    """Mesin tempat angka diukur, disimpan di baseline (rows/s antar mesin tidak sebanding)"""
+    import pandas as pd
+    import pyarrow as pa
+
+    return {
+        "platform": platform.platform(), "machine": platform.machine(), "cpus": os.cpu_count(),
+        "python": platform.python_version(), "pandas": pd.__version__, "pyarrow": pa.__version__,
+    }
+
+
+def compare_baseline(results, tolerance):
+    """Tandai skenario yang rows/s-nya turun > tolerance dibanding baseline"""
+    if not os.path.exists(BASELINE_FILE):
+        print("\n(no baseline yet, jalankan dengan --update-baseline)")
+        return []
+    with open(BASELINE_FILE, encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    regressions = []
+    machine = machine_info()
+    print("\nvs baseline:")
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        now = result["rows"] / result["seconds"]
+        before = baseline[key]["rows_per_s"]
+        change = (now - before) / before if before else 0.0
+        flag = "REGRESSION" if change < -tolerance else "ok"
+        print(f"  {key:<28} {before:>12,.0f} -> {now:>12,.0f} rows/s ({change:+.1%}) {flag}")
+        recorded = baseline[key].get("machine", {})
+        if {k: recorded.get(k) for k in ("platform", "cpus")} != {k: machine[k] for k in ("platform", "cpus")}:
+            print(f"    (baseline diukur di {recorded.get('platform')}, {recorded.get('cpus')} CPU: bandingkan dengan hati-hati)")
+        if flag == "REGRESSION":
+            regressions.append(key)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--symbols", type=int, default=7)
+    parser.add_argument("--hours", type=int, default=24 * 30, help="panjang history per symbol")
+    parser.add_argument("--articles", type=int, default=1000)
+    parser.add_argument("--scenarios", default="crypto,news,backfill")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--repeat", type=int, default=1, help="jalankan tiap skenario N kali, pakai run median")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    runners = {
+        "crypto": (f"crypto:{args.symbols}x{args.hours}h", lambda: bench_crypto(args.symbols, args.hours)),
+        "news": (f"news:{args.articles}", lambda: bench_news(args.articles)),
+        "news_incremental": (f"news_incremental:{args.articles}", lambda: bench_news_incremental(args.articles)),
+        "backfill": (f"backfill:{args.symbols}x{args.hours}h", lambda: bench_backfill(args.symbols, args.hours)),
+    }
+    results = {}
+    for name in args.scenarios.split(","):
+        key, run = runners[name.strip()]
+        # mesin kecil/shared noisy (+-25% antar run): median rows/s dari beberapa run lebih stabil
+        runs = sorted((run() for _ in range(max(1, args.repeat))), key=lambda r: r["rows"] / r["seconds"])
+        results[key] = runs[len(runs) // 2]
+        print_result(key, results[key])
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(BASELINE_FILE):
+            with open(BASELINE_FILE, encoding="utf-8") as f:
+                baseline = json.load(f)
+        for key, r in results.items():
+            baseline[key] = {
+                "rows_per_s": round(r["rows"] / r["seconds"], 1),
+                "peak_mb": round(r["peak_mb"], 1),
+                "recorded_at": datetime.datetime.utcnow().isoformat(timespec="seconds"),
+                "repeat": max(1, args.repeat),
+                "machine": machine_info(),
+            }
+        with open(BASELINE_FILE, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"\nBaseline updated: {BASELINE_FILE}")
+        return
+
+    if compare_baseline(results, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Rollup incremental vs hitung ulang penuh, plus cek ekuivalensi hasilnya.
+
+Bar sintetis di-insert per batch kecil lewat insert_incremental (seperti run per jam, termasuk
+revisi beberapa bar terakhir); tiap batch hanya merge bucket yang tersentuh. Di akhir isi
+CryptoPriceRollup dibandingkan dengan compute_rollups atas seluruh CryptoPrice dan rebuild_rollups:
+
+    python -m benchmarks.bench_rollups --symbols 3 --hours 2160 --batch-hours 3
+"""
+import argparse, datetime, os, tempfile, time
+import pandas as pd
+from benchmarks import fakes
+from tests.helpers import compare_rollups, rollup_batches, rollup_table
+from utils import config, db_handler, rollups
+
+def main():
+    parser = argparse.ArgumentParser(description="Rollup incremental vs full recompute.")
+    parser.add_argument("--symbols", type=int, default=3)
+    parser.add_argument("--hours", type=int, default=24 * 90)
+    parser.add_argument("--batch-hours", type=int, default=3)
+    parser.add_argument("--revise-hours", type=int, default=2)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="bench_rollups_")
+    config.SQL_CONN_STRING = fakes.create_sqlite_db(os.path.join(root, "rollups.db"))
+    db_handler.reset_pool()
+    symbols = [f"SYN{i}-USD" for i in range(args.symbols)]
+    start = datetime.datetime(2025, 1, 1)
+
+    incremental, recompute, batches = 0.0, 0.0, 0
+    with db_handler.pooled_connection() as conn:
+        cursor = conn.cursor()
+        for symbol in symbols:
+            for df in rollup_batches(symbol, start, args.hours, args.batch_hours, args.revise_hours):
+                # insert tanpa hook supaya biaya rollup bisa diukur terpisah
+                rollups.ROLLUPS_ENABLED = False
+                db_handler.insert_incremental(cursor, df, symbol)
+                rollups.ROLLUPS_ENABLED = True
+                t0 = time.perf_counter()
+                rollups.update_rollups(cursor, df)  # yang dijalankan hook insert_incremental
+                t1 = time.perf_counter()
+                # pembanding: hitung ulang seluruh history symbol ini tiap batch
+                for interval in rollups.ROLLUP_INTERVALS:
+                    rollups.compute_rollups(rollups._read_prices(cursor, symbol), interval)
+                t2 = time.perf_counter()
+                incremental += t1 - t0
+                recompute += t2 - t1
+                batches += 1
+
+        maintained = rollup_table(cursor)
+        expected = pd.concat(
+            [rollups.compute_rollups(rollups._read_prices(cursor, s), i) for s in symbols for i in rollups.ROLLUP_INTERVALS],
+            ignore_index=True,
+        ).sort_values(["crypto", "interval", "bucket_start"], ignore_index=True)
+
+        t0 = time.perf_counter()
+        rollups.rebuild_rollups(cursor, symbols)
+        rebuild_s = time.perf_counter() - t0
+        rebuilt = rollup_table(cursor)
+
+    print(f"{args.symbols} symbol x {args.hours} jam, {batches} batch x {args.batch_hours} jam "
+          f"(+{args.revise_hours} jam revisi)")
+    print(f"  incremental merge : {incremental / batches * 1000:>8.2f} ms/batch")
+    print(f"  full recompute    : {recompute / batches * 1000:>8.2f} ms/batch")
+    print(f"  rebuild_rollups   : {rebuild_s:>8.2f} s ({len(rebuilt)} rollup rows)")
+
+    ok = True
+    for name, table in (("incremental", maintained), ("rebuild", rebuilt)):
+        same, diff = compare_rollups(table, expected)
+        ok &= same
+        print(f"  {name:<11} vs full recompute: {'OK' if same else 'MISMATCH'} (max abs diff {diff:.3g})")
+    if not ok:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+Stand-in lokal yang deterministik untuk benchmark tanpa network/Azure:
+generator OHLCV di seam yf.download, responder/server HTTP NewsAPI, container Blob di filesystem
+(utils.local_blob) dan database SQLite dengan skema CryptoPrice/CryptoPriceRollup/CryptoNews/IngestionMetadata.
+"""
+import datetime, hashlib, http.server, io, json, sqlite3, threading, time, urllib.parse
+import numpy as np
+import pandas as pd
+from utils.local_blob import LocalBlobServiceClient
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS CryptoPrice (
+    date DATE NOT NULL, hourx INT NOT NULL, crypto VARCHAR(20) NOT NULL,
+    [Open] FLOAT, [High] FLOAT, [Low] FLOAT, [Close] FLOAT, [Volume] BIGINT,
+    PRIMARY KEY (crypto, date, hourx)
+);
+CREATE TABLE IF NOT EXISTS CryptoPrice_staging (
+    date DATE, hourx INT, crypto VARCHAR(20),
+    [Open] FLOAT, [High] FLOAT, [Low] FLOAT, [Close] FLOAT, [Volume] BIGINT
+);
+CREATE TABLE IF NOT EXISTS CryptoPriceRollup (
+    crypto VARCHAR(20) NOT NULL, [interval] VARCHAR(4) NOT NULL, bucket_start DATETIME NOT NULL,
+    [Open] FLOAT, [High] FLOAT, [Low] FLOAT, [Close] FLOAT, [Volume] BIGINT, bars INT,
+    sma FLOAT, ema FLOAT, volatility FLOAT,
+    PRIMARY KEY (crypto, [interval], bucket_start)
+);
+CREATE TABLE IF NOT EXISTS CryptoNews (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, coin VARCHAR(20), title TEXT, description TEXT,
+    content TEXT, publishedAt DATETIME, news_date DATE, source VARCHAR(200), url VARCHAR(900) UNIQUE
+);
+CREATE TABLE IF NOT EXISTS IngestionMetadata (
+    source VARCHAR(100) PRIMARY KEY, last_success DATETIME, updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS IngestionLog (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, source VARCHAR(100), status VARCHAR(20), message TEXT,
+    rows_inserted INT, started_at DATETIME, finished_at DATETIME
+);
+CREATE TABLE IF NOT EXISTS DataQualityIssues (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, source VARCHAR(100), issue_type VARCHAR(50),
+    issue_detail TEXT, detected_at DATETIME
+);
+CREATE TABLE IF NOT EXISTS IngestionRunMetrics (
+    run_id VARCHAR(64) PRIMARY KEY, entity VARCHAR(50), started_at DATETIME, finished_at DATETIME,
+    duration_s FLOAT, record TEXT
+);
+"""
+
+
+def create_sqlite_db(path):
+    """Buat database SQLite dengan skema yang meniru Azure SQL, return SQL_CONN_STRING-nya"""
+    conn = sqlite3.connect(path)
+    conn.executescript(SQLITE_SCHEMA)
+    conn.close()
+    return f"sqlite:///{path}"
+
+
+def local_blob_service(root):
+    return LocalBlobServiceClient(root)
+
+
+def _symbol_seed(symbol, seed):
+    return int(hashlib.md5(f"{symbol}:{seed}".encode()).hexdigest()[:8], 16)
+
+
+def synthetic_bars(symbol, start, end, interval="1h", seed=0):
+    """Bar OHLCV per jam yang deterministik per (symbol, jam), index Datetime UTC seperti yfinance"""
+    freq = {"1h": "h", "60m": "h", "1d": "D"}.get(interval, "h")
+    idx = pd.date_range(pd.Timestamp(start).ceil(freq), pd.Timestamp(end), freq=freq, inclusive="left", tz="UTC")
+    if len(idx) == 0:
+        return pd.DataFrame()
+
+    # random walk yang di-seed dari jam absolut -> range yang overlap menghasilkan bar yang sama
+    hours = ((idx - pd.Timestamp("2020-01-01", tz="UTC")) // pd.Timedelta(hours=1)).to_numpy()
+    base = _symbol_seed(symbol, seed) % 50_000 + 10
+    rng_steps = np.sin(hours * 0.013 + base) * 0.02 + np.cos(hours * 0.0007) * 0.05
+    close = base * (1 + rng_steps)
+    spread = np.abs(np.sin(hours * 0.37 + base)) * base * 0.004 + base * 0.0005
+    df = pd.DataFrame({
+        "Open": close - spread * 0.3,
+        "High": close + spread,
+        "Low": close - spread,
+        "Close": close,
+        "Volume": (np.abs(np.cos(hours * 0.11 + base)) * 1e6).astype("int64") + 1,
+    }, index=pd.DatetimeIndex(idx, name="Datetime"))
+    return df
+
+
+def synthetic_downloader(seed=0, calls=None):
+    """Callable pengganti yf.download (1 ticker atau list ticker + group_by="ticker")"""
+
+    def download(tickers, start=None, end=None, interval="1h", group_by="column", **kwargs):
+        if calls is not None:
+            calls.append(tickers)
+        symbols = [tickers] if isinstance(tickers, str) else list(tickers)
+        frames = {s: synthetic_bars(s, start, end, interval, seed) for s in symbols}
+        frames = {s: f for s, f in frames.items() if not f.empty}
+        if not frames:
+            return pd.DataFrame()
+        df = pd.concat(frames, axis=1)  # kolom (Ticker, Price) seperti group_by="ticker"
+        if group_by != "ticker":
+            df.columns = df.columns.swaplevel(0, 1)
+        return df
+
+    return download
+
+
+class FakeNewsResponse:
+    def __init__(self, payload, status_code=200):
+        self._payload = payload
+        self.status_code = status_code
+
+    def json(self):
+        return self._payload
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+
+class FakeNewsAPI:
+    """
+    Responder NewsAPI /v2/everything dengan korpus artikel kaleng yang deterministik.
+    Bisa dipakai langsung sebagai pengganti Session (get) atau dijalankan sebagai server HTTP lokal (serve).
+    """
+
+    TOPICS = ["Bitcoin", "Ethereum", "Solana", "XRP", "Dogecoin", "crypto market", "ETF flows"]
+
+    def __init__(self, n_articles=500, seed=0, start=datetime.datetime(2025, 1, 1), latency=0.0, max_results=None):
+        self.calls = 0
+        self.max_results = max_results  # developer plan NewsAPI: page di atas 100 hasil = error
+        self.connections = 0
+        self.latency = latency
+        self.seed = seed
+        self.start = start
+        self.articles = []  # terbaru dulu (NewsAPI sortBy=publishedAt)
+        self._lock = threading.Lock()
+        self.publish(n_articles)
+
+    def _article(self, i):
+        return {
+            "source": {"id": None, "name": f"Source {i % 17}"},
+            "title": f"{self.TOPICS[(i + self.seed) % len(self.TOPICS)]} update #{i}",
+            "description": f"Synthetic description {i}",
+            "content": f"{self.TOPICS[(i * 3 + self.seed) % len(self.TOPICS)]} traders watch levels. [+{i} chars]",
+            "publishedAt": (self.start + datetime.timedelta(minutes=i)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "url": f"https://news.example/{self.seed}/{i}",
+        }
+
+    def publish(self, n):
+        """Tambah n artikel yang lebih baru dari semua artikel yang sudah ada (simulasi burst)"""
+        with self._lock:
+            first = len(self.articles)
+            self.articles = [self._article(i) for i in range(first + n - 1, first - 1, -1)] + self.articles
+
+    def publish_late(self, n, published):
+        """Tambah n artikel ber-publishedAt lama yang baru ter-index sekarang (muncul di tengah urutan)"""
+        with self._lock:
+            first = len(self.articles)
+            late = [
+                {**self._article(i), "publishedAt": published.strftime("%Y-%m-%dT%H:%M:%SZ")}
+                for i in range(first, first + n)
+            ]
+            self.articles = sorted(self.articles + late, key=lambda a: a["publishedAt"], reverse=True)
+
+    def respond(self, params):
+        """Payload JSON /v2/everything untuk query params (from, to, page, pageSize)"""
+        with self._lock:
+            self.calls += 1
+            items = self.articles
+        if self.latency:
+            time.sleep(self.latency)
+        page_size = int(params.get("pageSize", 100))
+        page = int(params.get("page", 1))
+        cutoff = params.get("from")
+        if cutoff:
+            if len(cutoff) == 10:  # hanya tanggal
+                cutoff += "T00:00:00"
+            items = [a for a in items if a["publishedAt"].rstrip("Z") >= cutoff.rstrip("Z")]
+        until = params.get("to")
+        if until:
+            items = [a for a in items if a["publishedAt"].rstrip("Z") <= until.rstrip("Z")]
+        if self.max_results is not None and page * page_size > self.max_results:
+            return {"status": "error", "code": "maximumResultsReached",
+                    "message": f"Developer accounts are limited to a max of {self.max_results} results."}
+        chunk = items[(page - 1) * page_size: page * page_size]
+        return {"status": "ok", "totalResults": len(items), "articles": chunk}
+
+    def get(self, url, params=None, **kwargs):
+        """Pengganti requests.get / Session.get"""
+        payload = self.respond(params or {})
+        return FakeNewsResponse(payload, 200 if payload["status"] == "ok" else 426)
+
+    def serve(self):
+        """Jalankan server HTTP lokal (thread daemon, keep-alive), return (url, server)"""
+        api = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with api._lock:
+                    api.connections += 1  # 1 handler = 1 koneksi TCP
+
+            def do_GET(self):
+                query = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+                payload = api.respond({k: v[-1] for k, v in query.items()})
+                body = json.dumps(payload).encode()
+                self.send_response(200 if payload["status"] == "ok" else 426)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{server.server_address[1]}/v2/everything", server
+
+
+def read_blob_csv(container_client, blob_name):
+    return pd.read_csv(io.BytesIO(container_client.download_blob(blob_name).readall()))
@@ -1,9 +1,20 @@
 import yfinance as yf
-import pandas as pd
-import os
+import os, json, datetime, itertools, random, threading, time
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from azure.core import MatchConditions
 from azure.storage.blob import BlobServiceClient
 from dotenv import load_dotenv
 import pyodbc
+from utils.blob_handler import stream_csv_to_blob, stream_parquet_to_blob, MANIFEST_MAX_ATTEMPTS, _conflict_errors
+from utils.data_fetcher import curate_arrow
+from utils.data_quality import validate_prices
+from utils.db_handler import (
+    save_run_record, executemany_isolated, log_rejected_rows, encode_rows, TelemetrySink,
+    CRYPTO_PRICE_SCHEMA, PRICE_COLUMNS
+)
+from utils.instrumentation import RunRecorder
+from utils.rollups import rebuild_rollups
 
 # ===============================
 # CONFIG
@@ -13,7 +24,17 @@ START = "2025-08-24"
 END   = "2025-09-28"
 INTERVAL = "1h"
 
+# Backfill engine: range tiap symbol dipecah per CHUNK_DAYS (yfinance membatasi history 1h per request)
+CHUNK_DAYS    = 30
+MAX_WORKERS   = 4
 CONTAINER_NAME = "crypto-raw"   # pastikan sudah ada di Blob
+# progress backfill di blob (bukan disk lokal), supaya resume jalan dari mesin/container mana pun
+PROGRESS_BLOB = "state/backfill/progress.json"
+
+# Format file backfill di blob: "csv" = BULK INSERT (semua Azure SQL), "parquet" = OPENROWSET
+# FORMAT='PARQUET' (SQL Server 2022 / Managed Instance), ditulis dengan encoding profile di bawah
+BULK_FORMAT = os.getenv("BULK_FORMAT", "csv")
+BULK_PARQUET_PROFILE = os.getenv("BULK_PARQUET_PROFILE", "bulk")
 
 # Load .env
 load_dotenv()
@@ -32,53 +53,88 @@ DRIVER        = '{ODBC Driver 18 for SQL Server}'
 def connect_blob():
     return BlobServiceClient.from_connection_string(BLOB_CONN_STR)
 
-def connect_sql():
+def connect_sql(autocommit=False):
     return pyodbc.connect(
         f"DRIVER={DRIVER};SERVER={SQL_SERVER};DATABASE={SQL_DATABASE};"
-        f"UID={SQL_USERNAME};PWD={SQL_PASSWORD};Encrypt=yes;TrustServerCertificate=no;Connection Timeout=60;"
+        f"UID={SQL_USERNAME};PWD={SQL_PASSWORD};Encrypt=yes;TrustServerCertificate=no;Connection Timeout=60;",
+        autocommit=autocommit,
     )
 
-def fetch_and_save(symbol, start, end, interval="1h"):
-    print(f"🔄 Fetching {symbol}...")
-    df = yf.download(symbol, start=start, end=end, interval=interval)
-
-    df.reset_index(inplace=True)
-    if isinstance(df.columns, pd.MultiIndex):
-        df.columns = [c[0] if c[0] != '' else c[1] for c in df.columns]
+def fetch_curated(symbol, start, end, interval="1h"):
+    """Download 1 chunk lalu curate langsung ke pyarrow.Table (date32, hourx int16, crypto dictionary)"""
+    df = yf.download(symbol, start=start, end=end, interval=interval, progress=False)
+    if df.empty:
+        return df
+    return curate_arrow(df, symbol)
 
-    # Tambah kolom custom
-    df['date'] = df['Datetime'].dt.date
-    df['hourx'] = df['Datetime'].dt.hour
-    df['crypto'] = symbol
 
-    curated = df[['date','hourx','crypto','Open','High','Low','Close','Volume']]
+def stream_to_blob(curated, symbol, start, end, file_format=None):
+    """Stream 1 chunk (CSV atau Parquet, default BULK_FORMAT) langsung ke Blob (stage_block), tanpa file lokal"""
+    file_format = file_format or BULK_FORMAT
+    container = connect_blob().get_container_client(CONTAINER_NAME)
+    blob_name = f"bulkload/{symbol}_{start}_{end}_backfill.{file_format}"
+    if file_format == "parquet":
+        rows = stream_parquet_to_blob(container, blob_name, curated, BULK_PARQUET_PROFILE)
+    else:
+        rows = stream_csv_to_blob(container, blob_name, curated)
 
-    #Simpan CSV bersih (hanya 1 header)
-    file_name = f"data/{symbol}_backfill.csv"
-    curated.to_csv(file_name, index=False, header=True, sep=",", encoding="utf-8")
-    print(f"Saved clean CSV: {file_name}")
+    print(f"Streamed {rows} rows to Blob: {blob_name}")
+    return blob_name
 
-    return file_name
 
+def ensure_staging_table(cursor, table):
+    """Staging table per worker (struktur sama dengan CryptoPrice_staging) supaya load bisa paralel"""
+    cursor.execute(f"""
+    IF OBJECT_ID('{table}', 'U') IS NULL
+        SELECT TOP 0 * INTO {table} FROM CryptoPrice_staging;
+    """)
 
-def upload_to_blob(file_name):
-    blob_service = connect_blob()
-    container = blob_service.get_container_client(CONTAINER_NAME)
-    blob_name = f"bulkload/{file_name}"
 
-    with open(file_name, "rb") as data:
-        container.upload_blob(name=blob_name, data=data, overwrite=True)
+def load_staging_isolated(cursor, staging, curated, source):
+    """Fallback BULK INSERT: isi staging lewat executemany + bisection, baris yang ditolak ke dead-letter"""
+    cols = ",".join(f"[{c}]" for c in PRICE_COLUMNS)
+    cursor.fast_executemany = True
+    loaded, rejected = executemany_isolated(
+        cursor, f"INSERT INTO {staging} ({cols}) VALUES ({','.join('?' * len(PRICE_COLUMNS))})",
+        encode_rows(curated, CRYPTO_PRICE_SCHEMA)
+    )
+    log_rejected_rows(cursor, "CryptoPrice", PRICE_COLUMNS, rejected, source)
+    print(f"🩹 Loaded {loaded} rows into {staging} via isolated batches, {len(rejected)} rejected")
 
-    print(f"Uploaded to Blob: {blob_name}")
-    return blob_name
 
-def bulk_insert_sql(blob_name):
+def bulk_insert_sql(blob_name, staging="CryptoPrice_staging", fallback=None, source=None):
+    """
+    BULK INSERT CSV (atau OPENROWSET untuk .parquet) dari blob ke staging lalu insert unik ke CryptoPrice.
+    Kalau BULK INSERT gagal (1 nilai buruk menggagalkan seluruh file) dan fallback (curated
+    DataFrame/Table chunk yang sama) diberikan, staging diisi lewat load_staging_isolated.
+    """
     conn = connect_sql()
     cursor = conn.cursor()
 
+    if staging != "CryptoPrice_staging":
+        ensure_staging_table(cursor, staging)
+        conn.commit()
+
+    # 0. Sisa run sebelumnya (crash / dedup gagal / chunk di-resume) dibuang dulu,
+    #    supaya staging hanya berisi chunk ini
+    cursor.execute(f"TRUNCATE TABLE {staging};")
+    conn.commit()
+
     # 1. Bulk load ke staging table
-    query = f"""
-    BULK INSERT CryptoPrice_staging
+    cols = ",".join(f"[{c}]" for c in PRICE_COLUMNS)
+    if blob_name.endswith(".parquet"):
+        query = f"""
+    INSERT INTO {staging} WITH (TABLOCK) ({cols})
+    SELECT {cols}
+    FROM OPENROWSET(
+        BULK '{blob_name}',
+        DATA_SOURCE = 'MyAzureBlob',
+        FORMAT = 'PARQUET'
+    ) AS src;
+    """
+    else:
+        query = f"""
+    BULK INSERT {staging}
     FROM '{blob_name}'
     WITH (
         DATA_SOURCE = 'MyAzureBlob',
@@ -89,16 +145,27 @@ def bulk_insert_sql(blob_name):
         TABLOCK
     );
     """
-    print(f"⚡ Running BULK INSERT into CryptoPrice_staging for {blob_name}...")
-    cursor.execute(query)
+    print(f"⚡ Running BULK INSERT into {staging} for {blob_name}...")
+    try:
+        cursor.execute(query)
+    except pyodbc.Error as e:
+        conn.rollback()
+        if fallback is None:
+            raise
+        print(f"⚠️ BULK INSERT failed for {blob_name}: {e}")
+        load_staging_isolated(cursor, staging, fallback, source)
     conn.commit()
 
-    # 2. Insert unik ke main table
-    dedup_query = """
+    # 2. Insert unik ke main table (dedup juga di dalam staging: key dobel di 1 chunk = PK violation)
+    dedup_query = f"""
     INSERT INTO CryptoPrice ([date],[hourx],[crypto],[Open],[High],[Low],[Close],[Volume])
     SELECT s.[date], s.[hourx], s.[crypto], s.[Open], s.[High], s.[Low], s.[Close], s.[Volume]
-    FROM CryptoPrice_staging s
-    WHERE NOT EXISTS (
+    FROM (
+        SELECT *, ROW_NUMBER() OVER (PARTITION BY [date], [hourx], [crypto] ORDER BY (SELECT NULL)) AS rn
+        FROM {staging}
+    ) s
+    WHERE s.rn = 1
+      AND NOT EXISTS (
         SELECT 1 FROM CryptoPrice c
         WHERE c.[date] = s.[date]
           AND c.[hourx] = s.[hourx]
@@ -110,24 +177,185 @@ def bulk_insert_sql(blob_name):
     conn.commit()
 
     # 3. Kosongkan staging setelah dipakai
-    cursor.execute("TRUNCATE TABLE CryptoPrice_staging;")
+    cursor.execute(f"TRUNCATE TABLE {staging};")
     conn.commit()
 
     cursor.close()
     conn.close()
     print(f"Bulk load + dedup insert completed for {blob_name}")
 
+# ===============================
+# BACKFILL ENGINE
+# ===============================
+
+def split_range(start, end, chunk_days=CHUNK_DAYS):
+    """Pecah [start, end) jadi chunk (start, end) string YYYY-MM-DD, end eksklusif"""
+    chunks = []
+    cur = datetime.date.fromisoformat(start)
+    stop = datetime.date.fromisoformat(end)
+    while cur < stop:
+        nxt = min(cur + datetime.timedelta(days=chunk_days), stop)
+        chunks.append((cur.isoformat(), nxt.isoformat()))
+        cur = nxt
+    return chunks
+
+
+class BackfillProgress:
+    """
+    Progress chunk yang sudah selesai, disimpan sebagai JSON di blob supaya backfill bisa resume
+    setelah crash. Tiap mark_done = read-modify-write bersyarat etag (seperti manifest partisi):
+    entry dari proses backfill lain yang menulis bersamaan ikut digabung, tidak tertimpa.
+    """
+
+    def __init__(self, container_client, blob_name=PROGRESS_BLOB):
+        self.container = container_client
+        self.blob_name = blob_name
+        self._lock = threading.Lock()
+        self.done = self._read()[0]
+
+    def _read(self):
+        """(progress, etag); etag None kalau blob progress belum ada"""
+        try:
+            downloader = self.container.download_blob(self.blob_name)
+            raw = downloader.readall()
+        except Exception:
+            return {}, None
+        return json.loads(raw), downloader.properties.etag
+
+    @staticmethod
+    def _key(start, end):
+        return f"{start}/{end}"
+
+    def is_done(self, symbol, start, end):
+        return self._key(start, end) in self.done.get(symbol, {})
+
+    def mark_done(self, symbol, start, end, blob_name=None):
+        with self._lock:
+            self.done.setdefault(symbol, {})[self._key(start, end)] = {
+                "blob": blob_name, "finished_at": datetime.datetime.utcnow().isoformat()
+            }
+            self._save()
+
+    def _save(self):
+        blob = self.container.get_blob_client(self.blob_name)
+        for attempt in range(1, MANIFEST_MAX_ATTEMPTS + 1):
+            remote, etag = self._read()
+            for symbol, chunks in remote.items():
+                self.done[symbol] = {**chunks, **self.done.get(symbol, {})}
+            data = json.dumps(self.done, indent=2)
+            try:
+                if etag is None:
+                    blob.upload_blob(data, overwrite=False)
+                else:
+                    blob.upload_blob(data, overwrite=True, etag=etag, match_condition=MatchConditions.IfNotModified)
+                return
+            except _conflict_errors():
+                if attempt == MANIFEST_MAX_ATTEMPTS:
+                    raise
+                time.sleep(random.uniform(0, 0.05 * attempt))
+
+
+_worker_ids = itertools.count(1)
+_worker = threading.local()
+
+
+def worker_staging_table():
+    """Tiap thread worker dapat staging table sendiri: CryptoPrice_staging_w{n}"""
+    if not hasattr(_worker, "staging"):
+        _worker.staging = f"CryptoPrice_staging_w{next(_worker_ids)}"
+    return _worker.staging
+
+
+def process_chunk(symbol, start, end, progress, recorder, telemetry, interval=INTERVAL):
+    print(f"🔄 Fetching {symbol} {start} → {end}...")
+    with recorder.span("fetch", symbol) as span:
+        curated = fetch_curated(symbol, start, end, interval)
+        span["rows"] = len(curated)
+
+    blob_name = None
+    if len(curated) == 0:
+        print(f"⚠️ No data for {symbol} {start} → {end}")
+    else:
+        with recorder.span("validate", symbol) as span:
+            span["rows"] = len(curated)
+            curated, issues = validate_prices(curated, interval)
+            telemetry.log_data_quality_issues(issues)  # di-buffer, ditulis per batch oleh sink
+        with recorder.span("blob_upload", symbol) as span:
+            blob_name = stream_to_blob(curated, symbol, start, end)
+            span["rows"] = len(curated)
+        with recorder.span("bulk_insert", symbol) as span:
+            bulk_insert_sql(blob_name, staging=worker_staging_table(), fallback=curated, source=symbol)
+            span["rows"] = len(curated)
+    progress.mark_done(symbol, start, end, blob_name)
+    return symbol, start, end
+
+
+def run_backfill(symbols, start, end, interval=INTERVAL, chunk_days=CHUNK_DAYS,
+                 max_workers=MAX_WORKERS, progress_blob=PROGRESS_BLOB, recorder=None):
+    """Backfill paralel per chunk; chunk yang sudah tercatat di blob progress dilewati"""
+    recorder = recorder or RunRecorder("Backfill", emit_spans=False)
+    progress = BackfillProgress(connect_blob().get_container_client(CONTAINER_NAME), progress_blob)
+    tasks = [
+        (symbol, s, e)
+        for symbol in symbols
+        for s, e in split_range(start, end, chunk_days)
+        if not progress.is_done(symbol, s, e)
+    ]
+    print(f"📦 {len(tasks)} chunk(s) to backfill with {max_workers} worker(s)")
+
+    failed = []
+    # autocommit=True: transaksi tiap flush dibuka sendiri oleh _atomic (sama dengan koneksi pool)
+    telemetry = TelemetrySink(connection=lambda: closing(connect_sql(autocommit=True)))
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(process_chunk, *t, progress, recorder, telemetry, interval): t for t in tasks}
+            for future in as_completed(futures):
+                symbol, s, e = futures[future]
+                try:
+                    future.result()
+                    print(f"✅ {symbol} {s} → {e}")
+                except Exception as err:
+                    failed.append(futures[future])
+                    print(f"❌ {symbol} {s} → {e}: {err}")
+    finally:
+        telemetry.close()
+
+    return failed
+
+
+def rebuild_rollups_sql(symbols, recorder):
+    """BULK INSERT tidak lewat insert_incremental: rollup 4h/1d symbol yang di-backfill dibangun ulang sekali jalan"""
+    conn = connect_sql()
+    with recorder.span("rollup_rebuild") as span:
+        span["rows"] = rebuild_rollups(conn.cursor(), symbols)
+    conn.commit()
+    conn.close()
+    print(f"📊 Rollups rebuilt for {len(symbols)} symbol(s)")
+
+
+def report_run(recorder):
+    """Print ringkasan per stage lalu simpan run record ke IngestionRunMetrics"""
+    record = recorder.finish()
+    print(f"{'Stage':<14} | {'Count':>5} | {'Total s':>8} | {'p50 s':>7} | {'p95 s':>7} | {'Rows/s':>9}")
+    for stage, m in record["stages"].items():
+        print(f"{stage:<14} | {m['count']:>5} | {m['total_s']:>8.2f} | {m['p50_s']:>7.2f} | {m['p95_s']:>7.2f} | {m['rows_per_s']:>9.0f}")
+    recorder.log_record()
+
+    save_run_record(record, connection=lambda: closing(connect_sql(autocommit=True)))
+
 # ===============================
 # MAIN
 # ===============================
 
 def main():
-    for symbol in CRYPTOS:
-        local_csv = fetch_and_save(symbol, START, END, INTERVAL)
-        blob_name = upload_to_blob(local_csv)
-        bulk_insert_sql(blob_name)
-
-    print("All bulk inserts completed!")
+    recorder = RunRecorder("Backfill", emit_spans=False)
+    failed = run_backfill(CRYPTOS, START, END, INTERVAL, recorder=recorder)
+    rebuild_rollups_sql(CRYPTOS, recorder)
+    report_run(recorder)
+    if failed:
+        print(f"{len(failed)} chunk(s) failed, jalankan ulang untuk resume dari blob {CONTAINER_NAME}/{PROGRESS_BLOB}")
+    else:
+        print("All bulk inserts completed!")
 
 if __name__ == "__main__":
     main()
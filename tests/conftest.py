@@ -0,0 +1,27 @@
+"""
+Fixture bersama test: SQLite stand-in (skema meniru Azure SQL, lihat benchmarks.fakes) dan blob
+lokal, jadi test jalan offline tanpa ODBC driver / Azure Storage.
+"""
+import pytest
+from benchmarks import fakes
+from utils import config, db_handler
+
+
+@pytest.fixture
+def sql_db(tmp_path, monkeypatch):
+    """config.SQL_CONN_STRING diarahkan ke database SQLite baru, pool dibuat ulang"""
+    monkeypatch.setattr(config, "SQL_CONN_STRING", fakes.create_sqlite_db(str(tmp_path / "test.db")))
+    db_handler.reset_pool()
+    yield config.SQL_CONN_STRING
+    db_handler.reset_pool()
+
+
+@pytest.fixture
+def cursor(sql_db):
+    with db_handler.pooled_connection() as conn:
+        yield conn.cursor()
+
+
+@pytest.fixture
+def blob(tmp_path):
+    return fakes.local_blob_service(str(tmp_path / "blob"))
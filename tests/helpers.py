@@ -0,0 +1,71 @@
+"""Helper data test (bukan fixture)"""
+import datetime
+import numpy as np
+import pandas as pd
+from benchmarks import fakes
+from utils import rollups
+from utils.data_fetcher import _curate
+
+
+def price_frame(symbol, start, hours, **values):
+    """DataFrame curated (date, hourx, crypto, OHLCV) dengan nilai tetap per kolom, 1 bar per jam"""
+    ts = [start + datetime.timedelta(hours=h) for h in range(hours)]
+    return pd.DataFrame({
+        "date": [t.date() for t in ts], "hourx": [t.hour for t in ts], "crypto": symbol,
+        **{c: values.get(c, 1.0) for c in ("Open", "High", "Low", "Close")},
+        "Volume": values.get("Volume", 1),
+    })
+
+
+def table_rows(cursor, sql, params=()):
+    cursor.execute(sql, params)
+    return [tuple(r) for r in cursor.fetchall()]
+
+
+def flaky(failures, calls):
+    """Downloader sintetis yang gagal (429) `failures` kali pertama"""
+    inner = fakes.synthetic_downloader()
+
+    def download(tickers, **kwargs):
+        calls.append(tickers)
+        if len(calls) <= failures:
+            raise RuntimeError("429 Too Many Requests")
+        return inner(tickers, **kwargs)
+
+    return download
+
+
+# --- Rollup (dipakai tests/test_rollups.py dan benchmarks.bench_rollups) ---
+ROLLUP_VALUE_COLUMNS = ["Open", "High", "Low", "Close", "Volume", "bars", "sma", "ema", "volatility"]
+
+
+def rollup_batches(symbol, start, hours, batch_hours, revise_hours):
+    """Batch curated berurutan; tiap batch juga membawa `revise_hours` bar sebelumnya dengan nilai revisi"""
+    for offset in range(0, hours, batch_hours):
+        lo = start + datetime.timedelta(hours=offset)
+        hi = lo + datetime.timedelta(hours=batch_hours)
+        fresh = fakes.synthetic_bars(symbol, lo, hi)
+        revised = fakes.synthetic_bars(symbol, lo - datetime.timedelta(hours=revise_hours), lo, seed=1)
+        yield _curate(pd.concat([revised, fresh]) if offset else fresh, symbol)
+
+
+def rollup_table(cursor):
+    """Isi CryptoPriceRollup sebagai DataFrame, urut (crypto, interval, bucket_start)"""
+    cursor.execute(f"SELECT {', '.join(f'[{c}]' for c in rollups.ROLLUP_COLUMNS)} FROM CryptoPriceRollup")
+    df = pd.DataFrame.from_records(cursor.fetchall(), columns=rollups.ROLLUP_COLUMNS)
+    df["bucket_start"] = pd.to_datetime(df["bucket_start"])
+    return df.sort_values(["crypto", "interval", "bucket_start"], ignore_index=True)
+
+
+def compare_rollups(actual, expected):
+    """Return (sama?, selisih absolut terbesar) antara 2 tabel rollup"""
+    keys = lambda df: df[["crypto", "interval", "bucket_start"]].astype(
+        {"crypto": object, "interval": object, "bucket_start": "datetime64[s]"}
+    )
+    if len(actual) != len(expected) or not keys(actual).equals(keys(expected)):
+        return False, float("inf")
+    a = actual[ROLLUP_VALUE_COLUMNS].astype("float64").to_numpy()
+    e = expected[ROLLUP_VALUE_COLUMNS].astype("float64").to_numpy()
+    same = np.allclose(a, e, rtol=1e-9, atol=1e-9, equal_nan=True)
+    diff = np.nanmax(np.abs(a - e)) if len(a) else 0.0
+    return bool(same), float(diff)
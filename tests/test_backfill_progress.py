@@ -0,0 +1,30 @@
+import json
+import pytest
+
+pytest.importorskip("pyodbc", exc_type=ImportError)  # bulk_loader import pyodbc (butuh libodbc) di level modul
+import bulk_loader  # noqa: E402
+
+
+@pytest.fixture
+def container(blob):
+    return blob.get_container_client(bulk_loader.CONTAINER_NAME)
+
+
+def test_progress_survives_restart(container):
+    bulk_loader.BackfillProgress(container).mark_done("BTC-USD", "2025-01-01", "2025-01-31", "bulkload/a.csv")
+
+    resumed = bulk_loader.BackfillProgress(container)
+    assert resumed.is_done("BTC-USD", "2025-01-01", "2025-01-31")
+    assert not resumed.is_done("BTC-USD", "2025-01-31", "2025-03-02")
+    stored = json.loads(container.download_blob(bulk_loader.PROGRESS_BLOB).readall())
+    assert stored["BTC-USD"]["2025-01-01/2025-01-31"]["blob"] == "bulkload/a.csv"
+
+
+def test_concurrent_backfills_do_not_overwrite_each_other(container):
+    a, b = bulk_loader.BackfillProgress(container), bulk_loader.BackfillProgress(container)
+    a.mark_done("BTC-USD", "2025-01-01", "2025-01-31")
+    b.mark_done("ETH-USD", "2025-01-01", "2025-01-31")  # b membaca progress sebelum a menulis
+
+    resumed = bulk_loader.BackfillProgress(container)
+    assert resumed.is_done("BTC-USD", "2025-01-01", "2025-01-31")
+    assert resumed.is_done("ETH-USD", "2025-01-01", "2025-01-31")
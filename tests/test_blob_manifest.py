@@ -0,0 +1,97 @@
+import datetime
+import pytest
+from tests.helpers import price_frame
+from utils import blob_handler, config
+from utils.local_blob import ConditionNotMet
+
+DAY = datetime.date(2025, 1, 1)
+PREFIX = blob_handler.partition_prefix("incremental", "BTC-USD", DAY)
+
+
+@pytest.fixture
+def container(blob):
+    return blob.get_container_client(config.BLOB_CONTAINER)
+
+
+def _append(container, name, hours, **values):
+    """Tulis 1 file raw lalu daftarkan di manifest (seperti save_raw_to_blob, nama file eksplisit)"""
+    blob_name = f"{PREFIX}/{name}.parquet"
+    blob_handler.stream_parquet_to_blob(container, blob_name, price_frame("BTC-USD", hours[0], len(hours), **values))
+    blob_handler._update_manifest(container, PREFIX, add=[blob_name])
+    return blob_name
+
+
+def _hours(start, n):
+    return [datetime.datetime.combine(DAY, datetime.time(start)) + datetime.timedelta(hours=h) for h in range(n)]
+
+
+def _during_compaction(monkeypatch, action):
+    """Jalankan action() tepat sebelum file hasil compaction ditulis (setelah snapshot manifest)"""
+    original = blob_handler.stream_parquet_to_blob
+
+    def stream(container, blob_name, data, *args, **kwargs):
+        if "/compacted-" in blob_name and not stream.fired:
+            stream.fired = True
+            action()
+        return original(container, blob_name, data, *args, **kwargs)
+
+    stream.fired = False
+    monkeypatch.setattr(blob_handler, "stream_parquet_to_blob", stream)
+
+
+def test_append_during_compaction_is_kept(container, monkeypatch):
+    old = [_append(container, "part-1", _hours(0, 3)), _append(container, "part-2", _hours(3, 3))]
+    late = []
+    _during_compaction(monkeypatch, lambda: late.append(_append(container, "part-3", _hours(5, 2), Close=9.0)))
+
+    compacted = blob_handler.compact_partition(container, "BTC-USD", DAY)
+    files = blob_handler.read_manifest(container, PREFIX)["files"]
+    assert files == [compacted] + late  # file baru tetap di belakang -> tetap menang di keep-last
+    assert not any(container.get_blob_client(f).exists() for f in old)
+
+    part = blob_handler.read_partition(container, "BTC-USD", DAY)
+    latest = part.drop_duplicates(subset=["hourx"], keep="last").set_index("hourx")["Close"]
+    assert latest.to_dict() == {0: 1.0, 1: 1.0, 2: 1.0, 3: 1.0, 4: 1.0, 5: 9.0, 6: 9.0}
+
+
+def test_stale_compaction_is_discarded(container, monkeypatch):
+    _append(container, "part-1", _hours(0, 3))
+    _append(container, "part-2", _hours(3, 3))
+    winner = []
+    _during_compaction(monkeypatch, lambda: winner.append(blob_handler.compact_partition(container, "BTC-USD", DAY)))
+
+    assert blob_handler.compact_partition(container, "BTC-USD", DAY) is None
+    assert blob_handler.read_manifest(container, PREFIX)["files"] == winner
+    compacted = [b.name for b in container.list_blobs(name_starts_with=f"{PREFIX}/compacted-")]
+    assert compacted == winner  # file compaction yang basi sudah dihapus
+    assert len(blob_handler.read_partition(container, "BTC-USD", DAY)) == 6
+
+
+def test_manifest_retry_rereads_after_conflict(container, monkeypatch):
+    _append(container, "part-1", _hours(0, 1))
+    original = blob_handler._write_manifest
+
+    def racing_write(container_client, prefix, manifest, etag=None):
+        if not racing_write.fired:  # writer lain menang duluan, etag yang dibaca jadi basi
+            racing_write.fired = True
+            original(container_client, prefix, {"files": manifest["files"][:1] + [f"{PREFIX}/other.parquet"]}, etag)
+        return original(container_client, prefix, manifest, etag)
+
+    racing_write.fired = False
+    monkeypatch.setattr(blob_handler, "_write_manifest", racing_write)
+    manifest = blob_handler._update_manifest(container, PREFIX, add=[f"{PREFIX}/mine.parquet"])
+    assert manifest["files"] == [f"{PREFIX}/part-1.parquet", f"{PREFIX}/other.parquet", f"{PREFIX}/mine.parquet"]
+
+
+def test_manifest_retry_gives_up(container, monkeypatch):
+    attempts = []
+
+    def conflict(container_client, prefix, manifest, etag=None):
+        attempts.append(etag)
+        raise ConditionNotMet("modified")
+
+    monkeypatch.setattr(blob_handler, "MANIFEST_MAX_ATTEMPTS", 3)
+    monkeypatch.setattr(blob_handler, "_write_manifest", conflict)
+    with pytest.raises(ConditionNotMet):
+        blob_handler._update_manifest(container, PREFIX, add=[f"{PREFIX}/part-1.parquet"])
+    assert len(attempts) == 3
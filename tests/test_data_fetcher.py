@@ -0,0 +1,39 @@
+import datetime
+import pytest
+from benchmarks import fakes
+from tests.helpers import flaky
+from utils import data_fetcher
+
+START = datetime.datetime(2025, 1, 1)
+END = datetime.datetime(2025, 1, 2)
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(data_fetcher.time, "sleep", lambda s: None)
+
+
+def test_group_by_watermark_window():
+    watermarks = {"A": START, "B": START + datetime.timedelta(hours=1), "C": START + datetime.timedelta(days=3)}
+    groups = data_fetcher.group_by_watermark(watermarks, window=datetime.timedelta(hours=6))
+    assert groups == [(START, ["A", "B"]), (watermarks["C"], ["C"])]
+
+
+def test_fetch_group_falls_back_per_symbol():
+    calls = []
+    inner = fakes.synthetic_downloader(calls=calls)
+
+    def without_eth(tickers, **kwargs):
+        df = inner(tickers, **kwargs)
+        return df.drop(columns="ETH-USD", level=0) if not isinstance(tickers, str) else df
+
+    symbols = ["BTC-USD", "ETH-USD"]
+    frames = data_fetcher.fetch_group(START, symbols, dict.fromkeys(symbols, START), END, downloader=without_eth)
+    assert calls == [symbols, "ETH-USD"]
+    assert {s: len(df) for s, df in frames.items()} == {"BTC-USD": 24, "ETH-USD": 24}
+
+
+def test_inline_retry_recovers():
+    calls = []
+    df = data_fetcher.fetch_data("BTC-USD", START, END, downloader=flaky(2, calls))
+    assert len(calls) == 3 and len(df) == 24
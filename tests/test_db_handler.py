@@ -0,0 +1,57 @@
+import datetime
+import pandas as pd
+from tests.helpers import price_frame, table_rows
+from utils import db_handler
+
+START = datetime.datetime(2025, 1, 1, 20)
+
+
+def test_upsert_counts_inserts_and_updates(cursor):
+    df = price_frame("BTC-USD", START, 6)
+    counts = db_handler.upsert_prices(cursor, df)
+    assert (counts["inserted"], counts["updated"], counts["rejected"]) == (6, 0, [])
+
+    # batch yang sama persis: tidak ada yang di-insert maupun di-update
+    counts = db_handler.upsert_prices(cursor, df)
+    assert (counts["inserted"], counts["updated"]) == (0, 0)
+
+    # 2 bar direvisi + 3 bar baru
+    revised = price_frame("BTC-USD", START, 9)
+    revised.loc[[1, 4], "Close"] = 2.5
+    counts = db_handler.upsert_prices(cursor, revised)
+    assert (counts["inserted"], counts["updated"]) == (3, 2)
+    closes = [r[0] for r in table_rows(cursor, "SELECT [Close] FROM CryptoPrice ORDER BY date, hourx")]
+    assert closes == [1.0, 2.5, 1.0, 1.0, 2.5] + [1.0] * 4
+
+
+def test_upsert_duplicate_keys_last_wins(cursor):
+    df = price_frame("BTC-USD", START, 2)
+    df = pd.concat([df, df.iloc[[0]].assign(Close=9.0)], ignore_index=True)
+    counts = db_handler.upsert_prices(cursor, df)
+    assert (counts["inserted"], counts["updated"]) == (2, 0)
+    assert table_rows(cursor, "SELECT [Close] FROM CryptoPrice WHERE hourx = ?", (START.hour,)) == [(9.0,)]
+
+
+def test_insert_incremental_returns_changed_rows(cursor):
+    df = price_frame("ETH-USD", START, 4)
+    assert db_handler.insert_incremental(cursor, df, "ETH-USD") == 4
+    assert db_handler.insert_incremental(cursor, df, "ETH-USD") == 0
+    assert db_handler.insert_incremental(cursor, df.assign(Volume=7), "ETH-USD") == 4
+    assert db_handler.insert_incremental(cursor, df.iloc[:0], "ETH-USD") == 0
+
+
+def test_watermark_fallback_to_latest_bar(cursor):
+    # bar terakhir ada di tanggal berikutnya, jam lebih kecil dari bar sebelumnya
+    db_handler.upsert_prices(cursor, price_frame("BTC-USD", START, 6))
+    watermarks = db_handler.get_last_success_bulk(cursor, ["BTC-USD", "ETH-USD"])
+    assert watermarks == {
+        "BTC-USD": datetime.datetime(2025, 1, 2, 1),
+        "ETH-USD": db_handler.DEFAULT_WATERMARK,
+    }
+
+
+def test_watermark_metadata_wins_over_fallback(cursor):
+    db_handler.upsert_prices(cursor, price_frame("BTC-USD", START, 6))
+    db_handler.update_last_success_bulk(cursor, {"BTC-USD": datetime.datetime(2025, 3, 1, 4)})
+    db_handler.update_last_success(cursor, "BTC-USD", datetime.datetime(2025, 3, 2, 5))
+    assert db_handler.get_last_success(cursor, "BTC-USD") == datetime.datetime(2025, 3, 2, 5)
@@ -0,0 +1,64 @@
+import datetime
+import os
+import pytest
+from tests.helpers import price_frame
+from utils import db_handler, history
+
+START = datetime.datetime(2025, 1, 1)
+
+
+@pytest.fixture
+def load(cursor, tmp_path):
+    db_handler.upsert_prices(cursor, price_frame("BTC-USD", START, 72))  # 3 hari penuh, sudah settled
+    cache_dir = str(tmp_path / "cache")
+
+    def load(start, end, **kwargs):
+        return history.load_history("BTC-USD", start, end, source="sql", cache_dir=cache_dir, **kwargs)
+
+    load.cache_dir = cache_dir
+    return load
+
+
+def _cached_files(cache_dir):
+    return sorted(name for _, _, names in os.walk(cache_dir) for name in names if name.endswith(".arrow"))
+
+
+def test_range_is_sliced_per_hour(load):
+    frame = load(START + datetime.timedelta(hours=20), START + datetime.timedelta(days=1, hours=3))
+    assert frame["ts"].iloc[0] == START + datetime.timedelta(hours=20)
+    assert len(frame) == 7 and frame["ts"].is_monotonic_increasing
+
+    table = load(START, START + datetime.timedelta(days=3), arrow=True)
+    assert table.num_rows == 72 and table.column_names[:3] == ["date", "hourx", "crypto"]
+
+
+def test_second_load_is_served_from_cache(load, cursor):
+    end = START + datetime.timedelta(days=3)
+    first = load(START, end)
+    assert _cached_files(load.cache_dir) == ["2025-01-01.arrow", "2025-01-02.arrow", "2025-01-03.arrow"]
+
+    before = history.history_stats()
+    cursor.execute("DELETE FROM CryptoPrice")  # kalau masih ke SQL, hasilnya kosong
+    again = load(START, end)
+    after = history.history_stats()
+    assert again.equals(first)
+    assert after["cached_days"] - before["cached_days"] == 3 and after["fetched_days"] == before["fetched_days"]
+
+
+def test_empty_day_is_not_cached(load, cursor):
+    day4 = START + datetime.timedelta(days=3)
+    assert len(load(day4, day4 + datetime.timedelta(days=1))) == 0
+    assert "2025-01-04.arrow" not in _cached_files(load.cache_dir)
+
+    # backfill telat mengisi tanggal itu: load berikutnya harus melihatnya
+    db_handler.upsert_prices(cursor, price_frame("BTC-USD", day4, 24))
+    assert len(load(day4, day4 + datetime.timedelta(days=1))) == 24
+
+
+def test_rollup_interval_and_eviction(load):
+    frame = load(START, START + datetime.timedelta(days=3), interval="4h")
+    assert len(frame) == 18 and (frame["bars"] == 4).all()
+
+    size = max(os.path.getsize(os.path.join(root, n)) for root, _, names in os.walk(load.cache_dir) for n in names)
+    freed = history.evict(load.cache_dir, max_bytes=size)  # hanya muat 1 file
+    assert freed > 0 and len(_cached_files(load.cache_dir)) == 1
@@ -0,0 +1,113 @@
+import datetime
+import pytest
+from tests.helpers import price_frame, table_rows
+from utils import db_handler
+
+
+class FakeMssql:
+    """Koneksi pyodbc tiruan: catat statement dan simulasikan @@TRANCOUNT (bukan sqlite3.Cursor -> jalur SQL Server)"""
+
+    def __init__(self, autocommit, trancount=0):
+        self.autocommit, self.trancount, self.log = autocommit, trancount, []
+        self.connection = self
+
+    def execute(self, sql, *params):
+        self.log.append(sql)
+        if sql == "SAVE TRANSACTION isolate_batch" and not self.trancount:
+            raise RuntimeError("628: Cannot issue SAVE TRANSACTION when there is no active transaction")
+        if sql == "BEGIN TRANSACTION":
+            self.trancount += 1
+        return self
+
+    def fetchone(self):
+        return (self.trancount,)
+
+    def commit(self):
+        self.log.append("COMMIT")
+        self.trancount = 0
+
+    def rollback(self):
+        self.log.append("ROLLBACK")
+        self.trancount = 0
+
+
+@pytest.mark.parametrize("autocommit", [True, False])
+def test_atomic_begins_own_transaction_without_open_tran(autocommit):
+    # autocommit=False tanpa transaksi terbuka = kondisi bulk_loader setelah conn.rollback()
+    conn = FakeMssql(autocommit)
+    with db_handler._atomic(conn):
+        conn.execute("INSERT")
+    assert conn.log == ["SELECT @@TRANCOUNT", "BEGIN TRANSACTION", "INSERT", "COMMIT"]
+    assert conn.autocommit is autocommit
+
+    conn.log.clear()
+    with pytest.raises(ValueError):
+        with db_handler._atomic(conn):
+            raise ValueError("bad row")
+    assert conn.log == ["SELECT @@TRANCOUNT", "BEGIN TRANSACTION", "ROLLBACK"]
+    assert conn.autocommit is autocommit
+
+
+def test_atomic_uses_savepoint_inside_open_tran():
+    conn = FakeMssql(autocommit=False, trancount=1)
+    with pytest.raises(ValueError):
+        with db_handler._atomic(conn):
+            raise ValueError("bad row")
+    assert conn.log == ["SELECT @@TRANCOUNT", "SAVE TRANSACTION isolate_batch", "ROLLBACK TRANSACTION isolate_batch"]
+    assert conn.trancount == 1  # transaksi caller tetap terbuka
+
+    # nested: _atomic luar membuka transaksi, _atomic dalam pakai savepoint
+    conn = FakeMssql(autocommit=True)
+    with db_handler._atomic(conn):
+        with db_handler._atomic(conn):
+            conn.execute("INSERT")
+    assert conn.log == ["SELECT @@TRANCOUNT", "BEGIN TRANSACTION", "SELECT @@TRANCOUNT",
+                        "SAVE TRANSACTION isolate_batch", "INSERT", "COMMIT"]
+
+
+def test_upsert_rejects_row_that_fails_merge(cursor):
+    # hourx NULL lolos staging (tanpa NOT NULL) tapi ditolak CryptoPrice saat MERGE
+    df = price_frame("BTC-USD", datetime.datetime(2025, 1, 1), 6).astype({"hourx": "object"})
+    df.loc[3, "hourx"] = None
+    counts = db_handler.upsert_prices(cursor, df)
+    assert (counts["inserted"], counts["updated"]) == (5, 0)
+    assert [(i, row[1]) for i, row, _ in counts["rejected"]] == [(3, None)]
+    assert "NOT NULL" in counts["rejected"][0][2]
+    assert table_rows(cursor, "SELECT hourx FROM CryptoPrice ORDER BY hourx") == [(h,) for h in (0, 1, 2, 4, 5)]
+
+
+def test_bisect_isolates_bad_rows_in_few_round_trips():
+    import math
+    import sqlite3
+
+    conn = sqlite3.connect(":memory:", isolation_level=None)
+    conn.execute("CREATE TABLE t (i INT, v INT CHECK (v >= 0))")
+    attempts = []
+    conn.set_trace_callback(lambda sql: attempts.append(sql) if sql == "SAVEPOINT isolate_batch" else None)
+
+    rows = [(i, -1 if i in (5, 40) else i) for i in range(64)]
+    affected, rejected = db_handler.executemany_isolated(conn.cursor(), "INSERT INTO t VALUES (?, ?)", rows)
+    assert affected == 62 and [i for i, _, _ in rejected] == [5, 40]
+    assert "CHECK" in rejected[0][2]
+    assert len(attempts) <= 1 + 2 * 2 * math.log2(len(rows))  # O(k log n), bukan 64 round trip per baris
+    assert [r[0] for r in conn.execute("SELECT i FROM t ORDER BY rowid")] == [i for i in range(64) if i not in (5, 40)]
+
+
+@pytest.mark.parametrize("mode", ["merge", "insert"])
+def test_rejected_rows_go_to_quality_log_and_dead_letter(cursor, tmp_path, monkeypatch, mode):
+    from utils import blob_handler
+
+    monkeypatch.setenv("BLOB_LOCAL_ROOT", str(tmp_path / "blob"))
+    df = price_frame("ETH-USD", datetime.datetime(2025, 1, 1), 4).astype({"hourx": "object"})
+    df.loc[2, "hourx"] = None
+    assert db_handler.insert_incremental(cursor, df, "ETH-USD", mode=mode) == 3
+    # rollup dihitung dari 3 bar yang masuk saja
+    assert table_rows(cursor, "SELECT bars FROM CryptoPriceRollup WHERE [interval] = '1d'") == [(3,)]
+
+    issues = table_rows(cursor, "SELECT source, issue_type FROM DataQualityIssues")
+    assert issues == [("ETH-USD", "REJECTED_ROW")]
+    blob = blob_handler.connect_blob()
+    container = blob.get_container_client(blob_handler.config.BLOB_CONTAINER)
+    [name] = [b.name for b in container.list_blobs(name_starts_with=blob_handler.DEAD_LETTER_FOLDER)]
+    [record] = blob_handler.read_dead_letter(blob, name)
+    assert (record["crypto"], record["hourx"], record["date"]) == ("ETH-USD", None, "2025-01-01")
@@ -0,0 +1,139 @@
+import datetime
+import pytest
+from benchmarks import fakes
+from tests.helpers import table_rows
+from utils import db_handler
+from utils.instrumentation import RunRecorder
+
+
+@pytest.fixture
+def news(sql_db, monkeypatch):
+    import TimerNewsIngest
+
+    # cache URL module-level tidak boleh bocor antar test (database-nya baru tiap test)
+    monkeypatch.setattr(db_handler, "_SEEN_URLS", db_handler._SeenUrlCache(1000))
+    return TimerNewsIngest
+
+
+def setup_api(news, n_articles=50, **kwargs):
+    """API kaleng + watermark = artikel terbaru yang sudah ada, return (api, now)"""
+    api = fakes.FakeNewsAPI(n_articles, **kwargs)
+    newest = news._published(api.articles[0])
+    with db_handler.sql_cursor() as cursor:
+        db_handler.update_last_success(cursor, news.NEWS_SOURCE, newest)
+    return api, newest + datetime.timedelta(hours=1)
+
+
+def run(news, api, now):
+    return news.process_news(RunRecorder("News", emit_spans=False), http=api, now=now)
+
+
+def state(news):
+    with db_handler.sql_cursor() as cursor:
+        urls = {r[0] for r in table_rows(cursor, "SELECT url FROM CryptoNews")}
+        markers = db_handler.get_markers(cursor, [news.NEWS_SOURCE, news.NEWS_UNTIL_SOURCE, news.NEWS_NEWEST_SOURCE])
+    return urls, markers
+
+
+def test_late_indexed_article_is_picked_up(news):
+    api, now = setup_api(news)
+    watermark = news._published(api.articles[0])
+    api.publish(3)
+    before = {a["url"] for a in api.articles}
+    api.publish_late(2, watermark - datetime.timedelta(minutes=30))  # lebih lama dari watermark
+    late = {a["url"] for a in api.articles} - before
+
+    assert run(news, api, now)["status"] == "SUCCESS"
+    urls, markers = state(news)
+    assert len(late) == 2 and late <= urls
+    assert markers == {news.NEWS_SOURCE: news._published(api.articles[0])}
+
+    # run berikutnya mengambil ulang window lag: URL yang sama tidak di-insert dua kali
+    assert run(news, api, now)["rows"] == 0
+
+
+def test_truncated_burst_keeps_cursor_at_oldest_fetched(news):
+    # developer plan: page 2 error, jadi 1 run maksimal 100 artikel
+    api, now = setup_api(news, max_results=100)
+    watermark = news._published(api.articles[0])
+    api.publish(250)
+
+    result = run(news, api, now)
+    assert (result["status"], result["rows"]) == ("SUCCESS", 100)
+    urls, markers = state(news)
+    fetched = [news._published(a) for a in api.articles if a["url"] in urls]
+    assert markers == {
+        news.NEWS_SOURCE: watermark,  # gap watermark..oldest belum terisi, watermark tidak maju
+        news.NEWS_UNTIL_SOURCE: min(fetched),
+        news.NEWS_NEWEST_SOURCE: max(fetched),
+    }
+
+    # run berikutnya mengisi gap (dari yang terbaru ke yang lama) sampai watermark tersambung
+    for _ in range(3):
+        run(news, api, now)
+    urls, markers = state(news)
+    assert {a["url"] for a in api.articles if news._published(a) > watermark} <= urls
+    assert markers == {news.NEWS_SOURCE: news._published(api.articles[0])}
+
+
+def test_page_error_keeps_downloaded_pages(news, monkeypatch):
+    api, now = setup_api(news)
+    api.publish(250)
+    get = api.get
+
+    def failing(url, params=None, **kwargs):
+        if params.get("page") == 3:
+            return fakes.FakeNewsResponse({"status": "error", "code": "unexpectedError"}, 500)
+        return get(url, params, **kwargs)
+
+    monkeypatch.setattr(api, "get", failing)
+    result = run(news, api, now)
+    assert result["rows"] == 200  # page 1 + 2 tetap di-insert
+    _, markers = state(news)
+    assert news.NEWS_UNTIL_SOURCE in markers
+
+
+def test_first_page_error_fails_without_moving_watermark(news, monkeypatch):
+    api, now = setup_api(news)
+    watermark = news._published(api.articles[0])
+    api.publish(5)
+    monkeypatch.setattr(api, "get", lambda url, params=None, **kw: fakes.FakeNewsResponse({"status": "error"}, 500))
+    assert run(news, api, now)["status"] == "FAILED"
+    assert state(news) == (set(), {news.NEWS_SOURCE: watermark})
+
+
+def _article(i, published=datetime.datetime(2025, 1, 1)):
+    return {"title": f"Bitcoin {i}", "description": "", "content": "", "publishedAt": published,
+            "source": "fake", "url": f"https://news.example/{i}"}
+
+
+def test_insert_news_dedups_batch_and_existing_urls(news, monkeypatch):
+    assert db_handler.insert_news([_article(0)]) == 1
+    monkeypatch.setattr(db_handler, "_SEEN_URLS", db_handler._SeenUrlCache(1000))  # proses baru, cache kosong
+
+    batch = [_article(0), _article(1), _article(1), _article(2)]
+    assert db_handler.insert_news(batch) == 2
+    with db_handler.sql_cursor() as cursor:
+        assert table_rows(cursor, "SELECT COUNT(*) FROM CryptoNews") == [(3,)]
+
+
+def test_warm_cache_skips_database(news, monkeypatch):
+    batch = [_article(i) for i in range(5)]
+    assert db_handler.insert_news(batch) == 5
+    assert len(db_handler._SEEN_URLS) == 5
+
+    def no_sql():
+        raise AssertionError("semua URL sudah di cache, tidak boleh query SQL")
+
+    monkeypatch.setattr(db_handler, "sql_cursor", no_sql)
+    assert db_handler.insert_news(batch) == 0
+
+
+def test_seen_url_cache_is_bounded_lru():
+    cache = db_handler._SeenUrlCache(2)
+    cache.add("a")
+    cache.add("b")
+    assert "a" in cache  # a jadi yang paling baru dipakai
+    cache.add("c")
+    assert "a" in cache and "c" in cache and "b" not in cache
+    assert len(cache) == 2
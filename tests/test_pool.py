@@ -0,0 +1,77 @@
+import threading
+import pytest
+from utils import db_handler
+
+
+class FakeConn:
+    def __init__(self, healthy=True):
+        self.healthy, self.closed = healthy, False
+
+    def cursor(self):
+        if not self.healthy:
+            raise RuntimeError("connection is broken")
+        return self
+
+    def execute(self, sql):
+        return self
+
+    def fetchone(self):
+        return (1,)
+
+    def close(self):
+        self.closed = True
+
+
+def test_idle_connection_is_reused(sql_db):
+    with db_handler.pooled_connection() as first:
+        pass
+    with db_handler.pooled_connection() as second:
+        assert second is first
+    metrics = db_handler.pool_metrics()
+    assert (metrics["creates"], metrics["reuses"], metrics["reuse_ratio"]) == (1, 1, 0.5)
+
+
+def test_concurrent_workers_share_bounded_pool():
+    created = []
+
+    def factory():
+        created.append(FakeConn())
+        return created[-1]
+
+    pool = db_handler.ConnectionPool(factory, max_size=2)
+    barrier = threading.Barrier(2)
+
+    def worker():
+        for _ in range(5):
+            with pool.connection():
+                barrier.wait(timeout=5)  # 2 worker selalu memegang koneksi bersamaan
+
+    threads = [threading.Thread(target=worker) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    metrics = pool.metrics()
+    assert len(created) == 2 and metrics["checkouts"] == 10 and metrics["reuses"] == 8
+    assert metrics["in_use"] == 0 and metrics["idle"] == 2
+
+
+def test_exhausted_pool_times_out():
+    pool = db_handler.ConnectionPool(FakeConn, max_size=1)
+    held = pool.acquire()
+    with pytest.raises(TimeoutError):
+        pool.acquire(timeout=0.05)
+    pool.release(held)
+    assert pool.acquire(timeout=0.05) is held
+
+
+def test_stale_connection_failing_health_check_is_replaced():
+    conns = [FakeConn(), FakeConn()]
+    pool = db_handler.ConnectionPool(lambda: conns.pop(0), healthcheck_idle=0)
+    broken = pool.acquire()
+    pool.release(broken)
+    broken.healthy = False
+
+    replacement = pool.acquire()
+    assert replacement is not broken and broken.closed
+    assert pool.metrics()["discards"] == 1
@@ -0,0 +1,63 @@
+import datetime
+import pandas as pd
+import pytest
+from benchmarks import fakes
+from tests.helpers import table_rows
+from utils import db_handler
+
+START = datetime.datetime(2025, 1, 1)
+NOW = datetime.datetime(2025, 1, 3)
+
+
+def broken_at(bad):
+    """synthetic_downloader dengan Close NaN di bar bad (jam UTC) -> MISSING_PRICE, di-quarantine"""
+    download = fakes.synthetic_downloader()
+
+    def downloader(*args, **kwargs):
+        df = download(*args, **kwargs)
+        df.loc[df.index == pd.Timestamp(bad, tz="UTC"), [c for c in df.columns if "Close" in c]] = float("nan")
+        return df
+
+    return downloader
+
+
+@pytest.fixture
+def ingest_run(cursor, blob):
+    import TimerCryptoIngest as ingest
+    from utils.scheduler import Scheduler
+
+    cursor.execute("INSERT INTO IngestionMetadata (source, last_success) VALUES (?, ?)", ("BTC-USD", START))
+
+    def run(at, downloader):
+        scheduler = Scheduler(backoff=0.01)
+        try:
+            results = ingest.run_ingest(at, blob, symbols=["BTC-USD"], downloader=downloader, scheduler=scheduler)
+        finally:
+            scheduler.close()
+        assert [r["status"] for r in results] == ["SUCCESS"]
+        return db_handler.get_markers(cursor, ["BTC-USD"])["BTC-USD"]
+
+    return run
+
+
+def _has_bar(cursor, ts):
+    return bool(table_rows(cursor, "SELECT 1 FROM CryptoPrice WHERE date = ? AND hourx = ?", (ts.date(), ts.hour)))
+
+
+def test_quarantined_bar_holds_watermark_until_retried(cursor, ingest_run):
+    bad = NOW - datetime.timedelta(hours=5)  # di luar TAIL_REFETCH (2h) dari NOW
+    assert ingest_run(NOW, broken_at(bad)) == bad
+    assert not _has_bar(cursor, bad)
+
+    # run berikutnya fetch ulang dari bar itu; kali ini datanya sudah benar
+    later = NOW + datetime.timedelta(hours=1)
+    assert ingest_run(later, fakes.synthetic_downloader()) == later
+    assert _has_bar(cursor, bad)
+
+
+def test_old_quarantined_bar_does_not_hold_watermark(cursor, ingest_run):
+    import TimerCryptoIngest as ingest
+
+    bad = NOW - ingest.QUARANTINE_RETRY - datetime.timedelta(hours=1)
+    assert ingest_run(NOW, broken_at(bad)) == NOW
+    assert not _has_bar(cursor, bad)
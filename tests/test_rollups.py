@@ -0,0 +1,74 @@
+import datetime
+import pandas as pd
+from tests.helpers import compare_rollups, rollup_batches, rollup_table
+from utils import db_handler, rollups
+
+START = datetime.datetime(2025, 1, 1)
+SYMBOLS = ["BTC-USD", "ETH-USD"]
+
+
+def expected(cursor, symbols=SYMBOLS):
+    return pd.concat(
+        [rollups.compute_rollups(rollups._read_prices(cursor, s), i) for s in symbols for i in rollups.ROLLUP_INTERVALS],
+        ignore_index=True,
+    ).sort_values(["crypto", "interval", "bucket_start"], ignore_index=True)
+
+
+def ingest(cursor, symbol, hours=24 * 10, batch_hours=5):
+    """Batch kecil berurutan lewat insert_incremental (hook rollup), dengan revisi 2 bar terakhir"""
+    for df in rollup_batches(symbol, START, hours, batch_hours, revise_hours=2):
+        db_handler.insert_incremental(cursor, df, symbol)
+
+
+def test_incremental_matches_full_recompute(cursor):
+    for symbol in SYMBOLS:
+        ingest(cursor, symbol)
+    same, diff = compare_rollups(rollup_table(cursor), expected(cursor))
+    assert same, diff
+
+
+def test_rebuild_matches_full_recompute(cursor, monkeypatch):
+    with monkeypatch.context() as m:  # seperti backfill BULK INSERT: tanpa hook
+        m.setattr(rollups, "ROLLUPS_ENABLED", False)
+        ingest(cursor, "BTC-USD")
+    assert rollup_table(cursor).empty
+    rollups.rebuild_rollups(cursor, ["BTC-USD"])
+    same, diff = compare_rollups(rollup_table(cursor), expected(cursor, ["BTC-USD"]))
+    assert same, diff
+
+
+def test_missing_table_is_created(cursor, monkeypatch):
+    cursor.execute("DROP TABLE CryptoPriceRollup")
+    monkeypatch.setattr(rollups, "_TABLE_READY", False)
+    ingest(cursor, "BTC-USD", hours=48)
+    same, diff = compare_rollups(rollup_table(cursor), expected(cursor, ["BTC-USD"]))
+    assert same, diff
+
+
+def test_failed_hook_is_recomputed_on_next_run(cursor, monkeypatch):
+    batches = list(rollup_batches("BTC-USD", START, 24 * 4, 12, revise_hours=2))
+    for df in batches[:3]:
+        db_handler.insert_incremental(cursor, df, "BTC-USD")
+
+    # rollup gagal setelah MERGE commit: bar tetap masuk, error tidak dilempar, bucket dicatat tertunda
+    with monkeypatch.context() as m:
+        m.setattr(rollups, "update_rollups", lambda *a, **k: (_ for _ in ()).throw(RuntimeError("deadlock")))
+        assert db_handler.insert_incremental(cursor, batches[3], "BTC-USD") > 0
+    pending = rollups.pending_since(cursor, "BTC-USD")
+    assert pending is not None and pending <= pd.Timestamp(START + datetime.timedelta(hours=34))
+    assert not compare_rollups(rollup_table(cursor), expected(cursor, ["BTC-USD"]))[0]
+
+    # retry batch yang sama: MERGE tidak mengubah apa-apa, rollup tertunda tetap dihitung ulang
+    assert db_handler.insert_incremental(cursor, batches[3], "BTC-USD") == 0
+    assert rollups.pending_since(cursor, "BTC-USD") is None
+    same, diff = compare_rollups(rollup_table(cursor), expected(cursor, ["BTC-USD"]))
+    assert same, diff
+
+
+def test_no_changes_without_pending_skips_rollups(cursor, monkeypatch):
+    df = next(rollup_batches("BTC-USD", START, 24, 24, revise_hours=0))
+    db_handler.insert_incremental(cursor, df, "BTC-USD")
+    calls = []
+    monkeypatch.setattr(rollups, "update_rollups", lambda *a, **k: calls.append(a))
+    assert db_handler.insert_incremental(cursor, df, "BTC-USD") == 0
+    assert calls == []
@@ -0,0 +1,29 @@
+from tests.helpers import table_rows
+from utils import db_handler
+from utils.instrumentation import RunRecorder
+
+
+def _record(entity="Crypto"):
+    recorder = RunRecorder(entity, emit_spans=False)
+    with recorder.span("fetch") as span:
+        span["rows"] = 3
+    return recorder.finish()
+
+
+def test_run_record_creates_missing_table(cursor, monkeypatch):
+    cursor.execute("DROP TABLE IngestionRunMetrics")  # database tanpa DDL metrics
+    monkeypatch.setattr(db_handler, "_RUN_METRICS_READY", False)
+    record = _record()
+    assert db_handler.save_run_record(record)
+    assert table_rows(cursor, "SELECT run_id, entity FROM IngestionRunMetrics") == [(record["run_id"], "Crypto")]
+
+
+def test_run_record_failure_is_not_raised(cursor):
+    def broken():
+        raise RuntimeError("SQL down")
+
+    assert db_handler.save_run_record(_record(), connection=broken) is False
+
+    record = _record()
+    assert db_handler.save_run_record(record)
+    assert not db_handler.save_run_record(record)  # run_id dobel (PRIMARY KEY) juga hanya di-log
@@ -0,0 +1,78 @@
+import datetime
+import pytest
+from tests.helpers import flaky
+from utils import data_fetcher, db_handler
+from utils.retry import no_inline_retry
+from utils.scheduler import AdaptiveLimit, Scheduler
+
+START = datetime.datetime(2025, 1, 1)
+END = datetime.datetime(2025, 1, 2)
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(data_fetcher.time, "sleep", lambda s: None)
+
+
+def test_adaptive_limit_decreases_only_on_errors():
+    limit = AdaptiveLimit("price_api", initial=4, maximum=8)
+    for latency in (0.1, 5.0, 30.0, 0.1):  # task besar = latency tinggi, bukan overload
+        assert limit.try_acquire()
+        limit.release(latency, ok=True)
+    assert limit.limit == 5
+
+    assert limit.try_acquire()
+    limit.release(0.1, ok=False)
+    assert limit.limit == 2 and limit.snapshot()["decreases"] == 1
+
+
+def test_scheduler_retries_then_gives_up():
+    calls = []
+
+    def task(failures):
+        calls.append(failures)
+        if len(calls) <= failures:
+            raise RuntimeError("429 Too Many Requests")
+        return "ok"
+
+    with Scheduler(retries=3, backoff=0.01, buckets={}) as scheduler:
+        assert scheduler.submit("price_api", task, 2).result(timeout=5) == "ok"
+    assert len(calls) == 3
+
+    calls.clear()
+    with Scheduler(retries=3, backoff=0.01, buckets={}) as scheduler:
+        future = scheduler.submit("price_api", task, 5)
+        with pytest.raises(RuntimeError, match="429"):
+            future.result(timeout=5)
+    assert len(calls) == 3
+    assert scheduler.metrics()["price_api"]["errors"] == 3
+
+
+def test_errors_escalate_under_scheduler():
+    # tanpa inline retry (worker scheduler) error tidak boleh ditelan jadi "No data"
+    with no_inline_retry():
+        with pytest.raises(RuntimeError, match="429"):
+            data_fetcher.fetch_data("BTC-USD", START, END, downloader=flaky(1, []))
+        with pytest.raises(RuntimeError, match="429"):
+            data_fetcher.fetch_group(START, ["BTC-USD"], {"BTC-USD": START}, END, downloader=flaky(1, []))
+
+
+@pytest.mark.parametrize("failures, status", [(2, "SUCCESS"), (5, "FAILED")])
+def test_run_ingest_retries_fetch_through_scheduler(cursor, blob, failures, status):
+    import TimerCryptoIngest as ingest
+
+    calls = []
+    scheduler = Scheduler(retries=3, backoff=0.01)
+    try:
+        results = ingest.run_ingest(END, blob, symbols=["BTC-USD"], downloader=flaky(failures, calls),
+                                    scheduler=scheduler)
+    finally:
+        scheduler.close()
+
+    assert [r["status"] for r in results] == [status]
+    assert len(calls) == min(failures + 1, 3)
+    watermark = db_handler.get_last_success(cursor, "BTC-USD")
+    if status == "SUCCESS":
+        assert results[0]["rows"] > 0 and watermark == END
+    else:
+        assert watermark == db_handler.DEFAULT_WATERMARK
@@ -0,0 +1,27 @@
+import json
+import os
+import subprocess
+import sys
+import pytest
+from utils import startup_profile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ["pandas", "numpy", "pyarrow", "yfinance", "pyodbc", "azure.storage.blob"]
+
+
+@pytest.mark.parametrize("target", ["TimerCryptoIngest", "TimerNewsIngest", "TimerRawCompaction"])
+def test_function_import_does_not_load_heavy_modules(target):
+    # interpreter baru = cold start; modul berat baru di-load saat function benar-benar jalan
+    code = (
+        f"import importlib, json, sys; importlib.import_module({target!r}); "
+        f"print(json.dumps([m for m in {HEAVY!r} if m in sys.modules]))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, cwd=ROOT)
+    assert json.loads(out.stdout.strip().splitlines()[-1]) == []
+
+
+def test_profile_cold_reports_module_timings():
+    profile = startup_profile.profile_cold("utils.db_handler", top=5)
+    assert profile["entity"] == "utils.db_handler" and profile["total_s"] > 0
+    assert 0 < len(profile["modules"]) <= 5
+    assert {"module", "cumulative_s", "self_s"} <= set(profile["modules"][0])
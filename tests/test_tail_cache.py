@@ -0,0 +1,67 @@
+import datetime
+import pytest
+from benchmarks import fakes
+from tests.helpers import price_frame
+from utils import blob_handler
+
+START = datetime.datetime(2025, 1, 1)
+
+
+@pytest.mark.parametrize("arrow", [False, True])
+def test_diff_against_tail(arrow):
+    tail = price_frame("BTC-USD", START, 4)[["date", "hourx"] + blob_handler.OHLCV_COLUMNS]
+    fetched = price_frame("BTC-USD", START + datetime.timedelta(hours=2), 4)  # 2 overlap + 2 baru
+    fetched.loc[1, "Close"] = 3.0  # bar jam 3 direvisi
+    if arrow:
+        import pyarrow as pa
+        fetched = pa.Table.from_pandas(fetched, preserve_index=False)
+
+    delta, stats = blob_handler.diff_against_tail(fetched, tail)
+    assert stats == {"new": 2, "changed": 1, "unchanged": 1}
+    hours = delta.column("hourx").to_pylist() if arrow else delta["hourx"].tolist()
+    assert hours == [3, 4, 5]
+
+
+def test_diff_without_tail_keeps_everything(blob):
+    fetched = price_frame("BTC-USD", START, 3)
+    delta, stats = blob_handler.diff_against_tail(fetched, blob_handler.read_tail_cache(blob, "BTC-USD"))
+    assert len(delta) == 3 and stats == {"new": 3, "changed": 0, "unchanged": 0}
+
+
+def test_update_tail_cache_round_trip(blob):
+    first = price_frame("BTC-USD", START, 5)
+    blob_handler.update_tail_cache(blob, "BTC-USD", first, max_bars=4)
+    tail = blob_handler.read_tail_cache(blob, "BTC-USD")
+    assert tail["hourx"].tolist() == [1, 2, 3, 4]
+
+    revised = price_frame("BTC-USD", START + datetime.timedelta(hours=4), 2, Close=2.0)
+    blob_handler.update_tail_cache(blob, "BTC-USD", revised, tail, max_bars=4)
+    tail = blob_handler.read_tail_cache(blob, "BTC-USD")
+    assert tail["hourx"].tolist() == [2, 3, 4, 5]
+    assert tail["Close"].tolist() == [1.0, 1.0, 2.0, 2.0]
+
+
+def test_second_run_only_inserts_delta(cursor, blob):
+    import TimerCryptoIngest as ingest
+    from utils.scheduler import Scheduler
+
+    calls = []
+    downloader = fakes.synthetic_downloader(calls=calls)
+    now = datetime.datetime(2025, 1, 3)
+    cursor.execute("INSERT INTO IngestionMetadata (source, last_success) VALUES (?, ?)", ("BTC-USD", START))
+
+    def run(at):
+        scheduler = Scheduler(backoff=0.01)
+        try:
+            return ingest.run_ingest(at, blob, symbols=["BTC-USD"], downloader=downloader, scheduler=scheduler)
+        finally:
+            scheduler.close()
+
+    first = run(now)
+    # run berikutnya: refetch TAIL_REFETCH jam terakhir (sama persis) + 1 bar baru
+    second = run(now + datetime.timedelta(hours=1))
+    assert [r["status"] for r in first + second] == ["SUCCESS", "SUCCESS"]
+    refetch = int(ingest.TAIL_REFETCH.total_seconds() // 3600)
+    assert first[0]["rows"] == 48 + refetch and second[0]["rows"] == 1
+    tail = blob_handler.read_tail_cache(blob, "BTC-USD")
+    assert (tail["date"].iloc[-1], tail["hourx"].iloc[-1]) == (now.date(), 0)
@@ -0,0 +1,108 @@
+import datetime
+from contextlib import closing
+import pytest
+from tests.helpers import table_rows
+from utils import db_handler
+
+T0 = datetime.datetime(2025, 1, 1, 12)
+
+
+def _watermark(cursor, source):
+    return db_handler.get_markers(cursor, [source]).get(source)
+
+
+def _down():
+    raise RuntimeError("SQL down")
+
+
+def _spool_files(spool):
+    return sorted(p.name for p in spool.iterdir()) if spool.exists() else []
+
+
+@pytest.fixture
+def spool(tmp_path):
+    return tmp_path / "spool"
+
+
+def test_replayed_older_watermark_does_not_overwrite_newer(cursor, spool):
+    # flush pertama gagal -> watermark lama masuk spool
+    down = db_handler.TelemetrySink(connection=_down, spool_dir=str(spool))
+    down.update_last_success("BTC-USD", T0)
+    assert down.close() == 0
+
+    # run berikutnya sudah menulis watermark yang lebih baru langsung
+    db_handler.update_last_success(cursor, "BTC-USD", T0 + datetime.timedelta(hours=3))
+
+    # sink berikutnya me-replay spool: watermark lama tidak boleh menimpa yang baru
+    sink = db_handler.TelemetrySink(spool_dir=str(spool))
+    sink.update_last_success("ETH-USD", T0)
+    assert sink.close() == 2
+    assert _watermark(cursor, "BTC-USD") == T0 + datetime.timedelta(hours=3)
+    assert _watermark(cursor, "ETH-USD") == T0
+
+
+def test_markers_can_still_move_backwards(cursor):
+    db_handler.update_last_success(cursor, "NewsAPI:until", T0)
+    db_handler.update_last_success(cursor, "NewsAPI:until", T0 - datetime.timedelta(hours=5))
+    assert _watermark(cursor, "NewsAPI:until") == T0 - datetime.timedelta(hours=5)
+
+
+def test_flush_on_manual_commit_connection(cursor, spool):
+    # koneksi baru tanpa pool (seperti bulk_loader), autocommit=False
+    sink = db_handler.TelemetrySink(
+        connection=lambda: closing(db_handler.connect_sql(autocommit=False)), spool_dir=str(spool)
+    )
+    sink.log_ingestion("BTC-USD", "SUCCESS", rows_inserted=3)
+    sink.update_last_success("BTC-USD", T0)
+    assert sink.close() == 2
+    assert sink.metrics()["spooled"] == 0
+    assert table_rows(cursor, "SELECT source, rows_inserted FROM IngestionLog") == [("BTC-USD", 3)]
+    assert _watermark(cursor, "BTC-USD") == T0
+
+
+def test_spooled_batch_is_replayed_once(cursor, spool):
+    down = db_handler.TelemetrySink(connection=_down, spool_dir=str(spool))
+    down.log_ingestion("BTC-USD", "SUCCESS", rows_inserted=1)
+    down.log_data_quality_issue("BTC-USD", "GAP", "gap of 2h")
+    assert down.close() == 0 and down.metrics()["spooled"] == 2
+    [name] = _spool_files(spool)
+    assert name.startswith("telemetry-") and name.endswith(".json")
+
+    sink = db_handler.TelemetrySink(spool_dir=str(spool))
+    sink.log_ingestion("ETH-USD", "SUCCESS", rows_inserted=2)
+    assert sink.close() == 3 and sink.metrics()["replayed"] == 2
+    assert _spool_files(spool) == []
+    assert table_rows(cursor, "SELECT source, rows_inserted FROM IngestionLog ORDER BY id") == [("BTC-USD", 1), ("ETH-USD", 2)]
+    assert table_rows(cursor, "SELECT issue_type FROM DataQualityIssues") == [("GAP",)]
+
+    # spool sudah habis: sink berikutnya tidak menulis ulang
+    assert db_handler.TelemetrySink(spool_dir=str(spool)).close() == 0
+
+
+def test_claimed_spool_is_not_replayed_by_another_sink(cursor, spool):
+    down = db_handler.TelemetrySink(connection=_down, spool_dir=str(spool))
+    down.log_ingestion("BTC-USD", "SUCCESS")
+    down.close()
+
+    first = db_handler.TelemetrySink(spool_dir=str(spool))
+    claimed, batches = first._claim_spool()
+    assert len(batches) == 1 and ".claimed-" in _spool_files(spool)[0]
+    assert db_handler.TelemetrySink(spool_dir=str(spool)).close() == 0  # sink lain tidak ikut replay
+    assert table_rows(cursor, "SELECT COUNT(*) FROM IngestionLog") == [(0,)]
+
+
+def test_claimed_spool_is_restored_when_respool_fails(spool, monkeypatch):
+    down = db_handler.TelemetrySink(connection=_down, spool_dir=str(spool))
+    down.log_ingestion("BTC-USD", "SUCCESS")
+    down.close()
+    original = _spool_files(spool)
+
+    sink = db_handler.TelemetrySink(connection=_down, spool_dir=str(spool))
+
+    def disk_full(batch):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(sink, "_spool", disk_full)
+    sink.log_ingestion("ETH-USD", "SUCCESS")
+    assert sink.close() == 0
+    assert _spool_files(spool) == original  # batch lama tetap bisa di-replay nanti
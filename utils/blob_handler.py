@@ -1,14 +1,23 @@
-import datetime, io
-from azure.storage.blob import BlobServiceClient
+import base64, datetime, io, json, os, random, threading, time
+from concurrent.futures import ThreadPoolExecutor
 from utils import config
+from utils.instrumentation import add_count
 from utils.logger import logger
 from utils.retry import with_retry
 
+MANIFEST_NAME = "_manifest.json"
+PRICE_KEYS = ["date", "hourx", "crypto"]
+
 
 def connect_blob():
-    """Connect ke Azure Blob Storage"""
+    """Connect ke Azure Blob Storage (atau folder lokal kalau BLOB_LOCAL_ROOT di-set)"""
+    local_root = os.getenv("BLOB_LOCAL_ROOT")
+    if local_root:
+        from utils.local_blob import LocalBlobServiceClient
+        return LocalBlobServiceClient(local_root)
     if not config.AZURE_STORAGE_CONNECTION_STRING:
         raise ValueError("AZURE_STORAGE_CONNECTION_STRING tidak ditemukan di environment")
+    from azure.storage.blob import BlobServiceClient
     return BlobServiceClient.from_connection_string(config.AZURE_STORAGE_CONNECTION_STRING)
 
 
@@ -17,22 +26,566 @@ def _upload_blob(container_client, blob_name, data):
     container_client.upload_blob(name=blob_name, data=data, overwrite=True)
 
 
-def save_raw_to_blob(blob_client, symbol, df, folder="incremental", file_format="parquet"):
-    """Simpan DataFrame ke Azure Blob Storage (Parquet atau JSON) dengan retry"""
+def partition_prefix(folder, symbol, day):
+    """Prefix partisi hive-style: {folder}/crypto={symbol}/date={YYYY-MM-DD}"""
+    return f"{folder}/crypto={symbol}/date={day}"
+
+
+# --- Manifest per partisi (daftar file yang berlaku) ---
+MANIFEST_MAX_ATTEMPTS = int(os.getenv("MANIFEST_MAX_ATTEMPTS", "10"))
+
+
+def _read_manifest_etag(container_client, prefix):
+    """(manifest, etag); etag None kalau manifest belum ada"""
+    try:
+        downloader = container_client.download_blob(f"{prefix}/{MANIFEST_NAME}")
+        raw = downloader.readall()
+    except Exception:
+        return {"files": []}, None
+    return json.loads(raw), downloader.properties.etag
+
+
+def read_manifest(container_client, prefix):
+    return _read_manifest_etag(container_client, prefix)[0]
+
+
+def _write_manifest(container_client, prefix, manifest, etag=None):
+    """Tulis manifest hanya kalau belum berubah sejak dibaca (etag), atau create kalau belum ada"""
+    from azure.core import MatchConditions
+
+    manifest["updated_at"] = datetime.datetime.utcnow().isoformat()
+    data = json.dumps(manifest, indent=2)
+    blob = container_client.get_blob_client(f"{prefix}/{MANIFEST_NAME}")
+    if etag is None:
+        blob.upload_blob(data, overwrite=False)
+    else:
+        blob.upload_blob(data, overwrite=True, etag=etag, match_condition=MatchConditions.IfNotModified)
+
+
+def _conflict_errors():
+    """Error upload bersyarat: Azure (ResourceExists/ResourceModified) dan stand-in lokal"""
+    from azure.core.exceptions import ResourceExistsError, ResourceModifiedError
+    from utils.local_blob import ConditionNotMet
+    return ResourceExistsError, ResourceModifiedError, ConditionNotMet
+
+
+def _update_manifest(container_client, prefix, add=(), remove=()):
+    """
+    Tambah/hapus file di manifest partisi. Ingest per jam dan compaction bisa menulis partisi
+    yang sama, jadi read-modify-write bersyarat etag: kalau manifest berubah di antaranya, baca ulang.
+    File pengganti (add) ditaruh di posisi file pertama yang dibuang, supaya urutan manifest
+    (= urutan keep-last) tetap benar untuk file yang masuk setelah snapshot compaction.
+    Return manifest baru, atau None kalau sebagian file di remove sudah tidak ada di manifest
+    (compaction lain sudah lebih dulu, hasil ini basi).
+    """
+    removed = set(remove)
+    for attempt in range(1, MANIFEST_MAX_ATTEMPTS + 1):
+        manifest, etag = _read_manifest_etag(container_client, prefix)
+        if not removed <= set(manifest["files"]):
+            return None
+        files, placed = [], False
+        for f in manifest["files"]:
+            if f not in removed:
+                files.append(f)
+            elif not placed:
+                files.extend(a for a in add if a not in manifest["files"])
+                placed = True
+        if not placed:
+            files.extend(a for a in add if a not in files)
+        manifest["files"] = files
+        try:
+            _write_manifest(container_client, prefix, manifest, etag)
+            return manifest
+        except _conflict_errors() as e:
+            if attempt == MANIFEST_MAX_ATTEMPTS:
+                raise
+            logger.info(f"Manifest {prefix} changed concurrently ({e}), retrying ({attempt}/{MANIFEST_MAX_ATTEMPTS})")
+            time.sleep(random.uniform(0, 0.05 * attempt))
+
+
+# --- Streaming upload (stage_block / commit_block_list) ---
+STREAM_BLOCK_SIZE = int(os.getenv("BLOB_STREAM_BLOCK_SIZE", str(4 * 1024 * 1024)))
+STREAM_MAX_CONCURRENCY = int(os.getenv("BLOB_STREAM_MAX_CONCURRENCY", "4"))
+STREAM_CHUNK_ROWS = 100_000
+
+
+class BlockBlobWriter(io.RawIOBase):
+    """
+    File-like writer yang mengupload langsung ke block blob.
+
+    Data di-buffer sampai block_size lalu di-stage_block secara paralel; jumlah block
+    in-flight dibatasi max_concurrency, jadi memori maksimal ~ (max_concurrency + 1) * block_size
+    berapapun besar datanya. close() menunggu semua block lalu commit_block_list.
+    """
+
+    def __init__(self, blob_client, block_size=STREAM_BLOCK_SIZE, max_concurrency=STREAM_MAX_CONCURRENCY):
+        super().__init__()
+        self.blob_client = blob_client
+        self.block_size = block_size
+        self._buffer = bytearray()
+        self._block_ids = []
+        self._futures = []
+        self._written = 0
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency)
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self._written
+
+    def write(self, data):
+        if self.closed:
+            raise ValueError("write to closed BlockBlobWriter")
+        self._buffer += data
+        self._written += len(data)
+        while len(self._buffer) >= self.block_size:
+            self._stage(bytes(self._buffer[:self.block_size]))
+            del self._buffer[:self.block_size]
+        return len(data)
+
+    def _stage(self, chunk):
+        block_id = base64.b64encode(f"{len(self._block_ids):08d}".encode()).decode()
+        self._block_ids.append(block_id)
+        self._slots.acquire()  # backpressure: tunggu kalau block in-flight sudah penuh
+        future = self._pool.submit(
+            with_retry, lambda: self.blob_client.stage_block(block_id=block_id, data=chunk), 3, 2
+        )
+        future.add_done_callback(lambda _: self._slots.release())
+        self._futures.append(future)
+
+    def _drain(self):
+        self._pool.shutdown(wait=True)
+        for future in self._futures:
+            future.result()  # lempar error block pertama yang gagal
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self._buffer:
+                self._stage(bytes(self._buffer))
+                self._buffer.clear()
+            self._drain()
+            from azure.storage.blob import BlobBlock
+            with_retry(lambda: self.blob_client.commit_block_list([BlobBlock(block_id=b) for b in self._block_ids]), 3, 2)
+            add_count("bytes", self._written)
+        finally:
+            super().close()
+
+    def abort(self):
+        """Batalkan upload: block yang sudah di-stage tidak di-commit (dibuang otomatis oleh Azure)"""
+        self._buffer.clear()
+        self._pool.shutdown(wait=True)
+        super().close()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+
+
+def _iter_chunks(data, chunk_rows):
+    """
+    DataFrame / pyarrow.Table -> potongan per chunk_rows (Table.slice zero-copy);
+    iterable of DataFrame dilewatkan apa adanya
+    """
+    import pandas as pd
+
+    if hasattr(data, "column_names"):
+        for i in range(0, max(data.num_rows, 1), chunk_rows):
+            yield data.slice(i, chunk_rows)
+    elif isinstance(data, pd.DataFrame):
+        for i in range(0, max(len(data), 1), chunk_rows):
+            yield data.iloc[i:i + chunk_rows]
+    else:
+        yield from data
+
+
+# --- Encoding profile Parquet ---
+# hot     : run per jam, tulis secepat mungkin (snappy, tanpa sort)
+# archive : compaction/arsip, ukuran kecil + scan cepat (zstd level tinggi, sort crypto+waktu,
+#           dictionary crypto, statistik min/max key untuk pruning row group)
+# bulk    : file backfill untuk load ke SQL (lz4 cepat di-decode, row group besar, sort per key)
+PRICE_SORT_KEYS = ["crypto", "date", "hourx"]
+PARQUET_PROFILES = {
+    "hot": {
+        "compression": "snappy",
+        "row_group_size": STREAM_CHUNK_ROWS,
+        # dictionary hanya untuk kolom berulang; OHLC float hampir unik, dictionary-nya cuma buang waktu
+        "use_dictionary": ["crypto", "date"],
+    },
+    "archive": {
+        "compression": "zstd",
+        "compression_level": 9,
+        "row_group_size": 64 * 1024,
+        "sort_by": PRICE_SORT_KEYS,
+        "use_dictionary": ["crypto", "date"],
+        "column_encoding": {
+            "hourx": "DELTA_BINARY_PACKED", "Volume": "DELTA_BINARY_PACKED",
+            **{c: "BYTE_STREAM_SPLIT" for c in ["Open", "High", "Low", "Close"]},  # float lebih ringkas di zstd
+        },
+        "write_statistics": PRICE_SORT_KEYS,
+    },
+    "bulk": {
+        "compression": "lz4",
+        "row_group_size": 1024 * 1024,
+        "sort_by": PRICE_SORT_KEYS,
+        "use_dictionary": ["crypto", "date"],
+        "write_statistics": PRICE_SORT_KEYS,
+    },
+}
+PARQUET_PROFILE = os.getenv("PARQUET_PROFILE", "hot")
+
+
+def parquet_profile(profile=None, **overrides):
+    """Nama profile (default PARQUET_PROFILE) atau dict opsi -> dict opsi lengkap, overrides menang"""
+    if profile is None or isinstance(profile, str):
+        name = profile or PARQUET_PROFILE
+        if name not in PARQUET_PROFILES:
+            raise ValueError(f"Unknown Parquet profile {name!r}, expected one of {sorted(PARQUET_PROFILES)}")
+        profile = PARQUET_PROFILES[name]
+    return {**profile, **{k: v for k, v in overrides.items() if v is not None}}
+
+
+def _writer_options(options, schema, sorted_by=()):
+    """
+    Opsi ParquetWriter untuk schema ini: opsi per kolom hanya untuk kolom yang ada dan tipenya cocok.
+    sorting_columns hanya ditulis untuk kolom yang datanya benar-benar sudah di-sort (sorted_by).
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = dict(zip(schema.names, schema.types))
+    kwargs = {k: v for k, v in options.items() if k not in ("row_group_size", "sort_by", "column_encoding")}
+    for key in ("use_dictionary", "write_statistics"):
+        if isinstance(kwargs.get(key), list):
+            kwargs[key] = [c for c in kwargs[key] if c in types]
+    fits = lambda c, e: pa.types.is_floating(types[c]) if e == "BYTE_STREAM_SPLIT" else pa.types.is_integer(types[c])
+    encoding = {c: e for c, e in options.get("column_encoding", {}).items() if c in types and fits(c, e)}
+    if encoding:  # kolom ini tidak boleh ada di use_dictionary (aturan ParquetWriter)
+        kwargs["column_encoding"] = encoding
+    sorted_by = [c for c in sorted_by if c in types]
+    if sorted_by:
+        kwargs["sorting_columns"] = pq.SortingColumn.from_ordering(schema, [(c, "ascending") for c in sorted_by])
+    return kwargs
+
+
+def _sorted(data, sort_by):
+    """
+    DataFrame/pyarrow.Table -> (pyarrow.Table urut sort_by, kolom yang dipakai sort).
+    Iterable dilewatkan apa adanya dengan kolom kosong (tidak bisa di-sort tanpa dibaca semua).
+    """
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if isinstance(data, pd.DataFrame):
+        data = pa.Table.from_pandas(data, preserve_index=False)
+    if not hasattr(data, "column_names"):
+        return data, []
+    keys = [c for c in sort_by if c in data.column_names]
+    if not keys:
+        return data, []
+    # sort Arrow belum mendukung kolom dictionary (crypto) -> index urutan dari nilai yang di-decode
+    decoded = {}
+    for c in keys:
+        column = data.column(c)
+        decoded[c] = column.cast(column.type.value_type) if pa.types.is_dictionary(column.type) else column
+    return data.take(pc.sort_indices(pa.table(decoded), [(c, "ascending") for c in keys])), keys
+
+
+def stream_parquet_to_blob(container_client, blob_name, data, profile=None, **overrides):
+    """
+    Tulis DataFrame/pyarrow.Table/iterable ke 1 file Parquet di blob dengan encoding profile
+    (nama di PARQUET_PROFILES atau dict opsi, overrides mis. compression=... menang).
+    Table ditulis langsung dari buffer Arrow-nya (tanpa konversi dari pandas).
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    options = parquet_profile(profile, **overrides)
+    row_group_size = options.get("row_group_size", STREAM_CHUNK_ROWS)
+    sorted_by = []
+    if options.get("sort_by"):
+        data, sorted_by = _sorted(data, options["sort_by"])
+
+    writer, rows = None, 0
+    with BlockBlobWriter(container_client.get_blob_client(blob_name)) as sink:
+        for chunk in _iter_chunks(data, row_group_size):
+            table = chunk if hasattr(chunk, "column_names") else pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(sink, table.schema, **_writer_options(options, table.schema, sorted_by))
+            writer.write_table(table, row_group_size=row_group_size)
+            rows += table.num_rows
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+def stream_csv_to_blob(container_client, blob_name, data, chunk_rows=STREAM_CHUNK_ROWS):
+    """Tulis DataFrame/pyarrow.Table/iterable ke 1 CSV di blob (header sekali, line ending LF untuk BULK INSERT)"""
+    rows = 0
+    with BlockBlobWriter(container_client.get_blob_client(blob_name)) as sink:
+        for chunk in _iter_chunks(data, chunk_rows):
+            if hasattr(chunk, "column_names"):
+                _write_arrow_csv(sink, chunk, header=(rows == 0))
+            else:
+                text = chunk.to_csv(index=False, header=(rows == 0), sep=",", lineterminator="\n")
+                sink.write(text.encode("utf-8"))
+            rows += len(chunk)
+    return rows
+
+
+def _write_arrow_csv(sink, table, header):
+    """CSV langsung dari Arrow (dictionary column di-decode dulu, writer Arrow tidak menerimanya)"""
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+
+    for i, field in enumerate(table.schema):
+        if pa.types.is_dictionary(field.type):
+            table = table.set_column(i, field.name, table.column(i).cast(field.type.value_type))
+    pacsv.write_csv(table, sink, pacsv.WriteOptions(include_header=header, quoting_style="none"))
+
+
+def save_raw_to_blob(blob_client, symbol, df, folder="incremental", file_format="parquet", profile=None):
+    """
+    Simpan DataFrame ke Azure Blob Storage (Parquet atau JSON) dengan retry.
+    Layout hive-partitioned: 1 file per tanggal di {folder}/crypto={symbol}/date={date}/,
+    manifest partisi ikut di-update. profile = encoding profile Parquet (default PARQUET_PROFILE).
+    Return list nama blob.
+    """
     ts = datetime.datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-    blob_name = f"{folder}/{symbol}_{ts}.{file_format}"
     container_client = blob_client.get_container_client(config.BLOB_CONTAINER)
 
-    if file_format == "parquet":
-        buffer = io.BytesIO()
-        df.to_parquet(buffer, engine="pyarrow", index=False, compression="snappy")
-        buffer.seek(0)
-        data = buffer
-    else:  # fallback ke JSON
-        data = df.to_json(orient="records", date_format="iso")
+    blob_names = []
+    for day, part in _split_by_date(df):
+        prefix = partition_prefix(folder, symbol, day)
+        blob_name = f"{prefix}/part-{ts}.{file_format}"
+
+        if file_format == "parquet":
+            # retry per block sudah di dalam BlockBlobWriter
+            stream_parquet_to_blob(container_client, blob_name, part, profile)
+        else:  # fallback ke JSON
+            data = part.to_json(orient="records", date_format="iso")
+            # Upload dengan retry
+            with_retry(lambda: _upload_blob(container_client, blob_name, data), max_attempts=3, delay=2)
+        _update_manifest(container_client, prefix, add=[blob_name])
+        blob_names.append(blob_name)
+
+    logger.info(f"Saved raw {symbol} to Blob: {len(blob_names)} partition file(s) under {folder}/crypto={symbol}/")
+    return blob_names
+
+
+def _split_by_date(data):
+    """(date, potongan) per tanggal, urut; pyarrow.Table dipotong lewat filter tanpa ke pandas"""
+    if not hasattr(data, "column_names"):
+        yield from data.groupby("date", sort=True)
+        return
+
+    import pyarrow.compute as pc
+    dates = data.column("date")
+    for day in sorted(pc.unique(dates).to_pylist()):
+        yield day, data.filter(pc.equal(dates, day))
+
+
+def read_partition(container_client, symbol, day, folder="incremental"):
+    """Baca 1 partisi sesuai manifest (hanya file yang berlaku, bukan sisa file kecil)"""
+    import pandas as pd
+
+    prefix = partition_prefix(folder, symbol, day)
+    files = [f for f in read_manifest(container_client, prefix)["files"] if f.endswith(".parquet")]
+    if not files:
+        return pd.DataFrame()
+    frames = [pd.read_parquet(io.BytesIO(container_client.download_blob(f).readall())) for f in files]
+    return pd.concat(frames, ignore_index=True)
+
+
+# --- Compaction ---
+def compact_partition(container_client, symbol, day, folder="incremental", min_files=2, profile="archive"):
+    """
+    Gabung semua file kecil 1 partisi jadi 1 file Parquet (default profile "archive") yang
+    sudah di-dedup (bar terakhir menang) dan di-sort per jam. Manifest di-update dulu baru file lama dihapus,
+    jadi reader yang pakai manifest tidak pernah melihat data dobel/hilang.
+    """
+    import pandas as pd
+
+    prefix = partition_prefix(folder, symbol, day)
+    manifest = read_manifest(container_client, prefix)
+    files = [f for f in manifest["files"] if f.endswith(".parquet")]
+    if len(files) < min_files:
+        return None
 
-    # Upload dengan retry
-    with_retry(lambda: _upload_blob(container_client, blob_name, data), max_attempts=3, delay=2)
+    # manifest append-only -> urutan file = urutan tulis, jadi keep="last" = bar terbaru
+    frames = [pd.read_parquet(io.BytesIO(container_client.download_blob(f).readall())) for f in files]
+    merged = (
+        pd.concat(frames, ignore_index=True)
+        .drop_duplicates(subset=PRICE_KEYS, keep="last")
+        .sort_values(["hourx"])
+    )
 
-    logger.info(f"Saved raw {symbol} to Blob: {blob_name}")
+    # mikrodetik: compaction yang balapan di detik yang sama tidak boleh menimpa (lalu menghapus) file yang sama
+    ts = datetime.datetime.utcnow().strftime("%Y%m%d_%H%M%S_%f")
+    blob_name = f"{prefix}/compacted-{ts}.parquet"
+    stream_parquet_to_blob(container_client, blob_name, merged, profile)
+
+    # file raw yang masuk selama compaction tetap di belakang file ini (tetap menang di keep-last)
+    if _update_manifest(container_client, prefix, add=[blob_name], remove=files) is None:
+        logger.warning(f"Compaction {symbol} {day} skipped: manifest already compacted by another writer")
+        container_client.delete_blob(blob_name)
+        return None
+    for f in files:
+        try:
+            container_client.delete_blob(f)
+        except Exception as e:
+            logger.warning(f"Gagal hapus file lama {f}: {e}")
+
+    logger.info(f"Compacted {symbol} {day}: {len(files)} files → {blob_name} ({len(merged)} rows)")
     return blob_name
+
+
+def list_partitions(container_client, day, folder="incremental"):
+    """Semua symbol yang punya partisi untuk tanggal tertentu"""
+    symbols = set()
+    for blob in container_client.list_blobs(name_starts_with=f"{folder}/crypto="):
+        parts = blob.name.split("/")
+        if len(parts) >= 3 and parts[2] == f"date={day}":
+            symbols.add(parts[1][len("crypto="):])
+    return sorted(symbols)
+
+
+def compact_raw_zone(blob_client, day, folder="incremental", profile="archive"):
+    """Compaction semua partisi crypto untuk 1 tanggal, return list file hasil compaction"""
+    container_client = blob_client.get_container_client(config.BLOB_CONTAINER)
+    compacted = []
+    for symbol in list_partitions(container_client, day, folder):
+        try:
+            blob_name = compact_partition(container_client, symbol, day, folder, profile=profile)
+            if blob_name:
+                compacted.append(blob_name)
+        except Exception as e:
+            logger.error(f"Compaction failed for {symbol} {day}: {e}", exc_info=True)
+    return compacted
+
+
+# --- Tail-bar cache (bar terakhir yang sudah masuk SQL, per symbol) ---
+TAIL_CACHE_FOLDER = "state/tail"
+TAIL_CACHE_BARS = int(os.getenv("TAIL_CACHE_BARS", "48"))
+OHLCV_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+
+def read_tail_cache(blob_client, symbol):
+    """Bar terakhir yang sudah di-ingest untuk symbol (DataFrame date/hourx/OHLCV, kosong kalau belum ada)"""
+    import pandas as pd
+
+    container_client = blob_client.get_container_client(config.BLOB_CONTAINER)
+    try:
+        raw = container_client.download_blob(f"{TAIL_CACHE_FOLDER}/crypto={symbol}.json").readall()
+        bars = json.loads(raw)["bars"]
+    except Exception:
+        bars = []
+    tail = pd.DataFrame(bars, columns=["date", "hourx"] + OHLCV_COLUMNS)
+    tail["date"] = pd.to_datetime(tail["date"]).dt.date
+    tail["hourx"] = tail["hourx"].astype("int64")
+    return tail
+
+
+def diff_against_tail(df, tail):
+    """
+    Bandingkan hasil fetch dengan tail cache. Return (delta, stats):
+    delta = bar baru + bar yang nilainya berubah (candle yang direvisi), bar yang sama dibuang.
+    """
+    import pandas as pd
+
+    if len(df) == 0 or tail.empty:
+        return df, {"new": len(df), "changed": 0, "unchanged": 0}
+
+    arrow = hasattr(df, "column_names")
+    if arrow:
+        import pyarrow as pa
+        keys = df.select(["date", "hourx"]).to_pandas()
+        values = lambda col: df.column(col).cast(pa.float64()).to_numpy()
+    else:
+        keys = df[["date", "hourx"]].reset_index(drop=True)
+        values = lambda col: df[col].to_numpy(dtype="float64")
+    keys["hourx"] = keys["hourx"].astype("int64")
+    merged = keys.merge(tail, on=["date", "hourx"], how="left", indicator=True)
+    cached = (merged["_merge"] == "both").to_numpy()
+
+    changed = pd.Series(False, index=merged.index)
+    for col in OHLCV_COLUMNS:
+        new = pd.Series(values(col), index=merged.index)
+        old = merged[col].astype("float64")
+        changed |= (new != old) & ~(new.isna() & old.isna())
+    changed = changed.to_numpy() & cached
+
+    keep = ~cached | changed
+    stats = {"new": int((~cached).sum()), "changed": int(changed.sum()), "unchanged": int((~keep).sum())}
+    return (df.filter(pa.array(keep)) if arrow else df[keep]), stats
+
+
+def update_tail_cache(blob_client, symbol, df, tail=None, max_bars=TAIL_CACHE_BARS):
+    """Gabungkan bar yang baru di-commit ke tail cache, simpan hanya max_bars terakhir"""
+    import pandas as pd
+
+    if len(df) == 0:
+        return
+    container_client = blob_client.get_container_client(config.BLOB_CONTAINER)
+    tail = read_tail_cache(blob_client, symbol) if tail is None else tail
+    columns = ["date", "hourx"] + OHLCV_COLUMNS
+    fresh = df.select(columns).to_pandas() if hasattr(df, "column_names") else df[columns]
+    merged = (
+        pd.concat([tail, fresh], ignore_index=True) if not tail.empty else fresh
+    ).drop_duplicates(["date", "hourx"], keep="last").sort_values(["date", "hourx"]).tail(max_bars)
+
+    bars = [
+        [d.isoformat(), int(h)] + [None if pd.isna(v) else float(v) for v in values]
+        for d, h, *values in merged.itertuples(index=False, name=None)
+    ]
+    data = json.dumps({"symbol": symbol, "bars": bars, "updated_at": datetime.datetime.utcnow().isoformat()})
+    name = f"{TAIL_CACHE_FOLDER}/crypto={symbol}.json"
+    with_retry(lambda: _upload_blob(container_client, name, data), max_attempts=3, delay=2)
+
+
+# --- Dead-letter (baris yang ditolak SQL, bisa di-replay) ---
+DEAD_LETTER_FOLDER = "deadletter"
+
+
+def save_dead_letter(blob_client, target, columns, rejected, source=None):
+    """
+    Simpan baris yang ditolak ke {DEAD_LETTER_FOLDER}/{target}/date=YYYY-MM-DD/part-*.parquet.
+    Nilai disimpan sebagai string (nilai yang bikin gagal sering tipenya salah) plus kolom
+    _error/_source/_rejected_at; read_dead_letter mengembalikannya jadi list of dict.
+    """
+    import pyarrow as pa
+
+    if not rejected:
+        return None
+    now = datetime.datetime.utcnow()
+    values = {c: [None if row[i] is None else str(row[i]) for _, row, _ in rejected] for i, c in enumerate(columns)}
+    table = pa.table({
+        **{c: pa.array(v, pa.string()) for c, v in values.items()},
+        "_error": pa.array([str(e)[:4000] for _, _, e in rejected], pa.string()),
+        "_source": pa.array([source] * len(rejected), pa.string()),
+        "_rejected_at": pa.array([now] * len(rejected), pa.timestamp("us")),
+    })
+
+    container_client = blob_client.get_container_client(config.BLOB_CONTAINER)
+    blob_name = f"{DEAD_LETTER_FOLDER}/{target}/date={now.date()}/part-{now.strftime('%Y%m%d_%H%M%S_%f')}.parquet"
+    stream_parquet_to_blob(container_client, blob_name, table)
+    logger.warning(f"{len(rejected)} rejected {target} row(s) written to dead-letter {blob_name}")
+    return blob_name
+
+
+def read_dead_letter(blob_client, blob_name):
+    """
+    Baca 1 file dead-letter jadi list of dict kolom asli (tanpa kolom _*), siap di-replay:
+    CryptoNews -> insert_news(records), CryptoPrice -> insert_incremental(cursor, pd.DataFrame(records), crypto).
+    """
+    import pyarrow.parquet as pq
+
+    container_client = blob_client.get_container_client(config.BLOB_CONTAINER)
+    table = pq.read_table(io.BytesIO(container_client.download_blob(blob_name).readall()))
+    return table.select([c for c in table.column_names if not c.startswith("_")]).to_pylist()
@@ -1,24 +1,118 @@
-import time, datetime
-import yfinance as yf
-import pandas as pd
+import os, time, datetime
 from utils import config
 from utils.logger import logger
+from utils.retry import inline_retry_enabled
 
+# Symbol dengan watermark berjarak <= window ini diunduh dalam 1 request yfinance
+BATCH_GROUP_WINDOW = datetime.timedelta(hours=24)
 
-def fetch_data(symbol, start, end, interval=None, adjusted=False, retries=3, tz="UTC"):
+
+def _yf_download():
+    """yfinance baru di-import saat benar-benar fetch (berat, dan tidak dipakai jalur news)"""
+    import yfinance as yf
+    return yf.download
+
+
+def _curate(df, symbol, tz="UTC"):
+    """Normalisasi frame mentah yfinance 1 symbol ke bentuk date/hourx/crypto/OHLCV"""
+    import pandas as pd
+
+    df = df.reset_index()
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = [c[0] if c[0] else c[1] for c in df.columns]
+
+    ts_col = "Datetime" if "Datetime" in df.columns else "Date"
+
+    # Apply timezone if needed
+    if tz and ts_col in df.columns:
+        try:
+            df[ts_col] = df[ts_col].dt.tz_localize("UTC").dt.tz_convert(tz).dt.tz_localize(None)
+        except Exception:
+            # kalau sudah ada timezone, langsung convert
+            df[ts_col] = df[ts_col].dt.tz_convert(tz).dt.tz_localize(None)
+
+    df['date'] = df[ts_col].dt.date
+    df['hourx'] = df[ts_col].dt.hour
+    df['crypto'] = symbol   # konsisten dengan DB schema
+
+    return df[['date','hourx','crypto','Open','High','Low','Close','Volume']]
+
+
+# --- Arrow-native curated batch ---
+# float64 default: float32 membulatkan harga BTC di ~1e-2, hanya aman untuk zona raw/analitik
+PRICE_ARROW_TYPE = os.getenv("PRICE_ARROW_TYPE", "float64")
+OHLC_COLUMNS = ["Open", "High", "Low", "Close"]
+
+
+def curated_schema(price_type=None):
+    """Skema Arrow curated: date32, hourx int16, crypto dictionary, OHLC float, Volume int64"""
+    import pyarrow as pa
+
+    price = pa.type_for_alias(price_type or PRICE_ARROW_TYPE)
+    return pa.schema(
+        [("date", pa.date32()), ("hourx", pa.int16()), ("crypto", pa.dictionary(pa.int32(), pa.string()))]
+        + [(c, price) for c in OHLC_COLUMNS]
+        + [("Volume", pa.int64())]
+    )
+
+
+def curate_arrow(df, symbol, tz="UTC", price_type=None):
+    """
+    Versi Arrow dari _curate: frame mentah yfinance -> pyarrow.Table dengan skema curated_schema().
+    date/hourx dihitung langsung dari int64 index (tanpa reset_index/kolom datetime sementara),
+    symbol cukup 1 entry dictionary, OHLCV diambil per kolom tanpa salinan DataFrame perantara.
+    """
+    import numpy as np
+    import pandas as pd
+    import pyarrow as pa
+
+    schema = curated_schema(price_type)
+    idx = df.index
+    if idx.tz is None:
+        idx = idx.tz_localize("UTC")
+    idx = idx.tz_convert(tz or "UTC").tz_localize(None)
+
+    secs = idx.values.astype("datetime64[s]").astype("int64")  # resolusi index bisa ns/us
+    days = np.floor_divide(secs, 86_400)
+    hours = np.floor_divide(secs - days * 86_400, 3_600)
+
+    names = list(df.columns.get_level_values(0) if isinstance(df.columns, pd.MultiIndex) else df.columns)
+    column = lambda name: df.iloc[:, names.index(name)].to_numpy()
+
+    n = len(df)
+    arrays = [
+        pa.array(days.astype("int32")).cast(pa.date32()),
+        pa.array(hours.astype("int16")),
+        pa.DictionaryArray.from_arrays(pa.array(np.zeros(n, dtype="int32")), pa.array([symbol])),
+    ]
+    arrays += [pa.array(column(c), from_pandas=True).cast(schema.field(c).type) for c in OHLC_COLUMNS]
+    arrays.append(pa.array(column("Volume"), from_pandas=True).cast(pa.int64(), safe=False))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def _curate_as(df, symbol, tz, arrow):
+    return curate_arrow(df, symbol, tz) if arrow else _curate(df, symbol, tz)
+
+
+def fetch_data(symbol, start, end, interval=None, adjusted=False, retries=3, tz="UTC", downloader=None, arrow=False):
     """Fetch OHLCV data dari yfinance untuk 1 symbol"""
+    import pandas as pd
 
     interval = interval or config.INTERVAL
+    downloader = downloader or _yf_download()
 
     if start >= end:
         logger.warning(f"Invalid range for {symbol}: start {start} >= end {end}")
         return pd.DataFrame()
 
+    if not inline_retry_enabled():
+        retries = 1  # dijalankan oleh scheduler: retry dijadwalkan ulang di sana
+
     attempt, df = 0, pd.DataFrame()
     while attempt < retries:
         try:
             t0 = time.time()
-            df = yf.download(
+            df = downloader(
                 symbol, start=start, end=end,
                 interval=interval, auto_adjust=adjusted,
                 progress=False, threads=True
@@ -27,34 +121,110 @@ def fetch_data(symbol, start, end, interval=None, adjusted=False, retries=3, tz=
             if not df.empty:
                 break
         except Exception as e:
+            if not inline_retry_enabled():
+                raise  # scheduler yang retry (backoff + AIMD), jangan ditelan jadi "No data"
             logger.error(f"Error fetching {symbol} (attempt {attempt+1}): {e}")
         attempt += 1
-        time.sleep(2 * attempt)  # exponential backoff
+        if attempt < retries:
+            time.sleep(2 * attempt)  # exponential backoff
 
     if df.empty:
         logger.warning(f"No data returned for {symbol} {start} - {end} after {retries} retries")
         return pd.DataFrame()
 
-    # Normalize columns
-    df.reset_index(inplace=True)
-    if isinstance(df.columns, pd.MultiIndex):
-        df.columns = [c[0] if c[0] else c[1] for c in df.columns]
+    curated = _curate_as(df, symbol, tz, arrow)
+    logger.info(f"{symbol}: fetched {len(curated)} rows ({start} → {end}) in {elapsed}s (interval={interval}, tz={tz})")
 
-    ts_col = "Datetime" if "Datetime" in df.columns else "Date"
+    return curated
 
-    # Apply timezone if needed
-    if tz and ts_col in df.columns:
-        try:
-            df[ts_col] = df[ts_col].dt.tz_localize("UTC").dt.tz_convert(tz).dt.tz_localize(None)
-        except Exception:
-            # kalau sudah ada timezone, langsung convert
-            df[ts_col] = df[ts_col].dt.tz_convert(tz).dt.tz_localize(None)
 
-    df['date'] = df[ts_col].dt.date
-    df['hourx'] = df[ts_col].dt.hour
-    df['crypto'] = symbol   # konsisten dengan DB schema
+def group_by_watermark(watermarks, window=BATCH_GROUP_WINDOW):
+    """
+    Kelompokkan symbol yang watermark-nya berdekatan.
+    Return list (start, [symbols]) dengan start = watermark paling awal di grup.
+    """
+    groups = []
+    for symbol, ts in sorted(watermarks.items(), key=lambda kv: kv[1]):
+        if groups and ts - groups[-1][0] <= window:
+            groups[-1][1].append(symbol)
+        else:
+            groups.append((ts, [symbol]))
+    return groups
 
-    curated = df[['date','hourx','crypto','Open','High','Low','Close','Volume']]
-    logger.info(f"{symbol}: fetched {len(curated)} rows ({start} → {end}) in {elapsed}s (interval={interval}, tz={tz})")
 
-    return curated
+def _split_symbol(raw, symbol):
+    """Ambil frame 1 symbol dari hasil yf.download multi-ticker (kolom MultiIndex)"""
+    import pandas as pd
+
+    if raw is None or raw.empty:
+        return pd.DataFrame()
+    if isinstance(raw.columns, pd.MultiIndex):
+        for level in range(raw.columns.nlevels):
+            if symbol in raw.columns.get_level_values(level):
+                part = raw.xs(symbol, axis=1, level=level)
+                break
+        else:
+            return pd.DataFrame()
+    else:
+        part = raw
+    # index multi-ticker = gabungan semua symbol, baris kosong milik symbol lain
+    return part.dropna(how="all")
+
+
+def fetch_group(start, symbols, watermarks, end, interval=None, adjusted=False, tz="UTC", downloader=None,
+                arrow=False):
+    """
+    Fetch 1 grup watermark dengan 1 request yfinance. Return {symbol: curated DataFrame}
+    (atau pyarrow.Table kalau arrow=True). Symbol yang gagal/kosong di batch di-fetch ulang
+    sendiri lewat fetch_data. Di bawah scheduler (no_inline_retry) error download dilempar.
+    """
+    import pandas as pd
+
+    interval = interval or config.INTERVAL
+    downloader = downloader or _yf_download()
+    if start >= end:
+        return {s: pd.DataFrame() for s in symbols}
+
+    raw = None
+    try:
+        t0 = time.time()
+        raw = downloader(
+            symbols, start=start, end=end,
+            interval=interval, auto_adjust=adjusted,
+            progress=False, threads=True, group_by="ticker"
+        )
+        elapsed = round(time.time() - t0, 2)
+        logger.info(f"Batch fetched {len(symbols)} symbols ({start} → {end}) in {elapsed}s")
+    except Exception as e:
+        if not inline_retry_enabled():
+            raise  # di bawah scheduler: 1 grup di-retry utuh, bukan fallback per-symbol yang juga kena limit
+        logger.error(f"Batch fetch failed for {symbols}: {e}")
+
+    results, failed = {}, []
+    for symbol in symbols:
+        part = _split_symbol(raw, symbol)
+        if part.empty:
+            failed.append(symbol)
+            continue
+        # grup mulai dari watermark paling awal; bar yang overlap aman karena upsert idempotent
+        results[symbol] = _curate_as(part, symbol, tz, arrow)
+
+    for symbol in failed:
+        logger.warning(f"{symbol}: missing from batch, fallback ke fetch per-symbol")
+        results[symbol] = fetch_data(
+            symbol, watermarks[symbol], end, interval, adjusted, tz=tz, downloader=downloader, arrow=arrow
+        )
+
+    return results
+
+
+def fetch_batch(watermarks, end, interval=None, adjusted=False, tz="UTC",
+                window=BATCH_GROUP_WINDOW, downloader=None):
+    """
+    Fetch banyak symbol sekaligus: 1 request yfinance per grup watermark.
+    watermarks = {symbol: last_success}. Return {symbol: curated DataFrame}.
+    """
+    results = {}
+    for start, symbols in group_by_watermark(watermarks, window):
+        results.update(fetch_group(start, symbols, watermarks, end, interval, adjusted, tz, downloader))
+    return results
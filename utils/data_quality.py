@@ -0,0 +1,160 @@
+from utils.logger import logger
+
+# Aksi per jenis issue: QUARANTINE = baris tidak di-insert, FLAG = tetap di-insert tapi dicatat
+ISSUE_ACTIONS = {
+    "MISSING_PRICE": "QUARANTINE",
+    "DUPLICATE_HOUR": "QUARANTINE",
+    "HIGH_LT_LOW": "QUARANTINE",
+    "NEGATIVE_VOLUME": "QUARANTINE",
+    "ZERO_VOLUME": "FLAG",
+    "GAP": "FLAG",
+    "STALE_CLOSE": "FLAG",
+}
+
+STALE_CLOSE_RUN = 6  # close sama persis >= 6 bar berturut-turut dianggap feed macet
+
+INTERVAL_HOURS = {"1h": 1, "60m": 1, "4h": 4, "1d": 24}
+
+
+def _bar_timestamp(df):
+    """Timestamp bar dari kolom date + hourx"""
+    import pandas as pd
+
+    return pd.to_datetime(df["date"]) + pd.to_timedelta(df["hourx"].astype("int64"), unit="h")
+
+
+def _issues(df, mask, issue_type, detail):
+    """Bentuk frame issue untuk baris yang kena mask; detail(idx) hanya dihitung untuk baris itu"""
+    import numpy as np
+    import pandas as pd
+
+    if not mask.any():
+        return None
+    idx = np.flatnonzero(mask)
+    hit = df.iloc[idx]
+    label = (hit["crypto"].astype(str) + " " + _bar_timestamp(hit).dt.strftime("%Y-%m-%d %H:00")).reset_index(drop=True)
+    return pd.DataFrame({
+        "source": hit["crypto"].astype(str).to_numpy(),
+        "issue_type": issue_type,
+        "issue_detail": (label + " " + detail(idx)).to_numpy(),
+        "action": ISSUE_ACTIONS[issue_type],
+    })
+
+
+def _text(values):
+    import pandas as pd
+
+    return pd.Series(values).astype(str).reset_index(drop=True)
+
+
+def _sorted_arrow(table):
+    """Sort pyarrow.Table per crypto/date/hourx (dictionary column tidak bisa sort_by langsung)"""
+    import numpy as np
+    import pyarrow as pa
+
+    symbols = table.column("crypto").cast(pa.string()).to_numpy(zero_copy_only=False)
+    order = np.lexsort((
+        table.column("hourx").to_numpy(),
+        table.column("date").cast(pa.int32()).to_numpy(),
+        np.unique(symbols, return_inverse=True)[1],
+    ))
+    return table if (np.diff(order) > 0).all() else table.take(order)
+
+
+def _with_context(df, context):
+    """
+    Gabung bar yang sudah commit (context) di depan batch: GAP/STALE_CLOSE butuh bar sebelumnya.
+    Bar context yang key-nya ada di batch dibuang (batch = versi terbaru). Kolom _row = posisi
+    baris di df, -1 untuk context. context tanpa kolom crypto (tail cache) = symbol batch (1 symbol).
+    """
+    import pandas as pd
+
+    keys = ["crypto", "date", "hourx"]
+    frame = df.assign(crypto=df["crypto"].astype(str), _row=range(len(df)))
+    if context is None or len(context) == 0:
+        return frame
+    ctx = context.to_pandas() if hasattr(context, "column_names") else context
+    if "crypto" not in ctx.columns:
+        ctx = ctx.assign(crypto=frame["crypto"].iloc[0])
+    ctx = ctx.assign(crypto=ctx["crypto"].astype(str), hourx=ctx["hourx"].astype("int64"), _row=-1)
+    ctx = ctx[[c for c in frame.columns if c in ctx.columns]]
+    ctx = ctx[~pd.MultiIndex.from_frame(ctx[keys]).isin(pd.MultiIndex.from_frame(frame[keys].astype({"hourx": "int64"})))]
+    ctx = ctx[ctx["crypto"].isin(frame["crypto"].unique())]
+    if ctx.empty:
+        return frame
+    combined = pd.concat([ctx, frame.astype({"hourx": "int64"})], ignore_index=True)
+    return combined.sort_values(keys, kind="stable").reset_index(drop=True)
+
+
+def validate_prices(df, interval="1h", stale_run=STALE_CLOSE_RUN, context=None):
+    """
+    Jalankan semua cek kualitas data OHLCV secara vectorized (bisa multi-symbol).
+    Return (clean_df, issues_df): clean_df tanpa baris QUARANTINE, issues_df berisi
+    kolom source/issue_type/issue_detail/action siap ditulis ke DataQualityIssues.
+    Input pyarrow.Table (curate_arrow) menghasilkan clean berupa Table juga.
+    context = bar yang sudah commit (mis. tail cache), hanya dipakai sebagai pembanding
+    GAP/STALE_CLOSE; issue dan quarantine hanya untuk baris df.
+    """
+    import numpy as np
+    import pandas as pd
+
+    empty = pd.DataFrame(columns=["source", "issue_type", "issue_detail", "action"])
+    if len(df) == 0:
+        return df, empty
+
+    table = None
+    if hasattr(df, "column_names"):
+        table = _sorted_arrow(df)
+        df = table.to_pandas()
+    else:
+        df = df.sort_values(["crypto", "date", "hourx"], kind="stable").reset_index(drop=True)
+    frame = _with_context(df, context)
+    batch = (frame["_row"] >= 0).to_numpy()
+    ts = _bar_timestamp(frame)
+    same_symbol = frame["crypto"].eq(frame["crypto"].shift())
+
+    missing = frame[["Open", "High", "Low", "Close"]].isna().any(axis=1).to_numpy()
+    duplicate = frame.duplicated(subset=["crypto", "date", "hourx"], keep="last").to_numpy()
+    high_lt_low = (frame["High"] < frame["Low"]).to_numpy()
+    volume = pd.to_numeric(frame["Volume"], errors="coerce")
+    negative_volume = (volume < 0).to_numpy()
+    zero_volume = (volume == 0).to_numpy()
+
+    step = pd.Timedelta(hours=INTERVAL_HOURS.get(interval, 1))
+    gap_hours = ts.diff() / pd.Timedelta(hours=1)
+    gap = (same_symbol & (ts.diff() > step)).to_numpy()
+
+    # run-length close yang sama: id run baru setiap close berubah / ganti symbol
+    same_close = same_symbol & frame["Close"].eq(frame["Close"].shift())
+    run_id = (~same_close).cumsum()
+    run_len = run_id.map(run_id.value_counts())
+    # dicatat sekali, di bar yang membuat run mencapai stale_run (run bisa mulai di context)
+    stale = (run_id.groupby(run_id).cumcount() + 1 == stale_run).to_numpy()
+
+    high, low, close = frame["High"].to_numpy(), frame["Low"].to_numpy(), frame["Close"].to_numpy()
+    checks = [
+        (missing, "MISSING_PRICE", lambda i: "missing OHLC value"),
+        (duplicate, "DUPLICATE_HOUR", lambda i: "duplicated in batch"),
+        (high_lt_low, "HIGH_LT_LOW", lambda i: "High " + _text(high[i]) + " < Low " + _text(low[i])),
+        (negative_volume, "NEGATIVE_VOLUME", lambda i: "Volume " + _text(volume.to_numpy()[i])),
+        (zero_volume, "ZERO_VOLUME", lambda i: "Volume 0"),
+        (gap, "GAP", lambda i: "gap of " + _text(gap_hours.to_numpy()[i]) + "h since previous bar"),
+        (stale, "STALE_CLOSE", lambda i: "Close " + _text(close[i]) + " repeated for " + _text(run_len.to_numpy()[i]) + " bars"),
+    ]
+    frames = [f for f in (_issues(frame, mask & batch, t, detail) for mask, t, detail in checks) if f is not None]
+    issues = pd.concat(frames, ignore_index=True) if frames else empty
+
+    # kembali ke posisi baris df (context tidak pernah di-quarantine)
+    quarantine = np.zeros(len(df), dtype=bool)
+    quarantine[frame["_row"].to_numpy()[batch]] = (missing | duplicate | high_lt_low | negative_volume)[batch]
+    if table is not None:
+        import pyarrow as pa
+        clean = table.filter(pa.array(~quarantine)) if quarantine.any() else table
+    else:
+        clean = df[~quarantine]
+    if len(issues):
+        logger.warning(
+            f"Data quality: {len(issues)} issue(s), {int(quarantine.sum())} row(s) quarantined "
+            f"({issues['issue_type'].value_counts().to_dict()})"
+        )
+    return clean, issues
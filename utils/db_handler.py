@@ -1,71 +1,676 @@
-import datetime
-import pyodbc
-import pandas as pd
+import datetime, hashlib, json, os, sqlite3, sys, tempfile, threading, time
+from collections import OrderedDict
 from contextlib import contextmanager
 from utils import config
 from utils.logger import logger
 from utils.news_coin_mapper import detect_coin
 
 
+# --- Koneksi SQL ---
+def connect_sql(autocommit=True):
+    """Buka koneksi baru ke Azure SQL (tanpa pool); "sqlite:///path" = stand-in lokal"""
+    if not config.SQL_CONN_STRING:
+        raise ValueError("SQL_CONN_STRING tidak ditemukan di environment")
+    if config.SQL_CONN_STRING.startswith("sqlite:///"):
+        return sqlite3.connect(
+            config.SQL_CONN_STRING[len("sqlite:///"):], check_same_thread=False, timeout=30,
+            isolation_level=None if autocommit else "DEFERRED",
+        )
+    import pyodbc  # lazy: driver ODBC (unixODBC) baru di-load saat koneksi pertama, bukan saat cold start
+    return pyodbc.connect(config.SQL_CONN_STRING, autocommit=autocommit)
+
+
+class _NotLoaded(Exception):
+    """Tidak pernah dilempar: pengganti pyodbc.Error selama pyodbc belum di-import"""
+
+
+def _pyodbc_error():
+    """pyodbc.Error kalau pyodbc sudah di-load; belum di-load = belum ada koneksi pyodbc yang bisa error"""
+    pyodbc = sys.modules.get("pyodbc")
+    return pyodbc.Error if pyodbc is not None else _NotLoaded
+
+
+def _is_sqlite(cursor):
+    """True kalau cursor dari sqlite3 (stand-in lokal pengganti SQL Server)"""
+    return isinstance(cursor, sqlite3.Cursor)
+
+
+# --- Connection Pool (bertahan selama worker Functions masih warm) ---
+SQL_POOL_SIZE = int(os.getenv("SQL_POOL_SIZE", "8"))
+SQL_POOL_HEALTHCHECK_IDLE = float(os.getenv("SQL_POOL_HEALTHCHECK_IDLE", "30"))
+SQL_POOL_TIMEOUT = float(os.getenv("SQL_POOL_TIMEOUT", "60"))
+
+
+class ConnectionPool:
+    """
+    Pool koneksi thread-safe untuk worker ThreadPoolExecutor.
+
+    Koneksi idle disimpan LIFO dan dipakai ulang antar invocation; health check
+    (SELECT 1) hanya dijalankan kalau koneksi sudah idle lebih dari healthcheck_idle detik.
+    """
+
+    def __init__(self, factory, max_size=SQL_POOL_SIZE, healthcheck_idle=SQL_POOL_HEALTHCHECK_IDLE):
+        self.factory = factory
+        self.max_size = max_size
+        self.healthcheck_idle = healthcheck_idle
+        self._idle = []  # list of (conn, last_used)
+        self._in_use = 0
+        self._cond = threading.Condition()
+        self._stats = {"checkouts": 0, "creates": 0, "reuses": 0, "waits": 0, "discards": 0, "wait_seconds": 0.0}
+
+    def _healthy(self, conn, last_used):
+        if time.monotonic() - last_used < self.healthcheck_idle:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            return True
+        except Exception as e:
+            logger.warning(f"Pooled SQL connection failed health check: {e}")
+            return False
+
+    def _discard(self, conn):
+        self._stats["discards"] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def acquire(self, timeout=SQL_POOL_TIMEOUT):
+        """Ambil koneksi dari pool (reuse idle, buat baru kalau belum penuh, atau tunggu)"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._stats["checkouts"] += 1
+            waited = False
+            while not self._idle and self._in_use >= self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"SQL pool exhausted ({self.max_size} connections in use)")
+                if not waited:
+                    self._stats["waits"] += 1
+                    waited = True
+                t0 = time.monotonic()
+                self._cond.wait(remaining)
+                self._stats["wait_seconds"] += time.monotonic() - t0
+            candidate = self._idle.pop() if self._idle else None
+            self._in_use += 1
+
+        try:
+            # health check & connect di luar lock supaya worker lain tidak ikut menunggu
+            if candidate is not None:
+                conn, last_used = candidate
+                if self._healthy(conn, last_used):
+                    with self._cond:
+                        self._stats["reuses"] += 1
+                    return conn
+                with self._cond:
+                    self._discard(conn)
+            conn = self.factory()
+            with self._cond:
+                self._stats["creates"] += 1
+            return conn
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn, discard=False):
+        """Kembalikan koneksi ke pool; discard=True kalau koneksi bermasalah"""
+        with self._cond:
+            self._in_use -= 1
+            if discard or len(self._idle) >= self.max_size:
+                self._discard(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        except BaseException as e:
+            self.release(conn, discard=isinstance(e, _pyodbc_error()))
+            raise
+        else:
+            self.release(conn)
+
+    def metrics(self):
+        """Snapshot metrik pool: waits, creates, reuse ratio, dll"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update(idle=len(self._idle), in_use=self._in_use, max_size=self.max_size)
+        stats["reuse_ratio"] = round(stats["reuses"] / stats["checkouts"], 3) if stats["checkouts"] else 0.0
+        return stats
+
+    def close_all(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_pool():
+    """Pool module-level, dibuat sekali per worker process"""
+    global _POOL
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                _POOL = ConnectionPool(connect_sql)
+    return _POOL
+
+
+def reset_pool():
+    """Tutup koneksi idle dan buang pool (pool baru dibuat ulang dari config saat dipakai lagi)"""
+    global _POOL
+    with _POOL_LOCK:
+        pool, _POOL = _POOL, None
+    if pool is not None:
+        pool.close_all()
+
+
+def pooled_connection():
+    """Context manager: pinjam koneksi dari pool, otomatis dikembalikan"""
+    return get_pool().connection()
+
+
+def pool_metrics():
+    return get_pool().metrics()
+
+
 # --- Context Manager untuk koneksi SQL ---
 @contextmanager
 def sql_cursor():
-    """Context manager untuk koneksi SQL, otomatis close"""
-    conn = pyodbc.connect(config.SQL_CONN_STRING, autocommit=True)
-    try:
-        yield conn.cursor()
-    finally:
-        conn.close()
+    """Context manager cursor dari connection pool, otomatis close"""
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            yield cursor
+        finally:
+            cursor.close()
 
 
 # --- Watermark Management ---
+DEFAULT_WATERMARK = datetime.datetime(2024, 1, 1)
+
+
+def _as_datetime(value):
+    """Nilai DATETIME dari driver (sqlite3 mengembalikan string ISO)"""
+    if isinstance(value, str):
+        return datetime.datetime.fromisoformat(value)
+    return value
+
+
+def _as_date(value):
+    if isinstance(value, str):
+        return datetime.date.fromisoformat(value)
+    return value
+
+
+def _fallback_watermarks(cursor, sources):
+    """
+    Watermark dari CryptoPrice untuk symbol tanpa metadata, 1 query untuk semua symbol.
+    MAX(date) lalu MAX(hourx) di tanggal itu -> bisa seek index (crypto, date, hourx),
+    beda dengan MAX(DATEADD(...)) yang harus scan semua baris crypto tsb.
+    """
+    placeholders = ",".join("?" * len(sources))
+    cursor.execute(f"""
+        SELECT m.crypto, m.max_date, MAX(p.hourx)
+        FROM (
+            SELECT crypto, MAX(date) AS max_date
+            FROM CryptoPrice WHERE crypto IN ({placeholders})
+            GROUP BY crypto
+        ) m
+        JOIN CryptoPrice p ON p.crypto = m.crypto AND p.date = m.max_date
+        GROUP BY m.crypto, m.max_date
+    """, list(sources))
+    return {
+        crypto: datetime.datetime.combine(_as_date(max_date), datetime.time(int(max_hour)))
+        for crypto, max_date, max_hour in cursor.fetchall()
+        if max_date is not None and max_hour is not None
+    }
+
+
+def get_last_success_bulk(cursor, sources):
+    """Ambil watermark semua source dari IngestionMetadata dalam 1 round trip, fallback ke CryptoPrice"""
+    sources = list(dict.fromkeys(sources))
+    if not sources:
+        return {}
+
+    cursor.execute(
+        f"SELECT source, last_success FROM IngestionMetadata WHERE source IN ({','.join('?' * len(sources))})",
+        sources,
+    )
+    watermarks = {src: _as_datetime(ts) for src, ts in cursor.fetchall() if ts}
+
+    missing = [s for s in sources if s not in watermarks]
+    if missing:
+        watermarks.update(_fallback_watermarks(cursor, missing))
+
+    return {s: watermarks.get(s, DEFAULT_WATERMARK) for s in sources}
+
+
 def get_last_success(cursor, source):
     """Ambil watermark terakhir dari IngestionMetadata, fallback ke MAX dari CryptoPrice"""
-    cursor.execute("SELECT last_success FROM IngestionMetadata WHERE source=?", source)
-    row = cursor.fetchone()
-    if row and row[0]:
-        return row[0]
+    return get_last_success_bulk(cursor, [source])[source]
 
-    cursor.execute("""
-        SELECT MAX(DATEADD(HOUR, hourx, CAST(date AS DATETIME2))) 
-        FROM CryptoPrice WHERE crypto=?""", source)
-    row2 = cursor.fetchone()
-    return row2[0] if row2 and row2[0] else datetime.datetime(2024, 1, 1)
+
+def update_last_success_bulk(cursor, watermarks, monotonic=False):
+    """
+    Update banyak watermark ({source: last_success}) di IngestionMetadata, 1 statement per 500 source.
+    monotonic=True: nilai yang lebih lama dari yang sudah tersimpan diabaikan (mis. batch telemetry
+    dari spool yang di-replay setelah run yang lebih baru). Marker yang memang boleh mundur
+    (news until, rollup pending) tetap pakai default.
+    """
+    items = list(watermarks.items())
+    for i in range(0, len(items), 500):
+        chunk = items[i:i + 500]
+        params = [v for item in chunk for v in item]
+        values = ",".join("(?, ?)" for _ in chunk)
+
+        if _is_sqlite(cursor):
+            cursor.execute(f"""
+                INSERT INTO IngestionMetadata (source, last_success) VALUES {values}
+                ON CONFLICT(source) DO UPDATE SET
+                    last_success=excluded.last_success, updated_at=CURRENT_TIMESTAMP
+                {"WHERE excluded.last_success > IngestionMetadata.last_success" if monotonic else ""}
+            """, params)
+            continue
+
+        cursor.execute(f"""
+            MERGE IngestionMetadata AS target
+            USING (VALUES {values}) AS src (source, last_success)
+            ON target.source = src.source
+            WHEN MATCHED {"AND src.last_success > target.last_success" if monotonic else ""} THEN
+                UPDATE SET last_success=src.last_success, updated_at=GETDATE()
+            WHEN NOT MATCHED THEN 
+                INSERT (source, last_success) VALUES (src.source, src.last_success);
+        """, params)
 
 
 def update_last_success(cursor, source, new_ts):
     """Update watermark di IngestionMetadata"""
-    cursor.execute("""
-        MERGE IngestionMetadata AS target
-        USING (SELECT ? AS source, ? AS last_success) AS src
-        ON target.source = src.source
-        WHEN MATCHED THEN 
-            UPDATE SET last_success=src.last_success, updated_at=GETDATE()
-        WHEN NOT MATCHED THEN 
-            INSERT (source, last_success) VALUES (src.source, src.last_success);
-    """, source, new_ts)
+    update_last_success_bulk(cursor, {source: new_ts})
+
+
+def get_markers(cursor, sources):
+    """Nilai IngestionMetadata apa adanya (tanpa fallback CryptoPrice/default), source yang belum ada tidak ikut"""
+    sources = list(dict.fromkeys(sources))
+    if not sources:
+        return {}
+    cursor.execute(
+        f"SELECT source, last_success FROM IngestionMetadata WHERE source IN ({','.join('?' * len(sources))})",
+        sources,
+    )
+    return {src: _as_datetime(ts) for src, ts in cursor.fetchall() if ts}
+
+
+def clear_markers(cursor, sources):
+    """Hapus baris IngestionMetadata (marker sementara, bukan watermark utama)"""
+    sources = list(dict.fromkeys(sources))
+    if sources:
+        cursor.execute(f"DELETE FROM IngestionMetadata WHERE source IN ({','.join('?' * len(sources))})", sources)
+
+
+# --- Columnar Encoder (DataFrame / Arrow -> parameter rows) ---
+# Skema per tabel tujuan: urutan kolom = urutan parameter, value = tipe DB
+CRYPTO_PRICE_SCHEMA = {
+    "date": "date", "hourx": "int", "crypto": "str",
+    "Open": "float", "High": "float", "Low": "float", "Close": "float", "Volume": "int",
+}
+CRYPTO_NEWS_SCHEMA = {
+    "coin": "str", "title": "str", "description": "str", "content": "str",
+    "publishedAt": "datetime", "news_date": "date", "source": "str", "url": "str",
+}
+
+_ARROW_TYPES = {
+    "int": "int64", "float": "float64", "str": "string",
+    "date": "date32", "datetime": "timestamp[us]",
+}
+
+
+def _encode_series(s, kind):
+    """Coerce 1 kolom pandas ke object array berisi tipe Python native, NaN/NaT -> None"""
+    import numpy as np
+    import pandas as pd
+
+    if kind == "float":
+        s = pd.to_numeric(s, errors="coerce").astype("float64")
+        mask = s.isna().to_numpy()
+        values = s.to_numpy(dtype=object, copy=True)
+    elif kind == "int":
+        s = pd.to_numeric(s, errors="coerce")
+        mask = s.isna().to_numpy()
+        values = s.fillna(0).astype("int64").to_numpy(dtype=object, copy=True)
+    elif kind == "str":
+        mask = s.isna().to_numpy()
+        values = s.astype(str).to_numpy(dtype=object, copy=True)
+    elif kind in ("date", "datetime"):
+        s = pd.to_datetime(s, errors="coerce", utc=(kind == "datetime"))
+        if kind == "datetime":
+            s = s.dt.tz_convert(None)  # simpan sebagai UTC naive
+        mask = s.isna().to_numpy()
+        if kind == "date":
+            values = s.dt.date.to_numpy(dtype=object, copy=True)
+        else:
+            values = np.array(s.dt.to_pydatetime(), dtype=object)
+    else:
+        raise ValueError(f"Tipe kolom tidak dikenal: {kind}")
+
+    values[mask] = None
+    return values
+
+
+def _encode_arrow_column(column, kind):
+    """Cast 1 kolom Arrow ke tipe target lalu materialize ke Python (null -> None)"""
+    import pyarrow as pa
+
+    # timestamp ber-timezone di-cast ke naive tetap menyimpan nilai UTC-nya
+    return column.cast(pa.type_for_alias(_ARROW_TYPES[kind]), safe=False).to_pylist()
+
+
+def _parse_datetime(value):
+    """ISO string / datetime -> datetime UTC naive (publishedAt NewsAPI pakai akhiran Z)"""
+    if not isinstance(value, datetime.datetime):
+        value = datetime.datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if value.tzinfo is not None:
+        value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _encode_value(value, kind):
+    """Versi per-value _encode_series untuk input list of dict (tanpa pandas)"""
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+    try:
+        if kind == "str":
+            return str(value)
+        if kind == "float":
+            return float(value)
+        if kind == "int":
+            return int(value)
+        if kind == "datetime":
+            return _parse_datetime(value)
+        if kind == "date":
+            return value if type(value) is datetime.date else _parse_datetime(value).date()
+    except (TypeError, ValueError):
+        return None  # sama dengan errors="coerce" di jalur pandas
+    raise ValueError(f"Tipe kolom tidak dikenal: {kind}")
+
+
+def encode_rows(data, schema):
+    """
+    Encode DataFrame, pyarrow.Table, atau list of dict ke list tuple parameter untuk executemany.
+
+    DataFrame/Arrow dikonversi per kolom (vectorized), bukan per baris: NaN/NaT/null jadi None,
+    tipe di-coerce sesuai skema tabel tujuan (lihat CRYPTO_PRICE_SCHEMA / CRYPTO_NEWS_SCHEMA).
+    List of dict (jalur news) di-encode per value supaya tidak perlu import pandas.
+    """
+    if isinstance(data, list):
+        return [tuple(_encode_value(row.get(name), kind) for name, kind in schema.items()) for row in data]
+    if hasattr(data, "column_names"):  # pyarrow.Table / RecordBatch
+        columns = [_encode_arrow_column(data.column(name), kind) for name, kind in schema.items()]
+    else:
+        columns = [_encode_series(data[name], kind) for name, kind in schema.items()]
+    return list(zip(*columns))
+
+
+# --- Failure isolation (batch gagal dibelah dua sampai baris penyebabnya ketemu) ---
+@contextmanager
+def _atomic(cursor):
+    """1 batch = 1 transaksi: sukses di-commit, gagal di-rollback tanpa efek parsial"""
+    if _is_sqlite(cursor):
+        cursor.execute("SAVEPOINT isolate_batch")
+        try:
+            yield
+        except Exception:
+            cursor.execute("ROLLBACK TO isolate_batch")
+            cursor.execute("RELEASE isolate_batch")
+            raise
+        cursor.execute("RELEASE isolate_batch")
+        return
+
+    # autocommit=False belum tentu ada transaksi terbuka (mis. habis conn.rollback()),
+    # dan SAVE TRANSACTION di luar transaksi gagal (error 628) -> cek @@TRANCOUNT
+    conn = cursor.connection
+    restore = conn.autocommit
+    conn.autocommit = False
+    try:
+        if cursor.execute("SELECT @@TRANCOUNT").fetchone()[0] > 0:  # transaksi caller -> savepoint
+            cursor.execute("SAVE TRANSACTION isolate_batch")
+            try:
+                yield
+            except Exception:
+                cursor.execute("ROLLBACK TRANSACTION isolate_batch")
+                raise
+            return
+
+        cursor.execute("BEGIN TRANSACTION")
+        try:
+            yield
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    finally:
+        conn.autocommit = restore
+
+
+def _bisect_isolated(cursor, rows, apply):
+    """
+    Jalankan apply(lo, hi) untuk rows[lo:hi] di dalam _atomic. Range penuh dicoba dulu; kalau gagal
+    dibelah dua secara rekursif, jadi k baris buruk dari n ditemukan dalam O(k log n) round trip
+    dan semua baris yang bagus tetap masuk per batch, bukan per baris.
+    Return (results, rejected): results = return apply per range yang sukses (urut lo),
+    rejected = list (index, row, error).
+    """
+    results, rejected = [], []
+    pending = [(0, len(rows))] if rows else []
+    while pending:
+        lo, hi = pending.pop()
+        try:
+            with _atomic(cursor):
+                results.append(apply(lo, hi))
+        except (_pyodbc_error(), sqlite3.Error) as e:  # error lain (bug/koneksi) bukan salah baris
+            if hi - lo == 1:
+                rejected.append((lo, rows[lo], str(e)))
+                continue
+            mid = (lo + hi) // 2
+            pending += [(mid, hi), (lo, mid)]  # kiri dulu, urutan insert tetap terjaga
+    return results, sorted(rejected, key=lambda r: r[0])
+
+
+def executemany_isolated(cursor, sql, rows):
+    """
+    executemany dengan isolasi kegagalan (lihat _bisect_isolated).
+    Return (affected, rejected) dengan rejected = list (index, row, error).
+    """
+    def apply(lo, hi):
+        cursor.executemany(sql, rows[lo:hi])
+        return cursor.rowcount if cursor.rowcount is not None and cursor.rowcount >= 0 else hi - lo
+
+    results, rejected = _bisect_isolated(cursor, rows, apply)
+    if rejected:
+        logger.warning(f"Batch isolation: {len(rejected)} of {len(rows)} row(s) rejected")
+    return sum(results), rejected
+
+
+def log_rejected_rows(cursor, target, columns, rejected, source):
+    """
+    Catat baris yang ditolak SQL: 1 issue REJECTED_ROW per baris di DataQualityIssues,
+    plus dead-letter Parquet di blob yang bisa di-replay (lihat blob_handler.read_dead_letter).
+    Return nama blob dead-letter (None kalau gagal ditulis).
+    """
+    if not rejected:
+        return None
+    log_data_quality_issues(cursor, [
+        {"source": source, "issue_type": "REJECTED_ROW",
+         "issue_detail": f"{target}: {error} | Data={dict(zip(columns, row))}"}
+        for _, row, error in rejected
+    ])
+    try:
+        from utils.blob_handler import connect_blob, save_dead_letter
+        return save_dead_letter(connect_blob(), target, columns, rejected, source)
+    except Exception as e:
+        logger.error(f"Dead-letter write failed for {target} ({len(rejected)} rows): {e}", exc_info=True)
+        return None
 
 
 # --- Insert Incremental Data (CryptoPrice) ---
-def insert_incremental(cursor, df, crypto):
-    """Insert incremental data ke CryptoPrice"""
-    if df.empty:
+PRICE_COLUMNS = ["date", "hourx", "crypto", "Open", "High", "Low", "Close", "Volume"]
+PRICE_KEYS = ["date", "hourx", "crypto"]
+PRICE_VALUES = ["Open", "High", "Low", "Close", "Volume"]
+
+
+def _price_rows(df):
+    """Ubah DataFrame curated jadi list tuple (date,hourx,crypto,OHLCV)"""
+    return encode_rows(df, CRYPTO_PRICE_SCHEMA)
+
+
+def _load_price_stage(cursor, rows):
+    """Buat staging table per-session (struktur ikut CryptoPrice) lalu isi sekali jalan"""
+    cols = ",".join(f"[{c}]" for c in PRICE_COLUMNS)
+    if _is_sqlite(cursor):
+        stage = "temp.CryptoPrice_stage"
+        cursor.execute(f"DROP TABLE IF EXISTS {stage}")
+        cursor.execute(f"CREATE TEMP TABLE CryptoPrice_stage AS SELECT {cols} FROM CryptoPrice WHERE 0")
+    else:
+        stage = "#CryptoPrice_stage"
+        cursor.execute(f"IF OBJECT_ID('tempdb..{stage}') IS NOT NULL DROP TABLE {stage}")
+        cursor.execute(f"SELECT TOP 0 {cols} INTO {stage} FROM CryptoPrice")
+        cursor.fast_executemany = True
+
+    _, rejected = executemany_isolated(
+        cursor, f"INSERT INTO {stage} ({cols}) VALUES ({','.join('?' * len(PRICE_COLUMNS))})", rows
+    )
+    return stage, rejected
+
+
+def _merge_price_stage(cursor, stage):
+    """MERGE set-based dari staging ke CryptoPrice, return (inserted, updated)"""
+    on = " AND ".join(f"t.[{k}] = s.[{k}]" for k in PRICE_KEYS)
+    set_clause = ", ".join(f"[{c}] = s.[{c}]" for c in PRICE_VALUES)
+    cols = ",".join(f"[{c}]" for c in PRICE_COLUMNS)
+
+    if _is_sqlite(cursor):
+        # SQLite tidak punya MERGE: UPDATE ... FROM untuk bar yang berubah, lalu anti-join insert
+        changed = " OR ".join(f"t.[{c}] IS NOT s.[{c}]" for c in PRICE_VALUES)
+        cursor.execute(f"""
+            UPDATE CryptoPrice AS t SET {set_clause}
+            FROM {stage} AS s
+            WHERE {on} AND ({changed})
+        """)
+        updated = max(cursor.rowcount, 0)
+        cursor.execute(f"""
+            INSERT INTO CryptoPrice ({cols})
+            SELECT {cols} FROM {stage} AS s
+            WHERE NOT EXISTS (SELECT 1 FROM CryptoPrice AS t WHERE {on})
+        """)
+        inserted = max(cursor.rowcount, 0)
+        cursor.execute(f"DROP TABLE IF EXISTS {stage}")
+        return inserted, updated
+
+    # EXISTS(... EXCEPT ...) = perbandingan null-safe, bar yang sama persis tidak di-update
+    src_vals = ", ".join(f"s.[{c}]" for c in PRICE_VALUES)
+    tgt_vals = ", ".join(f"t.[{c}]" for c in PRICE_VALUES)
+    cursor.execute(f"""
+        MERGE CryptoPrice WITH (HOLDLOCK) AS t
+        USING {stage} AS s
+        ON {on}
+        WHEN MATCHED AND EXISTS (SELECT {src_vals} EXCEPT SELECT {tgt_vals}) THEN
+            UPDATE SET {set_clause}
+        WHEN NOT MATCHED BY TARGET THEN
+            INSERT ({cols}) VALUES ({", ".join(f"s.[{c}]" for c in PRICE_COLUMNS)})
+        OUTPUT $action;
+    """)
+    actions = [r[0] for r in cursor.fetchall()]
+    cursor.execute(f"DROP TABLE {stage}")
+    return actions.count("INSERT"), actions.count("UPDATE")
+
+
+def _drop_duplicate_keys(data):
+    """drop_duplicates(PRICE_KEYS, keep="last") untuk DataFrame maupun pyarrow.Table"""
+    if not hasattr(data, "column_names"):
+        return data.drop_duplicates(subset=PRICE_KEYS, keep="last")
+    import pyarrow as pa
+
+    dup = data.select(PRICE_KEYS).to_pandas().duplicated(keep="last").to_numpy()
+    return data.filter(pa.array(~dup)) if dup.any() else data
+
+
+def upsert_prices(cursor, df):
+    """Bulk upsert CryptoPrice lewat staging table + satu MERGE, key (date, hourx, crypto); baris yang ditolak di rejected"""
+    if len(df) == 0:
+        return {"inserted": 0, "updated": 0, "rejected": []}
+
+    # baris dobel dalam 1 batch bikin MERGE gagal, ambil yang terakhir
+    df = _drop_duplicate_keys(df)
+    rows = _price_rows(df)
+
+    # staging (SELECT TOP 0 INTO) tidak membawa constraint CryptoPrice, jadi baris yang lolos
+    # staging masih bisa menggagalkan MERGE: load + MERGE dibelah dua bersama sampai barisnya ketemu
+    def apply(lo, hi):
+        stage, stage_rejected = _load_price_stage(cursor, rows[lo:hi])
+        inserted, updated = _merge_price_stage(cursor, stage)
+        return inserted, updated, [(lo + i, row, e) for i, row, e in stage_rejected]
+
+    results, rejected = _bisect_isolated(cursor, rows, apply)
+    rejected = sorted(rejected + [r for _, _, stage_rejected in results for r in stage_rejected], key=lambda r: r[0])
+    return {
+        "inserted": sum(r[0] for r in results), "updated": sum(r[1] for r in results), "rejected": rejected,
+    }
+
+
+def _drop_positions(data, positions):
+    """Buang baris di posisi tertentu (DataFrame atau pyarrow.Table)"""
+    if not positions:
+        return data
+    keep = [i for i in range(len(data)) if i not in positions]
+    return data.take(keep) if hasattr(data, "column_names") else data.iloc[keep]
+
+
+def _update_rollups(cursor, df, crypto, changed):
+    """Merge rollup 4h/1d bucket yang tersentuh batch ini + yang tertunda (lihat rollups.maintain_rollups)"""
+    from utils import rollups
+    if rollups.ROLLUPS_ENABLED and len(df):
+        rollups.maintain_rollups(cursor, df, crypto, changed)
+
+
+def insert_incremental(cursor, df, crypto, mode="merge"):
+    """
+    Insert incremental data ke CryptoPrice.
+
+    mode="merge"  : staging table + MERGE set-based (insert bar baru, update bar yang berubah)
+    mode="insert" : INSERT ... WHERE NOT EXISTS per baris (cara lama, insert-only)
+    df boleh pyarrow.Table (curate_arrow): parameter SQL di-encode langsung dari kolom Arrow.
+    Baris yang ditolak SQL dicari lewat bisection, dicatat ke DataQualityIssues + dead-letter.
+    Setelah insert, rollup 4h/1d bucket yang tersentuh ikut di-merge (ROLLUPS_ENABLED); rollup yang
+    gagal tidak menggagalkan insert, bucket-nya dihitung ulang di panggilan berikutnya.
+    """
+    if len(df) == 0:
         return 0
 
-    rows = [
-        (
-            row['date'],
-            int(row['hourx']) if pd.notna(row['hourx']) else None,
-            str(row['crypto']),
-            float(row['Open']) if pd.notna(row['Open']) else None,
-            float(row['High']) if pd.notna(row['High']) else None,
-            float(row['Low']) if pd.notna(row['Low']) else None,
-            float(row['Close']) if pd.notna(row['Close']) else None,
-            int(row['Volume']) if pd.notna(row['Volume']) else None,
-            row['date'], int(row['hourx']) if pd.notna(row['hourx']) else None, str(row['crypto'])
-        )
-        for _, row in df.iterrows()
-    ]
+    # rollup hanya dari baris yang benar-benar masuk CryptoPrice (posisi rejected = posisi di df)
+    if mode == "merge":
+        df = _drop_duplicate_keys(df)
+        counts = upsert_prices(cursor, df)
+        logger.info(f"{crypto}: {counts['inserted']} new rows inserted, {counts['updated']} rows updated (merge).")
+        log_rejected_rows(cursor, "CryptoPrice", PRICE_COLUMNS, counts["rejected"], crypto)
+        df = _drop_positions(df, {i for i, _, _ in counts["rejected"]})
+        _update_rollups(cursor, df, crypto, changed=bool(counts["inserted"] + counts["updated"]))
+        return counts["inserted"] + counts["updated"]
+
+    rows = [r + r[:3] for r in _price_rows(df)]
 
     sql = """
         INSERT INTO CryptoPrice (date,hourx,crypto,[Open],[High],[Low],[Close],[Volume])
@@ -75,24 +680,13 @@ def insert_incremental(cursor, df, crypto):
         )
     """
 
-    inserted_count = 0
-    batch_size = 200 if len(rows) < 2000 else 500
-
-    try:
+    if not _is_sqlite(cursor):
         cursor.fast_executemany = True
-        cursor.executemany(sql, rows)
-        inserted_count = cursor.rowcount if cursor.rowcount != -1 else len(rows)
-    except Exception as batch_err:
-        logger.error(f"Batch insert failed for {crypto}: {batch_err}")
-        logger.info("Fallback ke row-by-row insert...")
-        for r in rows:
-            try:
-                cursor.execute(sql, r)
-                inserted_count += cursor.rowcount
-            except Exception as row_err:
-                logger.error(f"Failed row insert for {crypto}: {row_err} | Data={r}")
+    inserted_count, rejected = executemany_isolated(cursor, sql, rows)
+    log_rejected_rows(cursor, "CryptoPrice", PRICE_COLUMNS, [(i, r[:8], e) for i, r, e in rejected], crypto)
 
-    logger.info(f"{crypto}: {inserted_count} new rows inserted (batch={batch_size}).")
+    logger.info(f"{crypto}: {inserted_count} new rows inserted, {len(rejected)} rejected.")
+    _update_rollups(cursor, _drop_positions(df, {i for i, _, _ in rejected}), crypto, changed=bool(inserted_count))
     return inserted_count
 
 
@@ -105,39 +699,384 @@ def log_ingestion(cursor, source, status, message="", rows_inserted=0, started_a
     cursor.execute("""
         INSERT INTO IngestionLog (source, status, message, rows_inserted, started_at, finished_at)
         VALUES (?, ?, ?, ?, ?, ?)
-    """, source, status, message, rows_inserted, started_at, finished_at)
+    """, (source, status, message, rows_inserted, started_at, finished_at))
 
 
-# --- Logging Data Quality Issues ---
-def log_data_quality_issue(cursor, source, issue_type, issue_detail):
+# --- Run Metrics (instrumentation per run, disimpan di samping IngestionLog) ---
+_RUN_METRICS_TABLE = """
+    run_id VARCHAR(64) PRIMARY KEY, entity VARCHAR(50), started_at DATETIME, finished_at DATETIME,
+    duration_s FLOAT, record {text}
+"""
+RUN_METRICS_DDL = f"""
+IF OBJECT_ID('IngestionRunMetrics', 'U') IS NULL
+    CREATE TABLE IngestionRunMetrics ({_RUN_METRICS_TABLE.format(text="NVARCHAR(MAX)")});
+"""
+_RUN_METRICS_READY = False
+
+
+def ensure_run_metrics_table(cursor):
+    """Buat IngestionRunMetrics kalau belum ada (idempotent, cukup 1x per worker process)"""
+    global _RUN_METRICS_READY
+    if _RUN_METRICS_READY:
+        return
+    if _is_sqlite(cursor):
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS IngestionRunMetrics ({_RUN_METRICS_TABLE.format(text='TEXT')})")
+    else:
+        cursor.execute(RUN_METRICS_DDL)
+    _RUN_METRICS_READY = True
+
+
+def log_run_record(cursor, record):
+    """Simpan run record dari RunRecorder ke IngestionRunMetrics (stage metrics sebagai JSON)"""
+    ensure_run_metrics_table(cursor)
     cursor.execute("""
+        INSERT INTO IngestionRunMetrics (run_id, entity, started_at, finished_at, duration_s, record)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (
+        record["run_id"], record["entity"],
+        _as_datetime(record["started_at"]), _as_datetime(record["finished_at"]),
+        record["duration_s"], json.dumps(record, default=str),
+    ))
+
+
+def save_run_record(record, connection=None):
+    """
+    Best-effort log_run_record: metrics run tidak boleh menggagalkan run (summary, hasil ingest).
+    connection = callable context manager koneksi (default pooled_connection), return True kalau tersimpan.
+    """
+    try:
+        with (connection or pooled_connection)() as conn:
+            log_run_record(conn.cursor(), record)
+            conn.commit()
+        return True
+    except Exception as e:
+        logger.warning(f"Run metrics not saved ({record['entity']} {record['run_id']}): {e}")
+        return False
+
+
+# --- Logging Data Quality Issues ---
+def log_data_quality_issues(cursor, issues):
+    """Tulis banyak issue (DataFrame/list dict source, issue_type, issue_detail) dalam 1 batch"""
+    if len(issues) == 0:
+        return 0
+
+    records = issues.to_dict("records") if hasattr(issues, "to_dict") else list(issues)
+    detected_at = datetime.datetime.utcnow()
+    rows = [
+        (r["source"], r["issue_type"], str(r["issue_detail"])[:4000], r.get("detected_at") or detected_at)
+        for r in records
+    ]
+
+    if not _is_sqlite(cursor):
+        cursor.fast_executemany = True
+    cursor.executemany("""
         INSERT INTO DataQualityIssues (source, issue_type, issue_detail, detected_at)
-        VALUES (?, ?, ?, GETDATE())
-    """, source, issue_type, issue_detail)
+        VALUES (?, ?, ?, ?)
+    """, rows)
+    return len(rows)
+
+
+def log_data_quality_issue(cursor, source, issue_type, issue_detail):
+    log_data_quality_issues(cursor, [{"source": source, "issue_type": issue_type, "issue_detail": issue_detail}])
+
+
+# --- Telemetry Sink (IngestionLog / DataQualityIssues / watermark di-buffer, flush per batch) ---
+TELEMETRY_FLUSH_SIZE = int(os.getenv("TELEMETRY_FLUSH_SIZE", "500"))
+TELEMETRY_FLUSH_SECONDS = float(os.getenv("TELEMETRY_FLUSH_SECONDS", "30"))
+TELEMETRY_SPOOL_DIR = os.getenv("TELEMETRY_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "etl_telemetry_spool"))
+
+
+class TelemetrySink:
+    """
+    Buffer record IngestionLog, DataQualityIssues dan watermark IngestionMetadata selama 1 run,
+    lalu tulis semuanya dalam 1 transaksi (flush). Thread background flush lebih awal kalau buffer
+    sudah >= flush_size record atau record tertua sudah >= flush_seconds; close() flush sisanya.
+
+    Kalau database tidak bisa dipakai, batch disimpan ke spool lokal (JSON) dan di-replay di flush
+    berikutnya, jadi logging tidak pernah memperlambat atau menggagalkan ingest.
+    connection = callable yang mengembalikan context manager koneksi (default pooled_connection).
+    """
+
+    def __init__(self, connection=None, flush_size=TELEMETRY_FLUSH_SIZE, flush_seconds=TELEMETRY_FLUSH_SECONDS,
+                 spool_dir=TELEMETRY_SPOOL_DIR):
+        self.connection = connection or pooled_connection
+        self.flush_size = flush_size
+        self.flush_seconds = flush_seconds
+        self.spool_dir = spool_dir
+        self._logs, self._issues, self._watermarks = [], [], {}
+        self._oldest = None
+        self._closed = False
+        self._thread = None
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._stats = {"records": 0, "flushes": 0, "written": 0, "spooled": 0, "replayed": 0, "flush_seconds": 0.0}
+
+    # --- API (sama dengan fungsi module-level, tanpa cursor) ---
+    def log_ingestion(self, source, status, message="", rows_inserted=0, started_at=None, finished_at=None):
+        now = datetime.datetime.utcnow()
+        self._add(lambda: self._logs.append(
+            (source, status, message, rows_inserted, started_at or now, finished_at or now)
+        ))
+
+    def log_data_quality_issues(self, issues):
+        if len(issues) == 0:
+            return 0
+        records = issues.to_dict("records") if hasattr(issues, "to_dict") else list(issues)
+        detected_at = datetime.datetime.utcnow()
+        records = [{**r, "detected_at": r.get("detected_at") or detected_at} for r in records]
+        self._add(lambda: self._issues.extend(records), len(records))
+        return len(records)
+
+    def log_data_quality_issue(self, source, issue_type, issue_detail):
+        self.log_data_quality_issues([{"source": source, "issue_type": issue_type, "issue_detail": issue_detail}])
+
+    def update_last_success_bulk(self, watermarks):
+        self._add(lambda: self._watermarks.update(watermarks), len(watermarks))
+
+    def update_last_success(self, source, new_ts):
+        self.update_last_success_bulk({source: new_ts})
+
+    # --- Buffer & flush ---
+    def _pending(self):
+        return len(self._logs) + len(self._issues) + len(self._watermarks)
+
+    def _due(self):
+        if self._pending() >= self.flush_size:
+            return True
+        return self._oldest is not None and time.monotonic() - self._oldest >= self.flush_seconds
+
+    def _add(self, append, count=1):
+        with self._cond:
+            append()
+            self._stats["records"] += count
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+                self._cond.notify()  # flusher menghitung ulang batas waktunya
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._run, name="telemetry-flush", daemon=True)
+                self._thread.start()
+            if self._pending() >= self.flush_size:
+                self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed and not self._due():
+                    wait = None if self._oldest is None else self.flush_seconds - (time.monotonic() - self._oldest)
+                    self._cond.wait(None if wait is None else max(wait, 0.01))
+                if self._closed:
+                    return
+            self.flush()
+
+    def flush(self):
+        """Tulis buffer (plus batch di spool) dalam 1 transaksi, return jumlah record yang tertulis"""
+        with self._flush_lock:
+            with self._cond:
+                batch = {"logs": self._logs, "issues": self._issues, "watermarks": self._watermarks}
+                self._logs, self._issues, self._watermarks, self._oldest = [], [], {}, None
+            claimed, spooled = self._claim_spool()
+            for old in spooled:  # batch lama dulu; per source watermark yang paling baru yang dipakai
+                watermarks = dict(old["watermarks"])
+                for source, ts in batch["watermarks"].items():
+                    if source not in watermarks or ts > watermarks[source]:
+                        watermarks[source] = ts
+                batch = {
+                    "logs": old["logs"] + batch["logs"], "issues": old["issues"] + batch["issues"],
+                    "watermarks": watermarks,
+                }
+            count = len(batch["logs"]) + len(batch["issues"]) + len(batch["watermarks"])
+            if not count:
+                return 0
+
+            t0 = time.monotonic()
+            try:
+                with self.connection() as conn:
+                    cursor = conn.cursor()
+                    with _atomic(cursor):
+                        self._write(cursor, batch)
+                    conn.commit()
+            except Exception as e:
+                written = 0
+                try:
+                    self._spool(batch)
+                    logger.warning(f"Telemetry flush failed, {count} record(s) spooled to {self.spool_dir}: {e}")
+                except OSError as spool_error:
+                    # spool juga gagal: file lama dikembalikan, buffer run ini hilang (ingest tetap jalan)
+                    logger.error(f"Telemetry flush and spool failed, {count} record(s) dropped: {e} / {spool_error}")
+                    for mine, original in claimed:
+                        os.replace(mine, original)
+                    claimed = []
+            else:
+                written = count
+                self._stats["replayed"] += sum(
+                    len(b["logs"]) + len(b["issues"]) + len(b["watermarks"]) for b in spooled
+                )
+            for mine, _ in claimed:  # isinya sudah tertulis ke DB atau ke file spool baru
+                os.remove(mine)
+
+            with self._cond:
+                self._stats["flushes"] += 1
+                self._stats["written"] += written
+                self._stats["spooled"] += count - written
+                self._stats["flush_seconds"] += time.monotonic() - t0
+            return written
+
+    @staticmethod
+    def _write(cursor, batch):
+        if batch["logs"]:
+            if not _is_sqlite(cursor):
+                cursor.fast_executemany = True
+            cursor.executemany("""
+                INSERT INTO IngestionLog (source, status, message, rows_inserted, started_at, finished_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, batch["logs"])
+        log_data_quality_issues(cursor, batch["issues"])
+        if batch["watermarks"]:
+            update_last_success_bulk(cursor, batch["watermarks"], monotonic=True)
+
+    # --- Spool lokal (JSON per batch yang gagal ditulis) ---
+    def _spool(self, batch):
+        os.makedirs(self.spool_dir, exist_ok=True)
+        path = os.path.join(self.spool_dir, f"telemetry-{time.time_ns()}-{os.getpid()}.json")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(batch, f, default=str)
+        os.replace(path + ".tmp", path)  # atomic, file spool tidak pernah setengah tertulis
+
+    def _claim_spool(self):
+        """Ambil alih file spool (rename dulu supaya sink lain tidak me-replay file yang sama)"""
+        if not os.path.isdir(self.spool_dir):
+            return [], []
+        claimed, batches = [], []
+        for name in sorted(os.listdir(self.spool_dir)):
+            if not (name.startswith("telemetry-") and name.endswith(".json")):
+                continue
+            path = os.path.join(self.spool_dir, name)
+            mine = f"{path}.claimed-{os.getpid()}-{threading.get_ident()}"
+            try:
+                os.replace(path, mine)
+                with open(mine, encoding="utf-8") as f:
+                    raw = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Telemetry spool {name} skipped: {e}")
+                continue
+            claimed.append((mine, path))
+            batches.append({
+                "logs": [tuple(r[:4]) + (_as_datetime(r[4]), _as_datetime(r[5])) for r in raw["logs"]],
+                "issues": [{**r, "detected_at": _as_datetime(r["detected_at"])} for r in raw["issues"]],
+                "watermarks": {k: _as_datetime(v) for k, v in raw["watermarks"].items()},
+            })
+        return claimed, batches
+
+    def close(self):
+        """Hentikan flusher lalu flush sisa buffer (dipanggil di akhir run)"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+        return self.flush()
+
+    def metrics(self):
+        with self._cond:
+            stats = dict(self._stats, pending=self._pending())
+        stats["flush_seconds"] = round(stats["flush_seconds"], 4)
+        return stats
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# --- Seen-URL Cache (bertahan selama worker Functions masih warm) ---
+class _SeenUrlCache:
+    """LRU terbatas berisi hash URL yang sudah pasti ada di CryptoNews"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return True
+            return False
+
+    def add(self, key):
+        with self._lock:
+            self._items[key] = None
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def __len__(self):
+        return len(self._items)
+
+
+NEWS_SEEN_CACHE_SIZE = int(os.getenv("NEWS_SEEN_CACHE_SIZE", "50000"))
+_SEEN_URLS = _SeenUrlCache(NEWS_SEEN_CACHE_SIZE)
+
+# SQL Server maksimal 2100 parameter per statement
+_IN_CHUNK = 1000
+
+
+def _url_hash(url):
+    return hashlib.sha1(str(url).encode("utf-8")).digest()
+
+
+def _existing_urls(cursor, urls):
+    """Cek sekumpulan URL ke CryptoNews dengan query IN per chunk, return set URL yang sudah ada"""
+    found = set()
+    for i in range(0, len(urls), _IN_CHUNK):
+        chunk = urls[i:i + _IN_CHUNK]
+        cursor.execute(
+            f"SELECT url FROM CryptoNews WHERE url IN ({','.join('?' * len(chunk))})", chunk
+        )
+        found.update(r[0] for r in cursor.fetchall())
+    return found
 
 
 # --- Insert News Data ---
-def insert_news(df: pd.DataFrame):
-    """Insert berita ke CryptoNews dengan dedup berdasarkan URL"""
-    inserted = 0
+def insert_news(articles):
+    """
+    Insert berita ke CryptoNews dengan dedup berdasarkan URL (cache warm + 1 query set-based).
+    articles = list of dict (title/description/content/publishedAt/source/url), DataFrame juga diterima.
+    """
+    if hasattr(articles, "to_dict"):
+        articles = articles.to_dict("records")
+    unique = {}
+    for a in articles:
+        unique.setdefault(a["url"], a)  # url duplikat: ambil yang pertama
+    candidates = [a for a in unique.values() if _url_hash(a["url"]) not in _SEEN_URLS]
+    if not candidates:
+        logger.info("Inserted 0 new news articles (all URLs cached)")
+        return 0
+
     with sql_cursor() as cursor:
-        for _, row in df.iterrows():
-            coin = detect_coin(f"{row['title']} {row['content']}")
-            published_at = pd.to_datetime(row["publishedAt"])
-            news_date = published_at.date()
-
-            cursor.execute("SELECT COUNT(*) FROM CryptoNews WHERE url = ?", row["url"])
-            exists = cursor.fetchone()[0]
-
-            if exists == 0:
-                cursor.execute("""
-                    INSERT INTO CryptoNews (coin, title, description, content, publishedAt, news_date, source, url)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    coin, row["title"], row["description"], row["content"],
-                    published_at, news_date, row["source"], row["url"]
-                ))
-                inserted += 1
-
-    logger.info(f"Inserted {inserted} new news articles")
+        existing = _existing_urls(cursor, [a["url"] for a in candidates])
+        for url in existing:
+            _SEEN_URLS.add(_url_hash(url))
+
+        fresh = [
+            {**a, "coin": detect_coin(f"{a['title']} {a['content']}"), "news_date": a["publishedAt"]}
+            for a in candidates if a["url"] not in existing
+        ]
+        inserted = 0
+        if fresh:
+            if not _is_sqlite(cursor):
+                cursor.fast_executemany = True
+            inserted, rejected = executemany_isolated(cursor, """
+                INSERT INTO CryptoNews (coin, title, description, content, publishedAt, news_date, source, url)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, encode_rows(fresh, CRYPTO_NEWS_SCHEMA))
+            log_rejected_rows(cursor, "CryptoNews", list(CRYPTO_NEWS_SCHEMA), rejected, "NewsAPI")
+            bad = {i for i, _, _ in rejected}
+            for i, a in enumerate(fresh):
+                if i not in bad:  # URL yang ditolak boleh dicoba lagi di run berikutnya
+                    _SEEN_URLS.add(_url_hash(a["url"]))
+
+    logger.info(f"Inserted {inserted} new news articles (skipped {len(existing)} existing)")
     return inserted
@@ -0,0 +1,272 @@
+"""
+Read-side API untuk history OHLCV: load_history(symbols, start, end, interval).
+
+Bar 1h di-cache lokal per (symbol, tanggal) sebagai file Arrow IPC tanpa kompresi, dibaca lewat
+memory map (zero-copy). Tanggal = index range waktu: hanya tanggal yang belum ada di cache yang
+diambil dari blob (zona incremental/, sesuai manifest) atau SQL (CryptoPrice). Tanggal yang masih
+bisa berubah (HISTORY_CACHE_SETTLE_DAYS terakhir) dan tanggal tanpa data selalu diambil ulang
+dan tidak di-cache.
+Ukuran cache dibatasi HISTORY_CACHE_MAX_BYTES, file yang paling lama tidak dipakai dibuang dulu.
+"""
+import datetime, io, math, os, tempfile, threading
+from concurrent.futures import ThreadPoolExecutor
+from utils import config
+from utils.logger import logger
+
+HISTORY_CACHE_DIR = os.getenv("HISTORY_CACHE_DIR", os.path.join(tempfile.gettempdir(), "ohlcv_history_cache"))
+HISTORY_CACHE_MAX_BYTES = int(os.getenv("HISTORY_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+HISTORY_CACHE_SETTLE_DAYS = int(os.getenv("HISTORY_CACHE_SETTLE_DAYS", "2"))
+HISTORY_SOURCE = os.getenv("HISTORY_SOURCE", "blob")  # "blob" | "sql"
+HISTORY_FETCH_WORKERS = int(os.getenv("HISTORY_FETCH_WORKERS", "4"))
+
+_lock = threading.Lock()
+_stats = {"cached_days": 0, "fetched_days": 0, "fetched_rows": 0, "evicted_files": 0, "evicted_bytes": 0}
+
+
+def _as_datetime(value):
+    if isinstance(value, datetime.datetime):
+        return value
+    if isinstance(value, datetime.date):
+        return datetime.datetime.combine(value, datetime.time())
+    return datetime.datetime.fromisoformat(str(value))
+
+
+def _days(start, end):
+    """Tanggal yang beririsan dengan [start, end)"""
+    day, last = start.date(), (end - datetime.timedelta(microseconds=1)).date()
+    while day <= last:
+        yield day
+        day += datetime.timedelta(days=1)
+
+
+# --- Cache lokal (1 file Arrow IPC per symbol per tanggal) ---
+def _cache_path(cache_dir, symbol, day):
+    return os.path.join(cache_dir, "1h", symbol, f"{day.isoformat()}.arrow")
+
+
+def _read_cached(path):
+    """Memory-map file cache (buffer kolom langsung dari page cache OS), None kalau belum ada"""
+    import pyarrow as pa
+
+    try:
+        table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+    except (FileNotFoundError, pa.ArrowInvalid):
+        return None
+    os.utime(path)  # mtime = waktu terakhir dipakai, dasar eviction LRU
+    return table
+
+
+def _write_cached(path, table):
+    import pyarrow as pa
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp, path)  # atomic, reader lain tidak pernah melihat file setengah jadi
+
+
+def evict(cache_dir=None, max_bytes=None, keep=()):
+    """Hapus file cache paling lama tidak dipakai sampai total ukuran <= max_bytes, return byte yang dibuang"""
+    cache_dir = cache_dir or HISTORY_CACHE_DIR
+    max_bytes = HISTORY_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    files = []
+    for root, _, names in os.walk(cache_dir):
+        for name in names:
+            if name.endswith(".arrow"):
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+
+    total = sum(size for _, size, _ in files)
+    freed = 0
+    for _, size, path in sorted(files):
+        if total - freed <= max_bytes:
+            break
+        if path in keep:
+            continue
+        try:
+            os.remove(path)  # mmap yang masih terbuka tetap valid sampai ditutup (Linux)
+        except FileNotFoundError:
+            continue
+        freed += size
+        with _lock:
+            _stats["evicted_files"] += 1
+            _stats["evicted_bytes"] += size
+    return freed
+
+
+# --- Fetch range yang belum ada di cache ---
+def _normalize(table):
+    """Table dari blob/SQL -> skema curated, dedup (bar terakhir menang), urut per jam"""
+    from utils.data_fetcher import curated_schema
+    from utils.db_handler import _drop_duplicate_keys
+
+    schema = curated_schema()
+    table = table.select(schema.names).cast(schema)
+    return _drop_duplicate_keys(table).sort_by("hourx")
+
+
+def _split_days(table, days):
+    """{tanggal: potongan table} untuk semua tanggal di days (tanggal tanpa data -> table kosong)"""
+    import pyarrow.compute as pc
+
+    dates = table.column("date")
+    return {day: _normalize(table.filter(pc.equal(dates, day))) for day in days}
+
+
+def _fetch_blob(symbol, days, container_client=None, folder="incremental"):
+    """Baca partisi incremental/ per tanggal sesuai manifest (file sisa compaction diabaikan)"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from utils.blob_handler import connect_blob, partition_prefix, read_manifest
+    from utils.data_fetcher import curated_schema
+
+    container_client = container_client or connect_blob().get_container_client(config.BLOB_CONTAINER)
+    out = {}
+    for day in days:
+        prefix = partition_prefix(folder, symbol, day)
+        files = [f for f in read_manifest(container_client, prefix)["files"] if f.endswith(".parquet")]
+        tables = [
+            pq.read_table(io.BytesIO(container_client.download_blob(f).readall())).select(curated_schema().names)
+            for f in files
+        ]
+        # urutan manifest = urutan tulis, jadi concat + keep last = bar terbaru
+        table = pa.concat_tables([t.cast(curated_schema()) for t in tables]) if tables else curated_schema().empty_table()
+        out[day] = _normalize(table)
+    return out
+
+
+def _fetch_sql(symbol, days):
+    """1 query range tanggal ke CryptoPrice untuk semua tanggal yang hilang, dipecah per tanggal"""
+    import pyarrow as pa
+    from utils.db_handler import sql_cursor, PRICE_COLUMNS
+
+    with sql_cursor() as cursor:
+        cursor.execute(
+            f"SELECT {', '.join(f'[{c}]' for c in PRICE_COLUMNS)} FROM CryptoPrice "
+            "WHERE crypto = ? AND date >= ? AND date <= ?",
+            (symbol, min(days), max(days)),
+        )
+        rows = cursor.fetchall()
+    if not rows:
+        from utils.data_fetcher import curated_schema
+        return _split_days(curated_schema().empty_table(), days)
+    columns = dict(zip(PRICE_COLUMNS, zip(*rows)))
+    table = pa.table({
+        # sqlite3 mengembalikan DATE sebagai string ISO, pyodbc sebagai datetime.date
+        "date": pa.array([str(v)[:10] for v in columns["date"]]).cast(pa.date32()),
+        **{c: pa.array(columns[c]) for c in PRICE_COLUMNS[1:]},
+    })
+    return _split_days(table, days)
+
+
+def _load_symbol(symbol, start, end, source, cache_dir, container_client):
+    """Table 1h 1 symbol untuk [start, end): cache dulu, tanggal yang hilang di-fetch sekali jalan"""
+    import pyarrow as pa
+
+    settled = datetime.date.today() - datetime.timedelta(days=HISTORY_CACHE_SETTLE_DAYS)
+    days = list(_days(start, end))
+    tables, missing, paths = {}, [], []
+    for day in days:
+        path = _cache_path(cache_dir, symbol, day)
+        table = _read_cached(path) if day < settled else None
+        if table is None:
+            missing.append(day)
+        else:
+            tables[day] = table
+            paths.append(path)
+
+    if missing:
+        fetched = _fetch_sql(symbol, missing) if source == "sql" else _fetch_blob(symbol, missing, container_client)
+        for day, table in fetched.items():
+            # hanya tanggal yang sudah final yang di-cache; tanggal kosong tidak (backfill/compaction
+            # yang telat masih bisa mengisinya, kosong di cache = kosong selamanya)
+            if day < settled and table.num_rows:
+                path = _cache_path(cache_dir, symbol, day)
+                _write_cached(path, table)
+                table = _read_cached(path)
+                paths.append(path)
+            tables[day] = table
+        with _lock:
+            _stats["fetched_days"] += len(missing)
+            _stats["fetched_rows"] += sum(t.num_rows for t in fetched.values())
+    with _lock:
+        _stats["cached_days"] += len(days) - len(missing)
+
+    # index waktu: hari tengah dipakai utuh, hari pertama/terakhir dipotong per jam (slice zero-copy)
+    last_day = days[-1]
+    parts = []
+    for day in days:
+        table = tables[day]
+        midnight = datetime.datetime.combine(day, datetime.time())
+        lo = math.ceil((start - midnight).total_seconds() / 3600) if day == start.date() else 0
+        hi = math.ceil((end - midnight).total_seconds() / 3600) if day == last_day else 24
+        if lo > 0 or hi < 24:
+            hours = table.column("hourx").to_numpy()
+            first, last = hours.searchsorted(lo), hours.searchsorted(hi)
+            table = table.slice(first, last - first)
+        parts.append(table)
+    return (pa.concat_tables(parts) if parts else None), paths
+
+
+def load_history(symbols, start, end, interval="1h", source=None, arrow=False, cache_dir=None, container_client=None):
+    """
+    History OHLCV [start, end) untuk symbols (jam lokal yang sama dengan CryptoPrice).
+
+    interval "1h" = bar mentah; "4h"/"1d" di-rollup dari bar 1h (lihat utils.rollups), start/end
+    dibulatkan ke batas bucket. source "blob" (default, zona incremental/) atau "sql" (CryptoPrice).
+    Return DataFrame crypto/ts/OHLCV (4h/1d: bucket_start + bars), atau pyarrow.Table curated
+    (date/hourx/crypto/OHLCV, buffer memory-mapped) kalau arrow=True dan interval "1h".
+    """
+    import pandas as pd
+    import pyarrow as pa
+
+    symbols = [symbols] if isinstance(symbols, str) else list(symbols)
+    source = source or HISTORY_SOURCE
+    cache_dir = cache_dir or HISTORY_CACHE_DIR
+    start, end = _as_datetime(start), _as_datetime(end)
+    if interval != "1h":
+        from utils.rollups import ROLLUP_INTERVALS
+        width = pd.Timedelta(hours=ROLLUP_INTERVALS[interval])
+        start, end = pd.Timestamp(start).floor(width).to_pydatetime(), pd.Timestamp(end).ceil(width).to_pydatetime()
+    if start >= end:
+        raise ValueError(f"Invalid range: start {start} >= end {end}")
+
+    with ThreadPoolExecutor(max_workers=max(1, min(HISTORY_FETCH_WORKERS, len(symbols)))) as executor:
+        loaded = list(executor.map(
+            lambda s: _load_symbol(s, start, end, source, cache_dir, container_client), symbols
+        ))
+    tables = [t for t, _ in loaded if t is not None]
+    table = pa.concat_tables(tables) if tables else None
+
+    freed = evict(cache_dir, keep={p for _, paths in loaded for p in paths})
+    if freed:
+        logger.info(f"History cache: evicted {freed / 1024 / 1024:.1f} MB")
+
+    if table is None:
+        from utils.data_fetcher import curated_schema
+        table = curated_schema().empty_table()
+    if arrow and interval == "1h":
+        return table
+
+    days = table.column("date").cast(pa.int32()).to_numpy().astype("int64")
+    ts = days * 86_400 + table.column("hourx").to_numpy().astype("int64") * 3_600
+    frame = pd.DataFrame({
+        "crypto": table.column("crypto").to_pandas().astype(str).to_numpy(),
+        "ts": ts.astype("datetime64[s]"),
+        **{c: table.column(c).to_numpy() for c in ["Open", "High", "Low", "Close", "Volume"]},
+    })
+    if interval == "1h":
+        return frame
+    from utils.rollups import aggregate
+    return aggregate(frame, interval)
+
+
+def history_stats():
+    """Counter cache sejak proses start: tanggal dari cache vs di-fetch, eviction"""
+    with _lock:
+        return dict(_stats)
@@ -0,0 +1,109 @@
+import datetime, json, threading, time, uuid
+from contextlib import contextmanager
+from utils.logger import logger
+
+_active = threading.local()
+
+
+def _percentile(sorted_values, pct):
+    """Percentile linear interpolation dari list yang sudah di-sort"""
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def add_count(name, value):
+    """Tambah counter (mis. rows/bytes) ke span yang sedang aktif di thread ini, no-op kalau tidak ada"""
+    stack = getattr(_active, "stack", None)
+    if stack:
+        span = stack[-1]
+        span[name] = span.get(name, 0) + value
+
+
+class RunRecorder:
+    """
+    Pencatat latency & throughput per stage untuk 1 run ETL.
+
+    span(stage, symbol) mengukur durasi + counter rows/bytes; tiap span selesai ditulis
+    sebagai 1 baris JSON ke logger, dan summary() memberi agregasi p50/p95 per stage.
+    """
+
+    def __init__(self, entity, run_id=None, emit_spans=True):
+        self.entity = entity
+        self.run_id = run_id or uuid.uuid4().hex
+        self.emit_spans = emit_spans
+        self.started_at = datetime.datetime.utcnow()
+        self.finished_at = None
+        self.spans = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, stage, symbol=None, **labels):
+        """Ukur 1 stage; caller bisa isi counter lewat span["rows"] / add_count()"""
+        span = {"stage": stage, "symbol": symbol, **labels}
+        stack = _active.__dict__.setdefault("stack", [])
+        stack.append(span)
+        t0 = time.perf_counter()
+        try:
+            yield span
+            span["status"] = "ok"
+        except BaseException as e:
+            span["status"] = "error"
+            span["error"] = type(e).__name__
+            raise
+        finally:
+            span["seconds"] = round(time.perf_counter() - t0, 6)
+            stack.pop()
+            with self._lock:
+                self.spans.append(span)
+            if self.emit_spans:
+                logger.info(json.dumps({"event": "span", "entity": self.entity, "run_id": self.run_id, **span}, default=str))
+
+    def summary(self):
+        """Agregasi per stage: count, total/p50/p95/max detik, rows, bytes, rows/s"""
+        with self._lock:
+            spans = list(self.spans)
+
+        stages = {}
+        for span in spans:
+            stages.setdefault(span["stage"], []).append(span)
+
+        result = {}
+        for stage, items in stages.items():
+            durations = sorted(s["seconds"] for s in items)
+            total = sum(durations)
+            rows = sum(s.get("rows", 0) or 0 for s in items)
+            result[stage] = {
+                "count": len(items),
+                "errors": sum(1 for s in items if s.get("status") == "error"),
+                "total_s": round(total, 4),
+                "p50_s": round(_percentile(durations, 50), 4),
+                "p95_s": round(_percentile(durations, 95), 4),
+                "max_s": round(durations[-1], 4),
+                "rows": rows,
+                "bytes": sum(s.get("bytes", 0) or 0 for s in items),
+                "rows_per_s": round(rows / total, 1) if total and rows else 0.0,
+            }
+        return result
+
+    def finish(self):
+        self.finished_at = datetime.datetime.utcnow()
+        return self.record()
+
+    def record(self):
+        """Run record machine-readable (dipersist ke IngestionRunMetrics)"""
+        finished = self.finished_at or datetime.datetime.utcnow()
+        return {
+            "run_id": self.run_id,
+            "entity": self.entity,
+            "started_at": self.started_at.isoformat(),
+            "finished_at": finished.isoformat(),
+            "duration_s": round((finished - self.started_at).total_seconds(), 3),
+            "stages": self.summary(),
+        }
+
+    def log_record(self):
+        """Tulis run record sebagai 1 baris JSON"""
+        logger.info(json.dumps({"event": "run", **self.record()}, default=str))
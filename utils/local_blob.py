@@ -0,0 +1,147 @@
+import hashlib, os, shutil, threading
+
+# block yang belum di-commit disimpan terpisah supaya tidak ikut list_blobs
+UNCOMMITTED_DIR = ".uncommitted"
+
+
+class _BlobProperties:
+    def __init__(self, name, size, etag=None):
+        self.name = name
+        self.size = size
+        self.etag = etag
+
+
+class ConditionNotMet(Exception):
+    """Upload bersyarat gagal: blob sudah ada / etag berubah (ResourceExistsError/ResourceModifiedError di Azure)"""
+
+
+def _etag(data):
+    return f'"{hashlib.md5(data).hexdigest()}"'
+
+
+class _Downloader:
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._data = f.read()  # dibaca sekali supaya isi dan etag konsisten
+        self.properties = _BlobProperties(os.path.basename(path), len(self._data), _etag(self._data))
+
+    def readall(self):
+        return self._data
+
+
+class LocalBlobClient:
+    """Blob tunggal di filesystem lokal (subset API azure.storage.blob.BlobClient)"""
+
+    def __init__(self, container, name):
+        self.container = container
+        self.blob_name = name
+        self._path = container._path(name)
+
+    def upload_blob(self, data, overwrite=True, etag=None, match_condition=None):
+        self.container.upload_blob(self.blob_name, data, overwrite=overwrite, etag=etag, match_condition=match_condition)
+
+    def download_blob(self):
+        return self.container.download_blob(self.blob_name)
+
+    def delete_blob(self):
+        self.container.delete_blob(self.blob_name)
+
+    def exists(self):
+        return os.path.exists(self._path)
+
+    def _block_path(self, block_id):
+        safe_id = block_id.replace("/", "_").replace("+", "-")
+        return os.path.join(self.container.root, UNCOMMITTED_DIR, *self.blob_name.split("/"), safe_id)
+
+    def stage_block(self, block_id, data, **kwargs):
+        path = self._block_path(block_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+
+    def commit_block_list(self, block_list, **kwargs):
+        """Gabung block yang sudah di-stage sesuai urutan block_list jadi 1 blob"""
+        block_ids = [getattr(b, "id", b) for b in block_list]
+        tmp = self._path + ".tmp"
+        os.makedirs(os.path.dirname(tmp), exist_ok=True)
+        with open(tmp, "wb") as out:
+            for block_id in block_ids:
+                with open(self._block_path(block_id), "rb") as f:
+                    shutil.copyfileobj(f, out)
+        os.replace(tmp, self._path)
+        shutil.rmtree(os.path.dirname(self._block_path("x")), ignore_errors=True)
+
+
+class LocalContainerClient:
+    """Container Blob di atas 1 folder lokal, untuk test/benchmark tanpa Azure"""
+
+    _lock = threading.Lock()  # upload bersyarat = compare-and-swap, cukup 1 lock per proses
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, name):
+        return os.path.join(self.root, *name.split("/"))
+
+    def upload_blob(self, name, data, overwrite=True, etag=None, match_condition=None):
+        """etag + match_condition (IfNotModified) seperti Azure: gagal kalau blob berubah sejak dibaca"""
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        if etag is None and overwrite:
+            return self._write(name, data)
+        with self._lock:
+            path = self._path(name)
+            if not overwrite and os.path.exists(path):
+                raise ConditionNotMet(f"{name} already exists")
+            if etag is not None:
+                current = _Downloader(path).properties.etag if os.path.exists(path) else None
+                if current != etag:
+                    raise ConditionNotMet(f"{name} modified (etag {current} != {etag})")
+            self._write(name, data)
+
+    def _write(self, name, data):
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"  # per thread: writer paralel tidak berbagi file tmp
+        with open(tmp, "wb") as f:
+            if isinstance(data, (bytes, bytearray, memoryview)):
+                f.write(data)
+            else:
+                shutil.copyfileobj(data, f)
+        os.replace(tmp, path)  # atomic seperti commit blob
+
+    def download_blob(self, name):
+        path = self._path(name)
+        if not os.path.exists(path):
+            raise FileNotFoundError(name)
+        return _Downloader(path)
+
+    def delete_blob(self, name):
+        os.remove(self._path(name))
+
+    def list_blobs(self, name_starts_with=None):
+        for dirpath, dirs, files in os.walk(self.root):
+            if dirpath == self.root and UNCOMMITTED_DIR in dirs:
+                dirs.remove(UNCOMMITTED_DIR)
+            for file_name in files:
+                if file_name.endswith(".tmp"):
+                    continue
+                full = os.path.join(dirpath, file_name)
+                name = os.path.relpath(full, self.root).replace(os.sep, "/")
+                if name_starts_with and not name.startswith(name_starts_with):
+                    continue
+                yield _BlobProperties(name, os.path.getsize(full))
+
+    def get_blob_client(self, name):
+        return LocalBlobClient(self, name)
+
+
+class LocalBlobServiceClient:
+    """Pengganti BlobServiceClient: 1 subfolder per container"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def get_container_client(self, container):
+        return LocalContainerClient(os.path.join(self.root, container))
@@ -1,18 +1,100 @@
-import re
-
-# Peta regex ke symbol
-COIN_MAP = {
-    r"\b(bitcoin|btc)\b": "BTC-USD",
-    r"\b(ethereum|eth)\b": "ETH-USD",
-    r"\b(solana|sol)\b": "SOL-USD",
-    r"\bxrp\b": "XRP-USD",
-    r"\bdoge|dogecoin\b": "DOGE-USD"
+import os, re
+from collections import Counter
+
+# Alias nama coin per symbol; symbol lain di CRYPTO_SYMBOLS otomatis pakai ticker dasarnya
+COIN_ALIASES = {
+    "BTC-USD": ["bitcoin", "btc"],
+    "ETH-USD": ["ethereum", "eth"],
+    "SOL-USD": ["solana", "sol"],
+    "XRP-USD": ["xrp"],
+    "DOGE-USD": ["dogecoin", "doge"],
 }
 
+
+def _trie_regex(words):
+    """Susun alias jadi regex berbentuk trie (prefix sama digabung) supaya 1 scan cukup"""
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def emit(node):
+        is_end = "" in node
+        alts = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        if len(alts) == 1 and not is_end:
+            return alts[0]
+        return f"(?:{'|'.join(alts)})" + ("?" if is_end else "")
+
+    return emit(trie)
+
+
+def build_coin_matcher(symbols=None, aliases=None):
+    """
+    Compile 1 regex untuk semua alias coin (dari COIN_ALIASES + CRYPTO_SYMBOLS).
+    Return (pattern, lookup) dengan lookup alias -> symbol.
+    """
+    aliases = dict(COIN_ALIASES if aliases is None else aliases)
+    if symbols is None:
+        symbols = os.getenv("CRYPTO_SYMBOLS", "BTC-USD,ETH-USD").split(",")
+
+    for symbol in (s.strip() for s in symbols):
+        if symbol and symbol not in aliases:
+            aliases[symbol] = [symbol.split("-")[0].lower()]
+
+    lookup = {alias.lower(): symbol for symbol, names in aliases.items() for alias in names}
+    return re.compile(rf"\b(?:{_trie_regex(lookup)})\b"), lookup
+
+
+_PATTERN, _LOOKUP = build_coin_matcher()
+
+
+def detect_coins(text: str) -> dict:
+    """Semua coin yang disebut di teks berita beserta jumlah kemunculannya (terbanyak duluan)"""
+    hits = Counter(_LOOKUP[m] for m in _PATTERN.findall(str(text).lower()))
+    return dict(hits.most_common())
+
+
 def detect_coin(text: str) -> str:
-    """Deteksi coin dari teks berita (title + content)"""
-    text = str(text).lower()
-    for pattern, coin in COIN_MAP.items():
-        if re.search(pattern, text):
-            return coin
-    return "ALL"
+    """Deteksi coin utama dari teks berita (title + content), "ALL" kalau tidak ada"""
+    coins = detect_coins(text)
+    return next(iter(coins), "ALL")
+
+
+def tag_series(texts):
+    """
+    Tag sekaligus 1 pandas Series teks berita (title + content).
+    Return DataFrame (index sama) berisi kolom coin (coin utama / "ALL") dan 1 kolom
+    hit count per symbol. Coin utama = hit terbanyak, seri diputus oleh sebutan pertama.
+    """
+    import pandas as pd
+
+    symbols = list(dict.fromkeys(_LOOKUP.values()))
+    result = pd.DataFrame(0, index=texts.index, columns=symbols)
+    result.insert(0, "coin", "ALL")
+
+    found = texts.fillna("").astype(str).str.lower().str.findall(_PATTERN).explode().dropna()
+    if found.empty:
+        return result
+
+    stats = pd.DataFrame({
+        "article": found.index,
+        "coin": found.map(_LOOKUP).to_numpy(),
+        "pos": found.groupby(level=0).cumcount().to_numpy(),
+    })
+    per_coin = (
+        stats.groupby(["article", "coin"], sort=False)["pos"]
+        .agg(hits="size", first="min")
+        .reset_index()
+    )
+
+    wide = per_coin.pivot(index="article", columns="coin", values="hits").fillna(0).astype(int)
+    result.loc[wide.index, wide.columns] = wide.to_numpy()
+
+    primary = per_coin.sort_values(["article", "hits", "first"], ascending=[True, False, True])
+    primary = primary.drop_duplicates("article").set_index("article")["coin"]
+    result.loc[primary.index, "coin"] = primary
+    return result
@@ -0,0 +1,118 @@
+import os, queue, threading, time
+from utils.logger import logger
+
+# Ukuran default queue antar stage: batas item (DataFrame per symbol) yang boleh menunggu
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "4"))
+
+_DONE = object()
+
+
+class Stage:
+    """
+    1 stage pipeline: `workers` thread mengambil item dari queue input (bounded) dan
+    menjalankan func(item). func return list item untuk stage berikutnya (boleh kosong).
+
+    Kalau resource diisi, func dijalankan lewat Scheduler (limit + retry per dependency);
+    thread stage hanya menunggu hasilnya. retries=1 untuk func yang tidak idempotent
+    (tidak boleh dijalankan ulang utuh setelah sebagian efeknya commit).
+    """
+
+    def __init__(self, name, func, workers=1, resource=None, maxsize=None, on_close=None, retries=None):
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+        self.resource = resource
+        self.retries = retries
+        self.on_close = on_close
+        self.queue = queue.Queue(maxsize or PIPELINE_QUEUE_SIZE)
+        self.stats = {"items": 0, "errors": 0, "max_depth": 0, "blocked_s": 0.0}
+        self._alive = self.workers
+        self._lock = threading.Lock()
+
+
+class Pipeline:
+    """
+    Stage linear yang disambung dengan queue bounded.
+
+    put() ke queue yang penuh akan block, jadi stage yang lambat (mis. SQL) otomatis menahan
+    stage sebelumnya (backpressure) dan jumlah item di memori tidak pernah lebih dari
+    total ukuran queue + jumlah worker.
+    """
+
+    def __init__(self, stages, scheduler=None, on_error=None):
+        self.stages = stages
+        self.scheduler = scheduler
+        self.on_error = on_error
+
+    def _put(self, stage, item):
+        t0 = time.monotonic()
+        stage.queue.put(item)
+        with stage._lock:
+            stage.stats["blocked_s"] += time.monotonic() - t0
+            stage.stats["max_depth"] = max(stage.stats["max_depth"], stage.queue.qsize())
+
+    def _call(self, stage, item):
+        if stage.resource and self.scheduler:
+            return self.scheduler.submit(stage.resource, stage.func, item, retries=stage.retries).result()
+        return stage.func(item)
+
+    def _worker(self, index):
+        stage = self.stages[index]
+        following = self.stages[index + 1] if index + 1 < len(self.stages) else None
+        while True:
+            item = stage.queue.get()
+            if item is _DONE:
+                break
+            try:
+                outputs = self._call(stage, item) or []
+                with stage._lock:
+                    stage.stats["items"] += 1
+                for out in outputs:
+                    if following:
+                        self._put(following, out)
+            except Exception as e:
+                with stage._lock:
+                    stage.stats["errors"] += 1
+                if self.on_error:
+                    self.on_error(stage.name, item, e)
+                else:
+                    logger.error(f"[{stage.name}] item failed: {e}", exc_info=True)
+
+        # worker terakhir yang selesai menutup stage dan meneruskan sinyal selesai
+        with stage._lock:
+            stage._alive -= 1
+            last = stage._alive == 0
+        if last:
+            try:
+                if stage.on_close:
+                    stage.on_close()
+            except Exception as e:
+                logger.error(f"[{stage.name}] close failed: {e}", exc_info=True)
+            finally:
+                if following:
+                    for _ in range(following.workers):
+                        following.queue.put(_DONE)
+
+    def run(self, items):
+        """Masukkan items ke stage pertama dan tunggu semua stage selesai"""
+        threads = [
+            threading.Thread(target=self._worker, args=(i,), name=f"pipe-{stage.name}-{n}", daemon=True)
+            for i, stage in enumerate(self.stages)
+            for n in range(stage.workers)
+        ]
+        for t in threads:
+            t.start()
+        first = self.stages[0]
+        for item in items:
+            self._put(first, item)
+        for _ in range(first.workers):
+            first.queue.put(_DONE)
+        for t in threads:
+            t.join()
+        return self.metrics()
+
+    def metrics(self):
+        return {
+            s.name: {**s.stats, "blocked_s": round(s.stats["blocked_s"], 3)}
+            for s in self.stages
+        }
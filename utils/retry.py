@@ -1,6 +1,28 @@
-import time
+import threading, time
+from contextlib import contextmanager
 from utils.logger import logger
 
+_state = threading.local()
+
+
+@contextmanager
+def no_inline_retry():
+    """
+    Matikan retry+sleep di dalam thread ini: with_retry langsung melempar error pertama.
+    Dipakai worker scheduler supaya backoff dijadwalkan ulang, bukan sleep sambil memegang worker.
+    """
+    previous = getattr(_state, "disabled", False)
+    _state.disabled = True
+    try:
+        yield
+    finally:
+        _state.disabled = previous
+
+
+def inline_retry_enabled():
+    return not getattr(_state, "disabled", False)
+
+
 def with_retry(func, max_attempts=3, delay=2, backoff=True, *args, **kwargs):
     """
     Jalankan fungsi dengan retry.
@@ -12,6 +34,9 @@ def with_retry(func, max_attempts=3, delay=2, backoff=True, *args, **kwargs):
         backoff (bool): apakah delay ditambah tiap attempt (exponential backoff).
         *args, **kwargs: argumen untuk fungsi.
     """
+    if not inline_retry_enabled():
+        max_attempts = 1
+
     for attempt in range(1, max_attempts + 1):
         try:
             return func(*args, **kwargs)
@@ -0,0 +1,373 @@
+"""
+Rollup OHLCV 4h / 1d dari CryptoPrice plus indikator rolling (SMA, EMA, volatility), disimpan di
+CryptoPriceRollup dan di-maintain incremental dari tiap batch yang di-commit insert_incremental.
+Tabel dibuat otomatis (ROLLUP_DDL, idempotent) saat rollup pertama ditulis di worker process.
+
+Bucket memakai jam lokal yang sama dengan CryptoPrice (date + hourx). Indikator dihitung atas
+Close per bucket dengan window ROLLUP_WINDOW bucket; volatility = std log return.
+"""
+import os
+from utils.db_handler import _atomic, _is_sqlite, clear_markers, get_markers, update_last_success, PRICE_VALUES
+from utils.logger import logger
+
+ROLLUP_INTERVALS = {"4h": 4, "1d": 24}  # interval -> jam per bucket
+ROLLUP_WINDOW = int(os.getenv("ROLLUP_WINDOW", "20"))
+ROLLUPS_ENABLED = os.getenv("ROLLUPS_ENABLED", "1").lower() in ("1", "true", "yes")
+
+ROLLUP_SCHEMA = {
+    "crypto": "str", "interval": "str", "bucket_start": "datetime",
+    "Open": "float", "High": "float", "Low": "float", "Close": "float", "Volume": "int", "bars": "int",
+    "sma": "float", "ema": "float", "volatility": "float",
+}
+ROLLUP_COLUMNS = list(ROLLUP_SCHEMA)
+# 12 parameter per baris, SQL Server maksimal 2100 parameter per statement
+_UPSERT_CHUNK = 150
+
+_ROLLUP_TABLE = """
+    crypto VARCHAR(20) NOT NULL, [interval] VARCHAR(4) NOT NULL, bucket_start DATETIME NOT NULL,
+    [Open] FLOAT, [High] FLOAT, [Low] FLOAT, [Close] FLOAT, [Volume] BIGINT, bars INT,
+    sma FLOAT, ema FLOAT, volatility FLOAT,
+    PRIMARY KEY (crypto, [interval], bucket_start)
+"""
+ROLLUP_DDL = f"""
+IF OBJECT_ID('CryptoPriceRollup', 'U') IS NULL
+    CREATE TABLE CryptoPriceRollup ({_ROLLUP_TABLE});
+"""
+_TABLE_READY = False
+
+
+def ensure_rollup_table(cursor):
+    """Buat CryptoPriceRollup kalau belum ada (idempotent, cukup 1x per worker process)"""
+    global _TABLE_READY
+    if _TABLE_READY:
+        return
+    if _is_sqlite(cursor):
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS CryptoPriceRollup ({_ROLLUP_TABLE})")
+    else:
+        cursor.execute(ROLLUP_DDL)
+    _TABLE_READY = True
+
+
+# --- Rollup math (vectorized, dipakai jalur incremental maupun rebuild penuh) ---
+def _hourly(bars):
+    """Bar CryptoPrice (DataFrame / pyarrow.Table) -> DataFrame crypto, ts, OHLCV"""
+    import numpy as np
+    import pandas as pd
+
+    if hasattr(bars, "column_names"):
+        bars = bars.select(["date", "hourx", "crypto"] + PRICE_VALUES).to_pandas()
+    # date dari driver bisa datetime.date atau string ISO (sqlite), numpy parse keduanya
+    days = np.asarray(bars["date"].to_numpy(), dtype="datetime64[D]").astype("datetime64[s]")
+    return pd.DataFrame({
+        "crypto": bars["crypto"].astype(str).to_numpy(),
+        "ts": days + bars["hourx"].to_numpy().astype("int64") * np.timedelta64(1, "h"),
+        **{c: bars[c].to_numpy() for c in PRICE_VALUES},
+    })
+
+
+def aggregate(bars, interval):
+    """
+    Bar 1h -> bucket interval: Open pertama, High max, Low min, Close terakhir, Volume sum.
+    Vectorized NumPy: urutkan (crypto, ts) sekali, lalu reduceat per batas bucket.
+    """
+    import numpy as np
+    import pandas as pd
+
+    hourly = bars if "ts" in getattr(bars, "columns", ()) else _hourly(bars)
+    secs = hourly["ts"].to_numpy().astype("datetime64[s]").astype("int64")
+    width = ROLLUP_INTERVALS[interval] * 3_600
+    codes, names = pd.factorize(hourly["crypto"], sort=True)
+    order = np.lexsort((secs, codes))
+    codes, bucket = codes[order], secs[order] // width * width
+
+    n = len(order)
+    starts = np.flatnonzero(np.r_[True, (codes[1:] != codes[:-1]) | (bucket[1:] != bucket[:-1])]) if n else order
+    ends = np.r_[starts[1:], n] - 1
+    column = lambda c: hourly[c].to_numpy(dtype="float64")[order]
+    reduce = lambda ufunc, c: ufunc.reduceat(column(c), starts) if n else column(c)
+    return pd.DataFrame({
+        "crypto": np.asarray(names, dtype=object)[codes[starts]],
+        "interval": interval,
+        "bucket_start": pd.to_datetime(bucket[starts], unit="s"),
+        "Open": column("Open")[starts],
+        "High": reduce(np.fmax, "High"),
+        "Low": reduce(np.fmin, "Low"),
+        "Close": column("Close")[ends],
+        "Volume": np.add.reduceat(np.nan_to_num(column("Volume")), starts).astype("int64") if n else np.array([], "int64"),
+        "bars": np.diff(np.r_[starts, n]).astype("int64"),
+    })
+
+
+def _indicators(close, window, context=None, ema_seed=None):
+    """
+    SMA / EMA / volatility untuk 1 series Close (urut waktu), return (sma, ema, volatility) ndarray.
+    Mode incremental: context = Close `window` bucket sebelum series, ema_seed = EMA bucket tepat
+    sebelumnya, hasilnya sama dengan hitung ulang dari awal history.
+    """
+    import numpy as np
+    import pandas as pd
+
+    n = len(close)
+    full = close if context is None else pd.concat([context, close], ignore_index=True)
+    sma = full.rolling(window, min_periods=window).mean().to_numpy()[-n:]
+    volatility = np.log(full).diff().rolling(window, min_periods=window).std().to_numpy()[-n:]
+    seeded = close if ema_seed is None else pd.concat([pd.Series([ema_seed]), close], ignore_index=True)
+    ema = seeded.ewm(span=window, adjust=False).mean().to_numpy()[-n:]
+    return sma, ema, volatility
+
+
+def compute_rollups(bars, interval, window=None):
+    """Rollup + indikator dari nol untuk semua crypto di bars (rebuild, dan acuan cek ekuivalensi)"""
+    import pandas as pd
+
+    window = window or ROLLUP_WINDOW
+    out = aggregate(bars, interval)
+    parts = []
+    for _, group in out.groupby("crypto", sort=False):
+        sma, ema, volatility = _indicators(group["Close"].astype("float64").reset_index(drop=True), window)
+        parts.append(group.assign(sma=sma, ema=ema, volatility=volatility))
+    return pd.concat(parts, ignore_index=True) if parts else out.assign(sma=[], ema=[], volatility=[])
+
+
+# --- SQL I/O ---
+def _read_prices(cursor, crypto, start=None, end=None):
+    """Bar 1h 1 crypto dari CryptoPrice dengan ts di [start, end), seluruh history kalau tanpa range"""
+    import pandas as pd
+
+    sql = "SELECT date, hourx, crypto, [Open], [High], [Low], [Close], [Volume] FROM CryptoPrice WHERE crypto = ?"
+    params = [crypto]
+    if start is not None:
+        # filter per tanggal dulu supaya seek index (crypto, date, hourx), sisa jam dipotong di pandas
+        sql += " AND date >= ? AND date <= ?"
+        params += [start.date(), (end - pd.Timedelta(hours=1)).date()]
+    cursor.execute(sql, params)
+    hourly = _hourly(pd.DataFrame.from_records(
+        [tuple(r) for r in cursor.fetchall()], columns=["date", "hourx", "crypto"] + PRICE_VALUES
+    ))
+    if start is not None:
+        hourly = hourly[(hourly["ts"] >= start) & (hourly["ts"] < end)]
+    return hourly
+
+
+def _read_rollups(cursor, crypto, interval, first, window):
+    """Return (context, later): `window` rollup sebelum bucket `first`, dan semua rollup mulai `first`"""
+    import numpy as np
+    import pandas as pd
+
+    cols = ", ".join(f"[{c}]" for c in ROLLUP_COLUMNS)
+    where = "crypto = ? AND [interval] = ?"
+    first = first.to_pydatetime()
+    if _is_sqlite(cursor):
+        cursor.execute(f"""
+            SELECT {cols} FROM CryptoPriceRollup
+            WHERE {where} AND bucket_start < ? ORDER BY bucket_start DESC LIMIT ?
+        """, (crypto, interval, first, window))
+    else:
+        cursor.execute(f"""
+            SELECT TOP (?) {cols} FROM CryptoPriceRollup
+            WHERE {where} AND bucket_start < ? ORDER BY bucket_start DESC
+        """, (window, crypto, interval, first))
+    context = cursor.fetchall()[::-1]
+    cursor.execute(
+        f"SELECT {cols} FROM CryptoPriceRollup WHERE {where} AND bucket_start >= ? ORDER BY bucket_start",
+        (crypto, interval, first),
+    )
+    later = cursor.fetchall()
+
+    def frame(rows):
+        df = pd.DataFrame.from_records([tuple(r) for r in rows], columns=ROLLUP_COLUMNS)
+        df["bucket_start"] = np.asarray(df["bucket_start"].to_numpy(), dtype="datetime64[s]")
+        return df
+
+    return frame(context), frame(later)
+
+
+def _rollup_rows(df):
+    """
+    DataFrame rollup -> list tuple parameter (NaN -> None). Versi ringkas encode_rows: batch
+    incremental cuma beberapa baris, overhead per kolom pandas lebih mahal dari datanya.
+    """
+    import numpy as np
+
+    columns = []
+    for name, kind in ROLLUP_SCHEMA.items():
+        values = df[name].to_numpy()
+        if kind == "datetime":
+            columns.append(values.astype("datetime64[us]").tolist())
+        elif kind == "float":
+            columns.append([None if v != v else v for v in values.astype("float64").tolist()])
+        elif kind == "int":
+            columns.append(values.astype("int64").tolist())
+        else:
+            columns.append([str(v) for v in values])
+    return list(zip(*columns))
+
+
+def _upsert_rollups(cursor, df):
+    """Upsert baris rollup, key (crypto, interval, bucket_start), 1 statement per _UPSERT_CHUNK baris"""
+    rows = _rollup_rows(df)
+    cols = ", ".join(f"[{c}]" for c in ROLLUP_COLUMNS)
+    values_cols = ROLLUP_COLUMNS[3:]
+    for i in range(0, len(rows), _UPSERT_CHUNK):
+        chunk = rows[i:i + _UPSERT_CHUNK]
+        params = [v for row in chunk for v in row]
+        values = ",".join(f"({','.join('?' * len(ROLLUP_COLUMNS))})" for _ in chunk)
+
+        if _is_sqlite(cursor):
+            cursor.execute(f"""
+                INSERT INTO CryptoPriceRollup ({cols}) VALUES {values}
+                ON CONFLICT(crypto, [interval], bucket_start) DO UPDATE SET
+                    {", ".join(f"[{c}]=excluded.[{c}]" for c in values_cols)}
+            """, params)
+            continue
+
+        cursor.execute(f"""
+            MERGE CryptoPriceRollup WITH (HOLDLOCK) AS t
+            USING (VALUES {values}) AS s ({cols})
+            ON t.crypto = s.crypto AND t.[interval] = s.[interval] AND t.bucket_start = s.bucket_start
+            WHEN MATCHED THEN
+                UPDATE SET {", ".join(f"[{c}] = s.[{c}]" for c in values_cols)}
+            WHEN NOT MATCHED THEN
+                INSERT ({cols}) VALUES ({", ".join(f"s.[{c}]" for c in ROLLUP_COLUMNS)});
+        """, params)
+    return len(rows)
+
+
+# --- Incremental update & rebuild ---
+def update_rollups(cursor, bars, intervals=None, window=None):
+    """
+    Merge rollup untuk bucket yang tersentuh batch `bars` (bar yang baru di-commit ke CryptoPrice).
+    Tiap bucket terdampak dihitung ulang dari bar 1h-nya di CryptoPrice (bar lama + bar baru/revisi),
+    bucket lain tidak disentuh. Indikator dihitung mulai bucket terdampak pertama, dengan konteks
+    `window` rollup sebelumnya dari tabel. Return jumlah baris rollup yang ditulis.
+    """
+    import pandas as pd
+
+    if len(bars) == 0:
+        return 0
+    intervals = intervals or list(ROLLUP_INTERVALS)
+    window = window or ROLLUP_WINDOW
+    batch = bars if "ts" in getattr(bars, "columns", ()) else _hourly(bars)
+    span = max(ROLLUP_INTERVALS[i] for i in intervals)
+
+    written = 0
+    for crypto, group in batch.groupby("crypto", sort=False):
+        # 1 query bar 1h yang mencakup semua bucket terdampak (bucket terlebar)
+        start = group["ts"].min().floor(f"{span}h")
+        end = group["ts"].max().floor(f"{span}h") + pd.Timedelta(hours=span)
+        source = _read_prices(cursor, crypto, start, end)
+
+        updates = []
+        for interval in intervals:
+            touched = group["ts"].dt.floor(f"{ROLLUP_INTERVALS[interval]}h").unique()
+            fresh = aggregate(source, interval)
+            fresh = fresh[fresh["bucket_start"].isin(touched)]
+            if fresh.empty:
+                continue
+
+            first = fresh["bucket_start"].min()
+            context, later = _read_rollups(cursor, crypto, interval, first, window)
+            merged = pd.concat(
+                [later[~later["bucket_start"].isin(fresh["bucket_start"])][fresh.columns], fresh],
+                ignore_index=True,
+            ).sort_values("bucket_start", ignore_index=True)
+
+            sma, ema, volatility = _indicators(
+                merged["Close"].astype("float64"), window,
+                context=context["Close"].astype("float64") if len(context) else None,
+                ema_seed=float(context["ema"].iloc[-1]) if len(context) else None,
+            )
+            updates.append(merged.assign(sma=sma, ema=ema, volatility=volatility))
+
+        # semua interval 1 crypto ditulis dalam 1 transaksi (1 commit, bukan per statement)
+        with _atomic(cursor):
+            for update in updates:
+                written += _upsert_rollups(cursor, update)
+    return written
+
+
+# --- Rollup tertunda (hook gagal setelah MERGE commit) ---
+def _pending_source(crypto):
+    return f"rollup:{crypto}"
+
+
+def pending_since(cursor, crypto):
+    """Bar paling awal yang rollup-nya belum ter-update (None kalau tidak ada yang tertunda)"""
+    import pandas as pd
+
+    since = get_markers(cursor, [_pending_source(crypto)]).get(_pending_source(crypto))
+    return pd.Timestamp(since) if since is not None else None
+
+
+def _clear_pending(cursor, cryptos):
+    clear_markers(cursor, [_pending_source(c) for c in cryptos])
+
+
+def maintain_rollups(cursor, bars, crypto, changed=True):
+    """
+    Hook insert_incremental (setelah MERGE commit): update_rollups untuk batch ini plus bucket yang
+    tertunda dari run sebelumnya. Error tidak dilempar, karena bar-nya sudah commit dan retry akan
+    melihat "no changes"; bar paling awal yang belum ter-rollup dicatat di IngestionMetadata
+    (source "rollup:<crypto>") dan bucket mulai bar itu dihitung ulang di panggilan berikutnya,
+    juga kalau MERGE berikutnya tidak mengubah apa-apa (changed=False).
+    """
+    import pandas as pd
+
+    batch = _hourly(bars)
+    since = None
+    try:
+        since = pending_since(cursor, crypto)
+        if since is None and not changed:
+            return 0
+        ensure_rollup_table(cursor)
+        if since is not None:
+            end = max(batch["ts"].max(), since) + pd.Timedelta(hours=1)
+            batch = pd.concat([_read_prices(cursor, crypto, since, end), batch], ignore_index=True)
+        written = update_rollups(cursor, batch)
+        if since is not None:
+            _clear_pending(cursor, [crypto])
+            logger.info(f"{crypto}: pending rollups since {since} recomputed")
+        return written
+    except Exception as e:
+        first = batch["ts"].min() if since is None else min(since, batch["ts"].min())
+        logger.error(f"{crypto}: rollup update failed, buckets from {first} pending until next run: {e}", exc_info=True)
+        try:
+            update_last_success(cursor, _pending_source(crypto), first.to_pydatetime())
+        except Exception as mark_error:
+            logger.error(f"{crypto}: pending rollup marker not saved, run rebuild_rollups: {mark_error}")
+        return 0
+
+
+def rebuild_rollups(cursor, cryptos=None, intervals=None, window=None):
+    """
+    Bangun ulang rollup dari seluruh CryptoPrice, 1 pass per crypto (history dibaca sekali untuk
+    semua interval). Dipakai setelah backfill BULK INSERT yang tidak lewat insert_incremental.
+    Marker rollup tertunda crypto yang di-rebuild ikut dihapus.
+    """
+    ensure_rollup_table(cursor)
+    intervals = intervals or list(ROLLUP_INTERVALS)
+    if cryptos is None:
+        cursor.execute("SELECT DISTINCT crypto FROM CryptoPrice")
+        cryptos = [r[0] for r in cursor.fetchall()]
+
+    cols = ", ".join(f"[{c}]" for c in ROLLUP_COLUMNS)
+    sql = f"INSERT INTO CryptoPriceRollup ({cols}) VALUES ({','.join('?' * len(ROLLUP_COLUMNS))})"
+    if not _is_sqlite(cursor):
+        cursor.fast_executemany = True
+
+    written = 0
+    for crypto in cryptos:
+        source = _read_prices(cursor, crypto)
+        # DELETE + INSERT 1 transaksi per crypto: pembaca tidak pernah melihat rollup kosong
+        with _atomic(cursor):
+            for interval in intervals:
+                cursor.execute("DELETE FROM CryptoPriceRollup WHERE crypto = ? AND [interval] = ?", (crypto, interval))
+                if source.empty:
+                    continue
+                rows = _rollup_rows(compute_rollups(source, interval, window))
+                cursor.executemany(sql, rows)
+                written += len(rows)
+            if len(intervals) == len(ROLLUP_INTERVALS):
+                _clear_pending(cursor, [crypto])
+        logger.info(f"{crypto}: rollups rebuilt from {len(source)} hourly bars")
+    return written
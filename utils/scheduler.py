@@ -0,0 +1,233 @@
+import heapq, itertools, os, threading, time
+from concurrent.futures import Future, ThreadPoolExecutor
+from utils.logger import logger
+from utils.retry import no_inline_retry
+
+
+class TokenBucket:
+    """Token bucket untuk rate limit upstream (rate token/detik, burst = capacity)"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1.0, rate))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self, tokens=1.0):
+        """Ambil token tanpa blocking: return 0 kalau dapat, selain itu detik sampai token cukup"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+
+class AdaptiveLimit:
+    """
+    Batas concurrency 1 dependency eksternal yang menyesuaikan diri (AIMD).
+
+    Naik +1 setelah 1 "window" sukses berturut-turut, turun setengah saat error (termasuk 429).
+    Latency hanya dicatat (EWMA) untuk metrics: ukuran task berbeda-beda (1 bar vs 720 bar),
+    jadi latency mentah bukan sinyal overload.
+    """
+
+    def __init__(self, name, initial=2, minimum=1, maximum=8):
+        self.name = name
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = max(minimum, min(initial, maximum))
+        self.in_flight = 0
+        self._streak = 0
+        self._ewma = None
+        self._stats = {"completed": 0, "errors": 0, "increases": 0, "decreases": 0}
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        with self._lock:
+            if self.in_flight >= self.limit:
+                return False
+            self.in_flight += 1
+            return True
+
+    def cancel(self):
+        """Kembalikan slot tanpa feedback (task belum jalan)"""
+        with self._lock:
+            self.in_flight -= 1
+
+    def release(self, latency, ok):
+        with self._lock:
+            self.in_flight -= 1
+            self._stats["completed"] += 1
+            if not ok:
+                self._stats["errors"] += 1
+                self._decrease(self.limit // 2)
+                return
+
+            self._ewma = latency if self._ewma is None else 0.8 * self._ewma + 0.2 * latency
+            self._streak += 1
+            if self._streak >= self.limit and self.limit < self.maximum:
+                self.limit += 1
+                self._streak = 0
+                self._stats["increases"] += 1
+
+    def _decrease(self, new_limit):
+        new_limit = max(self.minimum, new_limit)
+        if new_limit < self.limit:
+            self.limit = new_limit
+            self._stats["decreases"] += 1
+        self._streak = 0
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "limit": self.limit, "in_flight": self.in_flight,
+                "ewma_latency_s": round(self._ewma or 0.0, 4), **self._stats,
+            }
+
+
+class _Task:
+    __slots__ = ("resource", "func", "args", "kwargs", "future", "attempt", "retries")
+
+    def __init__(self, resource, func, args, kwargs, retries):
+        self.resource = resource
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.retries = retries
+        self.future = Future()
+        self.attempt = 0
+
+
+def default_limits():
+    """Limit per dependency dari environment (price API, blob, SQL)"""
+    sql_max = int(os.getenv("SQL_CONCURRENCY", os.getenv("SQL_POOL_SIZE", "8")))
+    return {
+        "price_api": AdaptiveLimit("price_api", initial=2, maximum=int(os.getenv("PRICE_API_CONCURRENCY", "4"))),
+        "blob": AdaptiveLimit("blob", initial=4, maximum=int(os.getenv("BLOB_CONCURRENCY", "8"))),
+        "sql": AdaptiveLimit("sql", initial=2, maximum=sql_max),
+    }
+
+
+def default_buckets():
+    return {"price_api": TokenBucket(rate=float(os.getenv("PRICE_API_RATE", "2")), capacity=4)}
+
+
+class Scheduler:
+    """
+    Scheduler task per dependency eksternal.
+
+    Tiap task di-submit ke resource ("price_api", "blob", "sql") dan baru dijalankan kalau
+    AdaptiveLimit resource itu punya slot dan token bucket-nya (kalau ada) punya token.
+    Task yang gagal dijadwalkan ulang dengan backoff di heap, jadi tidak ada worker yang
+    tidur selama menunggu retry; with_retry/fetch_data di dalam task juga tidak sleep.
+    """
+
+    def __init__(self, limits=None, buckets=None, retries=3, backoff=2.0, max_workers=None):
+        self.limits = limits or default_limits()
+        self.buckets = buckets if buckets is not None else default_buckets()
+        self.retries = retries
+        self.backoff = backoff
+        self._ready = []
+        self._delayed = []  # heap (due, seq, task)
+        self._seq = itertools.count()
+        self._pending = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        workers = max_workers or sum(l.maximum for l in self.limits.values())
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sched")
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="sched-dispatch", daemon=True)
+        self._dispatcher.start()
+
+    def submit(self, resource, func, *args, retries=None, **kwargs):
+        if resource not in self.limits:
+            raise ValueError(f"Resource tidak dikenal: {resource}")
+        task = _Task(resource, func, args, kwargs, self.retries if retries is None else retries)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Scheduler sudah ditutup")
+            self._pending += 1
+            self._ready.append(task)
+            self._cond.notify_all()
+        return task.future
+
+    def _dispatch_loop(self):
+        with self._cond:
+            while not (self._closed and self._pending == 0):
+                now = time.monotonic()
+                while self._delayed and self._delayed[0][0] <= now:
+                    self._ready.append(heapq.heappop(self._delayed)[2])
+
+                still_waiting = []
+                for task in self._ready:
+                    limit = self.limits[task.resource]
+                    if not limit.try_acquire():
+                        still_waiting.append(task)
+                        continue
+                    bucket = self.buckets.get(task.resource)
+                    wait = bucket.try_acquire() if bucket else 0.0
+                    if wait > 0:
+                        limit.cancel()
+                        heapq.heappush(self._delayed, (now + wait, next(self._seq), task))
+                        continue
+                    self._executor.submit(self._run, task)
+                self._ready = still_waiting
+
+                timeout = max(0.0, self._delayed[0][0] - now) if self._delayed else None
+                self._cond.wait(timeout)
+
+    def _run(self, task):
+        task.attempt += 1
+        t0 = time.monotonic()
+        try:
+            with no_inline_retry():
+                result = task.func(*task.args, **task.kwargs)
+        except Exception as e:
+            self.limits[task.resource].release(time.monotonic() - t0, ok=False)
+            if task.attempt < task.retries:
+                wait = self.backoff * (2 ** (task.attempt - 1))
+                logger.warning(
+                    f"[{task.resource}] {getattr(task.func, '__name__', task.func)} failed "
+                    f"(attempt {task.attempt}/{task.retries}): {e}; retry in {wait:.1f}s"
+                )
+                with self._cond:
+                    heapq.heappush(self._delayed, (time.monotonic() + wait, next(self._seq), task))
+                    self._cond.notify_all()
+                return
+            self._finish(task, error=e)
+        else:
+            self.limits[task.resource].release(time.monotonic() - t0, ok=True)
+            self._finish(task, result=result)
+
+    def _finish(self, task, result=None, error=None):
+        # set di luar lock (callback boleh langsung submit task berikutnya), dan sebelum
+        # pending dikurangi supaya close() tidak selesai di antara 2 task yang dirantai
+        if error is not None:
+            task.future.set_exception(error)
+        else:
+            task.future.set_result(result)
+        with self._cond:
+            self._pending -= 1
+            self._cond.notify_all()
+
+    def metrics(self):
+        return {name: limit.snapshot() for name, limit in self.limits.items()}
+
+    def close(self):
+        """Tunggu semua task (termasuk yang di-submit dari callback) selesai lalu matikan worker"""
+        with self._cond:
+            while self._pending:
+                self._cond.wait()
+            self._closed = True
+            self._cond.notify_all()
+        self._dispatcher.join()
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
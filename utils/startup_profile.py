@@ -0,0 +1,107 @@
+"""
+Profil waktu import saat cold start.
+
+Di Azure: set STARTUP_PROFILE=1, waktu import per modul ditulis ke log saat function di-load.
+Lokal (tiap target di-import di proses baru supaya benar-benar cold):
+
+    python -m utils.startup_profile TimerNewsIngest TimerCryptoIngest --top 15 --json startup.json
+"""
+import argparse, builtins, json, logging, os, subprocess, sys, threading, time
+
+_original_import = builtins.__import__
+_state = threading.local()
+_timings = {}  # module -> (cumulative_s, self_s), hanya import pertama (yang benar-benar load)
+_started = None
+
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    if level or name in sys.modules:
+        return _original_import(name, globals, locals, fromlist, level)
+
+    stack = _state.__dict__.setdefault("stack", [])
+    stack.append(0.0)
+    t0 = time.perf_counter()
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        elapsed = time.perf_counter() - t0
+        children = stack.pop()
+        if stack:
+            stack[-1] += elapsed
+        _timings.setdefault(name, (elapsed, elapsed - children))
+
+
+def enable():
+    global _started
+    if builtins.__import__ is not _timed_import:
+        _started = time.perf_counter()
+        builtins.__import__ = _timed_import
+
+
+def enable_from_env():
+    if os.getenv("STARTUP_PROFILE", "").lower() in ("1", "true", "yes"):
+        enable()
+
+
+def disable():
+    builtins.__import__ = _original_import
+
+
+def results(top=None):
+    """Modul urut dari cumulative time terbesar: [{module, cumulative_s, self_s}]"""
+    rows = sorted(_timings.items(), key=lambda kv: kv[1][0], reverse=True)
+    return [
+        {"module": name, "cumulative_s": round(cum, 4), "self_s": round(own, 4)}
+        for name, (cum, own) in rows[:top]
+    ]
+
+
+def report(entity, top=15):
+    """Tulis ringkasan import ke log (no-op kalau profil tidak aktif)"""
+    if builtins.__import__ is not _timed_import:
+        return None
+    total = time.perf_counter() - _started
+    rows = results(top)
+    log = logging.getLogger("etl")
+    log.info(f"⏱️ {entity} startup: {total:.3f}s import, {len(_timings)} modul baru")
+    for r in rows:
+        log.info(f"   {r['module']:<40} {r['cumulative_s']:>8.3f}s  (self {r['self_s']:.3f}s)")
+    return {"entity": entity, "total_s": round(total, 4), "modules": rows}
+
+
+def profile_cold(target, top=15):
+    """Import target di interpreter baru dan kembalikan profilnya"""
+    code = (
+        "import json, time, importlib, utils.startup_profile as sp\n"
+        "sp.enable(); t0 = time.perf_counter()\n"
+        f"importlib.import_module({target!r})\n"
+        "total = time.perf_counter() - t0\n"
+        f"print(json.dumps({{'entity': {target!r}, 'total_s': round(total, 4), 'modules': sp.results({top})}}))\n"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Waktu import cold start per modul untuk tiap function.")
+    parser.add_argument("targets", nargs="*", default=["TimerCryptoIngest", "TimerNewsIngest", "TimerRawCompaction"])
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--json", help="simpan hasil ke file JSON (untuk dibandingkan antar versi)")
+    args = parser.parse_args()
+
+    profiles = []
+    for target in args.targets:
+        profile = profile_cold(target, args.top)
+        profiles.append(profile)
+        print(f"\n{target}: {profile['total_s']:.3f}s")
+        print(f"  {'module':<40} {'cumul s':>8} {'self s':>8}")
+        for r in profile["modules"]:
+            print(f"  {r['module']:<40} {r['cumulative_s']:>8.3f} {r['self_s']:>8.3f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(profiles, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()